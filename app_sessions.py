@@ -0,0 +1,126 @@
+import logging
+import streamlit
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rerunning or probing another session from a background thread has no public
+# Streamlit API, so it goes through Runtime._session_mgr, AppSession._event_loop
+# and AppSession._fragment_storage. Those internals are only used after
+# require_session_control() confirms this Streamlit version still has them.
+MIN_STREAMLIT = (1, 33)
+
+def streamlit_version():
+    return tuple(int(part) for part in streamlit.__version__.split(".")[:2] if part.isdigit())
+
+def current_session_id():
+    """
+    Streamlit session id of the running script, or None outside Streamlit.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return ctx.session_id if ctx else None
+    except Exception:
+        return None
+
+def current_fragment_id():
+    """
+    Id of the fragment whose function is running on this script thread, or None.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return getattr(ctx, "current_fragment_id", None) if ctx else None
+    except Exception:
+        return None
+
+def in_fragment_rerun():
+    """
+    True while this script thread runs only some fragments rather than the whole script.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return bool(getattr(ctx, "fragment_ids_this_run", None)) if ctx else False
+    except Exception:
+        return False
+
+def _server_runtime():
+    """
+    The running Streamlit server, or None in bare Python and under AppTest, which substitutes a mock runtime.
+    """
+    from streamlit.runtime import Runtime
+    if not Runtime.exists():
+        return None
+    runtime = Runtime.instance()
+    return runtime if type(runtime) is Runtime else None
+
+def require_session_control():
+    """
+    Raise if this Streamlit version lacks the session internals used below. No-op outside a Streamlit server.
+    """
+    from streamlit.runtime.app_session import AppSession
+    from streamlit.proto.ClientState_pb2 import ClientState
+    runtime = _server_runtime()
+    if runtime is None:
+        return
+    manager = getattr(runtime, "_session_mgr", None)
+    problems = []
+    if streamlit_version() < MIN_STREAMLIT:
+        problems.append(f"version below {'.'.join(map(str, MIN_STREAMLIT))}")
+    if not hasattr(manager, "get_active_session_info"):
+        problems.append("no Runtime._session_mgr.get_active_session_info")
+    if not callable(getattr(AppSession, "request_rerun", None)):
+        problems.append("no AppSession.request_rerun")
+    if "fragment_id" not in ClientState.DESCRIPTOR.fields_by_name:
+        problems.append("no ClientState.fragment_id")
+    if problems:
+        raise RuntimeError(
+            f"Streamlit {streamlit.__version__} is not supported by realtime reruns ({'; '.join(problems)}). "
+            "Set DRAWING_GAME_REALTIME=0 to poll instead."
+        )
+
+def _active_app_session(session_id):
+    runtime = _server_runtime()
+    if runtime is None:
+        return None
+    info = runtime._session_mgr.get_active_session_info(session_id)
+    return info.session if info else None
+
+def request_session_rerun(session_id, fragment_id=None):
+    """
+    Ask Streamlit to rerun one session's script, or only one of its
+    fragments; safe to call from any thread. Falls back to a full rerun if
+    the session's last run did not declare that fragment.
+    """
+    try:
+        session = _active_app_session(session_id)
+        if session is None:
+            return False
+        client_state = None
+        if fragment_id is not None and _has_fragment(session, fragment_id):
+            from streamlit.proto.ClientState_pb2 import ClientState
+            # No widget states: the session keeps the values from its last run
+            client_state = ClientState(fragment_id=fragment_id)
+        session._event_loop.call_soon_threadsafe(session.request_rerun, client_state)
+        return True
+    except Exception as e:
+        logger.error(f"Could not request rerun for session {session_id}: {e}")
+        return False
+
+def _has_fragment(session, fragment_id):
+    storage = getattr(session, "_fragment_storage", None)
+    try:
+        return storage is not None and storage.get(fragment_id) is not None
+    except KeyError:
+        return False
+
+def is_session_active(session_id):
+    """
+    True while the session's browser is connected to this server.
+    """
+    try:
+        return _active_app_session(session_id) is not None
+    except Exception:
+        return False
@@ -0,0 +1,89 @@
+"""
+Per-room database reads versus worker count, with and without room affinity.
+
+Simulates N worker processes, each with its own room cache, in front of one
+local backend. Every player session polls its worker once per tick. With
+"balanced" placement, each session sticks to a random worker, as behind a
+plain sticky load balancer. With "affinity", every session of a room is on
+the room's worker from the hash ring. Also reports how evenly the ring
+spreads rooms, and what share of rooms moves when one worker is added.
+
+Run from the repository root:
+    python -m benchmarks.bench_affinity --rooms 200 --players 6 --duration 3
+"""
+import time
+import random
+import logging
+import argparse
+from collections import Counter
+from local_backend import MemoryBackend
+from room_cache import RoomCache
+from room_affinity import HashRing
+
+def populate(backend, rooms, players):
+    now = int(time.time())
+    room_ids = [f"R{index:05d}" for index in range(rooms)]
+    backend.table("rooms").insert([{"id": room_id, "owner_id": f"{room_id}-u0", "settings": {}, "game_state": {"status": "waiting"}} for room_id in room_ids]).execute()
+    backend.table("players").insert([
+        {"id": f"{room_id}-p{i}", "user_id": f"{room_id}-u{i}", "room_id": room_id, "name": f"p{i}", "score": 0, "last_seen": now}
+        for room_id in room_ids for i in range(players)
+    ]).execute()
+    return room_ids
+
+def snapshot_reads(args, workers, placement, seed=0):
+    """
+    Room snapshot fetches per room per second for one configuration.
+    """
+    backend = MemoryBackend()
+    room_ids = populate(backend, args.rooms, args.players)
+    worker_ids = [f"w{index}" for index in range(workers)]
+    caches = {worker: RoomCache(backend, ttl=args.ttl) for worker in worker_ids}
+    ring = HashRing(worker_ids)
+    rng = random.Random(seed)
+    sessions = []
+    for room_id in room_ids:
+        for _ in range(args.players):
+            worker = ring.owner(room_id) if placement == "affinity" else rng.choice(worker_ids)
+            sessions.append((caches[worker], room_id))
+
+    backend.reset_calls()
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        tick_start = time.perf_counter()
+        for cache, room_id in sessions:
+            cache.get(room_id).snapshot()
+        time.sleep(max(0.0, args.tick - (time.perf_counter() - tick_start)))
+    elapsed = time.perf_counter() - start
+    return backend.calls[("rpc", "room_snapshot")] / args.rooms / elapsed
+
+def ring_balance(rooms, workers):
+    room_ids = [f"R{index:05d}" for index in range(rooms)]
+    ring = HashRing([f"w{index}" for index in range(workers)])
+    grown = HashRing([f"w{index}" for index in range(workers + 1)])
+    load = Counter(ring.owner(room_id) for room_id in room_ids)
+    moved = sum(ring.owner(room_id) != grown.owner(room_id) for room_id in room_ids)
+    return max(load.values()) / (rooms / workers), moved / rooms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per configuration")
+    parser.add_argument("--tick", type=float, default=0.25, help="seconds between polls of each session")
+    parser.add_argument("--ttl", type=float, default=1.0, help="room cache TTL of each worker")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{args.rooms} rooms x {args.players} players, room cache TTL {args.ttl}s, polling every {args.tick}s")
+    print(f"{'workers':>7} {'balanced':>9} {'affinity':>9} {'max/mean':>9} {'moved +1':>9}")
+    for workers in args.workers:
+        balanced = snapshot_reads(args, workers, "balanced")
+        affinity = snapshot_reads(args, workers, "affinity")
+        peak, moved = ring_balance(10000, workers)
+        print(f"{workers:>7} {balanced:>9.2f} {affinity:>9.2f} {peak:>9.2f} {moved:>9.1%}")
+    print("balanced/affinity: room snapshot reads per room per second; max/mean: rooms on the busiest worker")
+    print("over the average (10,000 rooms); moved +1: share of rooms that move when one worker is added")
+
+if __name__ == "__main__":
+    main()
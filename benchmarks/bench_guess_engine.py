@@ -0,0 +1,44 @@
+"""
+Micro-benchmark for guess_engine: guesses judged per second for a chat flood.
+
+Run from the repository root:
+    python -m benchmarks.bench_guess_engine
+"""
+import random
+import string
+from guess_engine import evaluate_guesses, get_matcher
+from benchmarks.bench_stroke_codec import best_of
+
+WORDS = ["cat", "house", "airplane", "ice cream", "butterfly", "crème brûlée"]
+
+def make_guesses(word, count, rng):
+    """
+    A mix of exact, near-miss, repeated and random guesses, some long.
+    """
+    guesses = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.05:
+            guesses.append(word.upper())
+        elif kind < 0.25:
+            i = rng.randrange(len(word))
+            guesses.append(word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:])
+        elif kind < 0.5:
+            guesses.append(rng.choice(["lol", "is it a dog?", "hmm", "tree"]))
+        else:
+            guesses.append("".join(rng.choice(string.ascii_lowercase + " ") for _ in range(rng.randint(1, 60))))
+    return guesses
+
+def main():
+    rng = random.Random(0)
+    print(f"{'word':>14} {'guesses':>8} {'batch ms':>9} {'guesses/s':>11} {'correct':>8} {'close':>6}")
+    for word in WORDS:
+        guesses = make_guesses(word, 5000, rng)
+        get_matcher.cache_clear()
+        elapsed = best_of(lambda: evaluate_guesses(word, guesses))
+        verdicts = evaluate_guesses(word, guesses)
+        print(f"{word:>14} {len(guesses):>8} {elapsed * 1000:>9.2f} {len(guesses) / elapsed:>11,.0f} "
+              f"{verdicts.count('correct'):>8} {verdicts.count('close'):>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Micro-benchmark for rasterizer: full vs incremental rendering and image sizes.
+
+Run from the repository root:
+    python -m benchmarks.bench_rasterizer
+"""
+import json
+import time
+from rasterizer import RasterCache, rasterize_drawing
+from stroke_codec import pack_strokes
+from benchmarks.fixtures import make_strokes
+from benchmarks.bench_stroke_codec import best_of
+
+STROKES_PER_ROW = 5
+
+def main():
+    print(f"{'strokes':>8} {'json KB':>8} {'png KB':>7} {'webp KB':>8} {'thumb KB':>9} {'full ms':>8} {'incr ms/row':>12}")
+    for count in (20, 100, 300):
+        strokes = make_strokes(count)
+        drawing = {"objects": strokes}
+        full = best_of(lambda: rasterize_drawing(drawing), repeat=3)
+
+        cache = RasterCache()
+        rows = []
+        elapsed = 0.0
+        for base in range(0, count, STROKES_PER_ROW):
+            rows.append({"seq": len(rows) + 1, "base": base, "strokes": pack_strokes(strokes[base:base + STROKES_PER_ROW])})
+            start = time.perf_counter()
+            cache.render("bench", "drawing", rows)
+            elapsed += time.perf_counter() - start
+
+        print(f"{count:>8} {len(json.dumps(drawing)) / 1024:>8.0f} {len(rasterize_drawing(drawing)) / 1024:>7.1f} "
+              f"{len(rasterize_drawing(drawing, fmt='WEBP')) / 1024:>8.1f} {len(rasterize_drawing(drawing, 0.25)) / 1024:>9.1f} "
+              f"{full * 1000:>8.1f} {elapsed * 1000 / len(rows):>12.1f}")
+
+if __name__ == "__main__":
+    main()
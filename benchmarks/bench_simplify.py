@@ -0,0 +1,63 @@
+"""
+Point reduction and visual fidelity of stroke_simplify.
+
+Rasterizes mouse-like strokes before and after simplification and reports
+the share of ink pixels of each image lying within one pixel of the other's
+ink. Exits non-zero if the default tolerance falls below MIN_COVERAGE.
+
+Run from the repository root:
+    python -m benchmarks.bench_simplify
+"""
+import sys
+import time
+import numpy as np
+from rasterizer import DrawingRaster
+from stroke_codec import pack_strokes
+from stroke_simplify import simplify_strokes, SIMPLIFY_TOLERANCE
+from benchmarks.fixtures import make_smooth_strokes
+
+MIN_COVERAGE = 0.97
+
+def ink(objects):
+    raster = DrawingRaster()
+    raster.draw(objects)
+    return (np.asarray(raster.image) != 255).any(axis=2)
+
+def dilate(mask):
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    return grown
+
+def coverage(a, b):
+    """
+    Share of a's ink within one pixel of b's ink.
+    """
+    return (a & dilate(b)).sum() / max(1, a.sum())
+
+def main():
+    strokes = make_smooth_strokes(50)
+    original = ink(strokes)
+    points = sum(len(obj["path"]) for obj in strokes)
+    size = len(pack_strokes(strokes))
+    print(f"{'tolerance':>9} {'points':>7} {'ratio':>6} {'packed B':>9} {'ms':>7} {'orig kept':>10} {'no extra':>9}")
+    passed = True
+    for tolerance in sorted({0.5, 1.0, 2.0, SIMPLIFY_TOLERANCE}):
+        start = time.perf_counter()
+        simplified = simplify_strokes(strokes, tolerance)
+        elapsed = time.perf_counter() - start
+        kept = sum(len(obj["path"]) for obj in simplified)
+        image = ink(simplified)
+        recall, precision = coverage(original, image), coverage(image, original)
+        print(f"{tolerance:>9} {kept:>7} {points / kept:>6.2f} {len(pack_strokes(simplified)):>9} {elapsed * 1000:>7.1f} {recall:>10.4f} {precision:>9.4f}")
+        if tolerance == SIMPLIFY_TOLERANCE and min(recall, precision) < MIN_COVERAGE:
+            passed = False
+    print(f"{points} points, {size} bytes packed before simplification")
+    if not passed:
+        print(f"Fidelity below {MIN_COVERAGE} at the default tolerance {SIMPLIFY_TOLERANCE}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
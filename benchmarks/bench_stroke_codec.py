@@ -0,0 +1,34 @@
+"""
+Micro-benchmark for stroke_codec: payload size and encode/decode throughput.
+
+Run from the repository root:
+    python -m benchmarks.bench_stroke_codec
+"""
+import json
+import time
+from stroke_codec import encode_strokes, decode_strokes, pack_strokes
+from benchmarks.fixtures import make_strokes
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    print(f"{'strokes':>8} {'points':>8} {'json KB':>9} {'packed KB':>10} {'ratio':>6} {'enc ms':>8} {'dec ms':>8} {'enc pts/s':>11} {'dec pts/s':>11}")
+    for count in (10, 50, 200, 500):
+        strokes = make_strokes(count)
+        points = sum(len(s["path"]) for s in strokes)
+        json_size = len(json.dumps(strokes, separators=(",", ":")))
+        packed_size = len(pack_strokes(strokes))
+        buf = encode_strokes(strokes)
+        enc = best_of(lambda: encode_strokes(strokes))
+        dec = best_of(lambda: decode_strokes(buf))
+        print(f"{count:>8} {points:>8} {json_size / 1024:>9.1f} {packed_size / 1024:>10.1f} {json_size / packed_size:>6.1f} "
+              f"{enc * 1000:>8.2f} {dec * 1000:>8.2f} {points / enc:>11,.0f} {points / dec:>11,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Micro-benchmark for word_bank: load time and draw rate for a large word file.
+
+Run from the repository root:
+    python -m benchmarks.bench_word_bank
+"""
+import os
+import gzip
+import time
+import random
+import string
+import tempfile
+import tracemalloc
+from word_bank import DIFFICULTIES, load_word_bank, WordSampler
+from benchmarks.bench_stroke_codec import best_of
+
+def write_word_file(path, count, rng):
+    categories = [f"category{i}" for i in range(20)]
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write("word\tdifficulty\tcategory\n")
+        for i in range(count):
+            word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 12))) + str(i)
+            f.write(f"{word}\t{rng.choice(DIFFICULTIES)}\t{rng.choice(categories)}\n")
+
+def main():
+    rng = random.Random(0)
+    print(f"{'words':>8} {'file KB':>8} {'load ms':>8} {'heap MB':>8} {'draws/s':>11}")
+    for count in (1000, 10000, 50000):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "words.tsv.gz")
+            write_word_file(path, count, rng)
+            tracemalloc.start()
+            start = time.perf_counter()
+            bank = load_word_bank(path)
+            load = time.perf_counter() - start
+            heap = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            sampler = WordSampler(bank.pool("medium"))
+            draws = len(sampler.pool)
+            elapsed = best_of(lambda: [sampler.draw() for _ in range(draws)])
+            print(f"{count:>8} {os.path.getsize(path) / 1024:>8.0f} {load * 1000:>8.1f} {heap / 2**20:>8.1f} {draws / elapsed:>11,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import math
+import random
+
+CANVAS_WIDTH = 600
+CANVAS_HEIGHT = 450
+
+def make_stroke(rng, n_points=60, color="#000000", width=2):
+    """
+    Build a freehand path object shaped like fabric.js PencilBrush output.
+    """
+    x = rng.uniform(50, CANVAS_WIDTH - 50)
+    y = rng.uniform(50, CANVAS_HEIGHT - 50)
+    points = []
+    for _ in range(n_points):
+        x = min(max(x + rng.uniform(-6, 6), 0), CANVAS_WIDTH)
+        y = min(max(y + rng.uniform(-6, 6), 0), CANVAS_HEIGHT)
+        points.append((round(x * 2) / 2, round(y * 2) / 2))
+    return _path_object(points, color, width)
+
+def _path_object(points, color, width):
+    path = [["M", points[0][0], points[0][1]]]
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        path.append(["Q", x1, y1, (x1 + x2) / 2, (y1 + y2) / 2])
+    path.append(["L", points[-1][0], points[-1][1]])
+
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return {
+        "type": "path", "version": "4.4.0", "originX": "left", "originY": "top",
+        "left": min(xs) - width / 2, "top": min(ys) - width / 2,
+        "width": max(xs) - min(xs), "height": max(ys) - min(ys),
+        "fill": None, "stroke": color, "strokeWidth": width, "strokeDashArray": None,
+        "strokeLineCap": "round", "strokeDashOffset": 0, "strokeLineJoin": "round",
+        "strokeUniform": False, "strokeMiterLimit": 10, "scaleX": 1, "scaleY": 1,
+        "angle": 0, "flipX": False, "flipY": False, "opacity": 1, "shadow": None,
+        "visible": True, "backgroundColor": "", "fillRule": "nonzero",
+        "paintFirst": "fill", "globalCompositeOperation": "source-over",
+        "skewX": 0, "skewY": 0, "path": path
+    }
+
+def make_smooth_stroke(rng, length=300, color="#000000", width=2):
+    """
+    Build a freehand path sampled like mouse events: a smooth curve with a
+    point every 1-3 pixels, snapped to half pixels.
+    """
+    x = rng.uniform(100, CANVAS_WIDTH - 100)
+    y = rng.uniform(100, CANVAS_HEIGHT - 100)
+    heading = rng.uniform(0, 2 * math.pi)
+    turn = rng.uniform(-0.05, 0.05)
+    points = []
+    travelled = 0.0
+    while travelled < length:
+        step = rng.uniform(1, 3)
+        turn = max(-0.08, min(0.08, turn + rng.uniform(-0.01, 0.01)))
+        heading += turn * step
+        x = min(max(x + step * math.cos(heading), 0), CANVAS_WIDTH)
+        y = min(max(y + step * math.sin(heading), 0), CANVAS_HEIGHT)
+        points.append((round(x * 2) / 2, round(y * 2) / 2))
+        travelled += step
+    return _path_object(points, color, width)
+
+def make_smooth_strokes(count, seed=0, length=(100, 500)):
+    rng = random.Random(seed)
+    colors = ["#000000", "#FF5722", "#3F51B5", "#4CAF50"]
+    return [
+        make_smooth_stroke(rng, rng.uniform(*length), rng.choice(colors), rng.choice([2, 2, 5, 10]))
+        for _ in range(count)
+    ]
+
+def make_strokes(count, seed=0, points=(20, 120)):
+    """
+    Build a list of strokes with a few colors and brush sizes, as a drawer would.
+    """
+    rng = random.Random(seed)
+    colors = ["#000000", "#FF5722", "#3F51B5", "#4CAF50"]
+    return [
+        make_stroke(rng, rng.randint(*points), rng.choice(colors), rng.choice([2, 2, 5, 10]))
+        for _ in range(count)
+    ]
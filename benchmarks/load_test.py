@@ -0,0 +1,309 @@
+"""
+Multi-room load generator for the game logic against a local backend.
+
+Drives the real initialize_game, sync_game_state, start_game, set_chosen_word,
+send_chat_message, new_round and leave_game code paths for N rooms x M
+players, plus spectator_view for --spectators read-only viewers per room. Each virtual session gets its own st.session_state; one thread
+runs each room. Prints a JSON report (latency percentiles per operation,
+throughput, DB calls per player-second) to stdout or --output, and the
+Prometheus metrics of the run to --metrics-output.
+
+Run from the repository root:
+    python -m benchmarks.load_test --rooms 20 --players 4 --duration 15 --latency-ms 20
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import platform
+import threading
+import subprocess
+from collections import defaultdict
+
+import metrics
+import game_logic
+import stroke_sync
+import room_cache
+import spectators
+import room_snapshot
+from local_backend import MemoryBackend, SQLiteBackend
+from benchmarks.fixtures import make_strokes
+
+GUESSES = ["cat", "house", "tree", "boat", "lamp", "sun", "car", "castle", "dog", "bridge"]
+
+class SessionState(dict):
+    """
+    Attribute-access dict standing in for st.session_state.
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+class VirtualStreamlit:
+    """
+    Replacement for the streamlit module inside game_logic.
+
+    session_state resolves to whichever virtual session the calling thread
+    has activated, so one module-level object serves every room thread.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self.errors = defaultdict(int)
+        self.warnings = defaultdict(int)
+        self._errors_lock = threading.Lock()
+
+    @property
+    def session_state(self):
+        return self._local.session
+
+    def activate(self, session):
+        self._local.session = session
+
+    def error(self, message):
+        with self._errors_lock:
+            self.errors[str(message).split(":")[0]] += 1
+
+    def warning(self, message):
+        with self._errors_lock:
+            self.warnings[str(message).split(";")[0]] += 1
+
+    def rerun(self):
+        pass
+
+def new_session_state(username, difficulty="medium", min_players=2):
+    """
+    Session defaults as set up by main.py before a player joins.
+    """
+    return SessionState(
+        user_id=f"user-{username}-{random.getrandbits(32):08x}",
+        in_game=False,
+        difficulty=difficulty,
+        round_time=60,
+        max_rounds=3,
+        min_players=min_players,
+        drawing_data=None,
+        drawing_player_index=None,
+        hidden_word="",
+        chat_messages=[],
+        word_options=[],
+        current_word="",
+        word_length=0
+    )
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def timed(self, name, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.samples[name].append(elapsed)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(samples):
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values),
+        "p50_ms": 1000 * percentile(values, 0.50),
+        "p95_ms": 1000 * percentile(values, 0.95),
+        "p99_ms": 1000 * percentile(values, 0.99),
+        "max_ms": 1000 * values[-1]
+    }
+
+class RoomDriver:
+    """
+    Plays one room: create, join, start, then draw/guess/sync until the deadline.
+    """
+    def __init__(self, index, args, backend, st, recorder):
+        self.room_id = None
+        self.args = args
+        self.backend = backend
+        self.st = st
+        self.recorder = recorder
+        self.rng = random.Random(index)
+        self.sessions = [new_session_state(f"r{index}p{i}") for i in range(args.players)]
+        self.strokes = make_strokes(args.strokes_per_drawing, seed=index)
+
+    def call(self, session, name, fn, *args):
+        self.st.activate(session)
+        return self.recorder.timed(name, fn, self.backend, *args)
+
+    def sync(self, session):
+        session.last_sync = 0  # the benchmark sets its own sync cadence
+        self.call(session, "sync_game_state", game_logic.sync_game_state)
+
+    def drawer(self):
+        owner = self.sessions[0]
+        if owner.get("drawing_player_index") is None or not owner.get("players"):
+            return None
+        drawer_id = owner.players[owner.drawing_player_index]["id"]
+        return next((s for s in self.sessions if s.user_id == drawer_id), None)
+
+    def setup(self):
+        owner = self.sessions[0]
+        self.call(owner, "initialize_game", game_logic.initialize_game, None, True, "p0")
+        self.room_id = owner.room_id
+        for i, session in enumerate(self.sessions[1:], start=1):
+            self.call(session, "initialize_game", game_logic.initialize_game, self.room_id, False, f"p{i}")
+        self.sync(owner)
+        self.call(owner, "start_game", game_logic.start_game)
+
+    def tick(self):
+        for session in self.sessions:
+            if session.in_game:
+                self.sync(session)
+
+        drawer = self.drawer()
+        if drawer is not None and drawer.in_game:
+            if drawer.word_options:
+                self.call(drawer, "set_chosen_word", game_logic.set_chosen_word, self.rng.choice(drawer.word_options))
+            elif drawer.current_word:
+                drawn = min(len(self.strokes), drawer.get("stroke_acked", 0) + 1)
+                self.st.activate(drawer)
+                drawer.stroke_acked, drawer.stroke_seq = self.recorder.timed(
+                    "push_new_strokes", stroke_sync.push_new_strokes, self.backend, self.room_id, drawer.drawing_id,
+                    {"objects": self.strokes[:drawn]}, drawer.stroke_acked, drawer.stroke_seq
+                )
+
+        for session in self.sessions:
+            if session is drawer or not session.in_game or self.rng.random() > self.args.guess_rate:
+                continue
+            word = drawer.current_word if drawer is not None else ""
+            correct = bool(word) and self.rng.random() < self.args.correct_rate
+            guess = word if correct else self.rng.choice(GUESSES)
+            self.call(session, "send_chat_message", game_logic.send_chat_message, guess)
+
+        for _ in range(self.args.spectators):
+            self.recorder.timed("spectator_view", spectators.spectator_view, self.backend, self.room_id)
+
+        owner = self.sessions[0]
+        if owner.in_game and owner.game_state == "active" and owner.get("word_length") and self.rng.random() < self.args.new_round_rate:
+            self.call(owner, "new_round", game_logic.new_round)
+
+    def teardown(self):
+        for session in reversed(self.sessions):
+            if session.in_game:
+                self.call(session, "leave_game", game_logic.leave_game)
+
+    def run(self, deadline):
+        self.setup()
+        while time.perf_counter() < deadline:
+            tick_start = time.perf_counter()
+            self.tick()
+            time.sleep(max(0.0, self.args.tick - (time.perf_counter() - tick_start)))
+        self.teardown()
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    latency = args.latency_ms / 1000
+    if args.jitter_ms:
+        latency = lambda: max(0.0, random.gauss(args.latency_ms / 1000, args.jitter_ms / 1000))
+    backend = SQLiteBackend(args.sqlite_path, latency=latency) if args.backend == "sqlite" else MemoryBackend(latency=latency)
+
+    if args.snapshot == "tables":
+        room_snapshot._snapshot_rpc_available = False
+    os.environ["DRAWING_GAME_REALTIME"] = "1" if args.realtime == "on" else "0"
+    room_cache.ROOM_CACHE_TTL = args.room_cache_ttl
+
+    st = VirtualStreamlit()
+    recorder = Recorder()
+    original_st = game_logic.st
+    game_logic.st = st
+    try:
+        drivers = [RoomDriver(i, args, backend, st, recorder) for i in range(args.rooms)]
+        start = time.perf_counter()
+        deadline = start + args.duration
+        threads = [threading.Thread(target=driver.run, args=(deadline,), daemon=True) for driver in drivers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+    finally:
+        game_logic.st = original_st
+        room_snapshot._snapshot_rpc_available = True
+
+    total_ops = sum(len(v) for v in recorder.samples.values())
+    db_calls = sum(backend.calls.values())
+    player_seconds = args.rooms * args.players * wall
+    calls_by_table = defaultdict(int)
+    for (table, action), count in backend.calls.items():
+        calls_by_table[f"{table}.{action}"] += count
+
+    return {
+        "version": git_version(),
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "wall_seconds": wall,
+        "throughput_ops_per_second": total_ops / wall,
+        "operations": {name: summarize(samples) for name, samples in sorted(recorder.samples.items())},
+        "db_calls": {
+            "total": db_calls,
+            "per_player_second": db_calls / player_seconds,
+            "by_table": dict(sorted(calls_by_table.items()))
+        },
+        "errors": dict(st.errors),
+        "warnings": dict(st.warnings)
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of steady-state play")
+    parser.add_argument("--tick", type=float, default=2.0, help="seconds between sync rounds per room")
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--sqlite-path", default=":memory:")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated round-trip time per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--guess-rate", type=float, default=0.3, help="chance a guesser sends a message per tick")
+    parser.add_argument("--correct-rate", type=float, default=0.05, help="chance a message is the right word")
+    parser.add_argument("--new-round-rate", type=float, default=0.02, help="chance per tick the owner skips the round")
+    parser.add_argument("--snapshot", choices=["rpc", "tables"], default="rpc", help="sync through the room_snapshot RPC or per-table queries")
+    parser.add_argument("--realtime", choices=["on", "off"], default="on", help="sync from realtime room state or by polling the database")
+    parser.add_argument("--room-cache-ttl", type=float, default=room_cache.ROOM_CACHE_TTL, help="seconds a polled room snapshot is shared between sessions; 0 disables")
+    parser.add_argument("--spectators", type=int, default=0, help="read-only viewers per room, each refreshing once per tick")
+    parser.add_argument("--strokes-per-drawing", type=int, default=40)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--metrics-output", help="also write the Prometheus metrics collected during the run here")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        sys.stdout.write(report + "\n")
+    if args.metrics_output:
+        metrics.write_metrics_file(args.metrics_output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import json
+import zlib
+import base64
+import logging
+from supabase import Client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = "CA01"
+ZLIB_LEVEL = 9
+CHAT_HOT_TAIL = int(os.getenv("DRAWING_GAME_CHAT_HOT_TAIL", "200"))  # messages per room kept in chat_messages
+MIN_COMPACTION = 100  # archive only once a room is this many messages over its tail
+SEGMENT_SIZE = 500  # messages per archive segment
+
+def pack_segment(messages):
+    """
+    Compress chat rows (id, message_data, created_at) into an archive segment payload.
+    """
+    raw = json.dumps(messages, separators=(",", ":")).encode()
+    return MAGIC + base64.b64encode(zlib.compress(raw, ZLIB_LEVEL)).decode("ascii")
+
+def unpack_segment(payload):
+    if not payload.startswith(MAGIC):
+        raise ValueError("Not a chat archive segment")
+    return json.loads(zlib.decompress(base64.b64decode(payload[len(MAGIC):])))
+
+def compaction_candidates(supabase: Client, keep=CHAT_HOT_TAIL, min_batch=MIN_COMPACTION):
+    """
+    Rooms with at least min_batch messages beyond their newest keep, as
+    [{"room_id", "cutoff_id"}], cutoff_id being the newest message to archive.
+    """
+    params = {"p_keep": keep, "p_min_batch": min_batch}
+    try:
+        return supabase.rpc("chat_compaction_candidates", params).execute().data or []
+    except Exception as e:
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        logger.warning("chat_compaction_candidates function is not deployed; scanning chat_messages")
+        return chat_compaction_candidates_local(supabase, **params)
+
+def chat_compaction_candidates_local(client, p_keep=CHAT_HOT_TAIL, p_min_batch=MIN_COMPACTION):
+    """
+    chat_compaction_candidates for local backends; runs inside the backend's transaction.
+    """
+    ids_by_room = {}
+    for row in client.table("chat_messages").select("room_id, id").execute().data:
+        ids_by_room.setdefault(row["room_id"], []).append(row["id"])
+    candidates = []
+    for room_id, ids in ids_by_room.items():
+        if len(ids) - p_keep >= p_min_batch:
+            ids.sort()
+            candidates.append({"room_id": room_id, "cutoff_id": ids[-p_keep - 1]})
+    return candidates
+
+def archive_room_chat(supabase: Client, room_id, cutoff_id):
+    """
+    Move a room's messages up to cutoff_id into archive segments. Returns the number moved.
+
+    Segments are keyed by (room_id, first_id) and written before the live
+    rows are deleted, so a sweep interrupted between the two rewrites the
+    same segment next time instead of losing or duplicating messages. Only
+    the archived ids are deleted: a message that commits late inside a
+    segment's id range stays live for the next pass.
+    """
+    moved = 0
+    while True:
+        rows = supabase.table("chat_messages").select("id, message_data, created_at").eq("room_id", room_id).lte("id", cutoff_id).order("id").limit(SEGMENT_SIZE).execute().data
+        if not rows:
+            return moved
+        supabase.table("chat_archive").upsert({
+            "room_id": room_id,
+            "first_id": rows[0]["id"],
+            "last_id": rows[-1]["id"],
+            "message_count": len(rows),
+            "payload": pack_segment(rows)
+        }, on_conflict="room_id,first_id").execute()
+        supabase.table("chat_messages").delete().eq("room_id", room_id).in_("id", [row["id"] for row in rows]).execute()
+        moved += len(rows)
+
+def compact_chat(supabase: Client, keep=CHAT_HOT_TAIL, min_batch=MIN_COMPACTION):
+    """
+    Archive every room's chat beyond its hot tail. Returns {room_id: messages archived}.
+    """
+    archived = {}
+    for candidate in compaction_candidates(supabase, keep, min_batch):
+        try:
+            archived[candidate["room_id"]] = archive_room_chat(supabase, candidate["room_id"], candidate["cutoff_id"])
+        except Exception as e:
+            logger.error(f"Error archiving chat of room {candidate['room_id']}: {e}")
+    return archived
+
+def chat_history(supabase: Client, room_id, before_id=None, limit=100):
+    """
+    Up to limit messages of a room older than before_id (newest if None), oldest first,
+    read from the live table and, past its tail, from the archive.
+    """
+    query = supabase.table("chat_messages").select("id, message_data, created_at").eq("room_id", room_id)
+    if before_id is not None:
+        query = query.lt("id", before_id)
+    messages = query.order("id", desc=True).limit(limit).execute().data
+    before_id = messages[-1]["id"] if messages else before_id
+
+    while len(messages) < limit:
+        query = supabase.table("chat_archive").select("first_id, payload").eq("room_id", room_id)
+        if before_id is not None:
+            query = query.lt("first_id", before_id)
+        segment = query.order("first_id", desc=True).limit(1).execute().data
+        if not segment:
+            break
+        rows = [row for row in unpack_segment(segment[0]["payload"]) if before_id is None or row["id"] < before_id]
+        messages.extend(reversed(rows[-(limit - len(messages)):]))
+        before_id = segment[0]["first_id"]
+    return list(reversed(messages))
@@ -0,0 +1,29 @@
+import functools
+import streamlit as st
+from app_sessions import current_session_id, in_fragment_rerun
+from metrics import begin_script_run
+
+# st.fragment from Streamlit 1.37, st.experimental_fragment from 1.33; None before that
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+FRAGMENTS_SUPPORTED = _fragment is not None
+
+def fragment(run_every=None):
+    """
+    Decorator making a pane rerun on its own (and every run_every seconds if given).
+
+    On Streamlit versions without fragments the function runs as part of
+    every full rerun, as before. A rerun of only this fragment never runs
+    main.py, so it is counted as a script run here, labelled with the
+    function's name.
+    """
+    if _fragment is None:
+        return lambda fn: fn
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def counted(*args, **kwargs):
+            if in_fragment_rerun():
+                begin_script_run(current_session_id(), fn.__name__)
+            return fn(*args, **kwargs)
+        return _fragment(run_every=run_every)(counted)
+    return decorator
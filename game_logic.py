@@ -2,22 +2,44 @@ import streamlit as st
 import time
 import random
 import uuid
+import json
+import bisect
 import logging
+from collections import deque
 from supabase import Client
+from stroke_sync import apply_stroke_rows, build_drawing
+from room_snapshot import fetch_room_snapshot, ChatCursor
+from room_cache import get_room_cache, invalidate_room
+from presence import get_presence_tracker
+from room_realtime import get_realtime_hub
+from app_sessions import current_session_id, current_fragment_id
+from scoring import guess_points, award_correct_guess
+from round_timer import advance_round, get_round_timer
+from janitor import get_janitor
+from room_codes import get_room_code_allocator
+from mutations import MutationBatch, StaleStateError
+from guess_engine import evaluate_guess, CORRECT, CLOSE
+from word_bank import draw_words
+from rasterizer import get_raster_cache, rasterize_drawing
+from metrics import instrument, observe, record_payload, timed
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def initialize_game(supabase: Client, room_id, is_owner=False, username="Player"):
+CHAT_BUFFER_SIZE = 100
+
+@instrument
+def initialize_game(supabase: Client, room_id, is_owner=False, username="Player", rejoin=False):
     """
-    Initialize a game room with Supabase.
+    Initialize a game room with Supabase. An owner passing room_id=None creates a room under a fresh code.
+
+    With rejoin, a player handed off from another worker keeps their existing player row.
     """
     if not supabase:
         st.error("Database connection not available")
         st.session_state.in_game = False
         return
 
-    start_time = time.time()
     logger.info(f"Starting initialize_game for room {room_id}")
 
     st.session_state.room_id = room_id
@@ -28,19 +50,27 @@ def initialize_game(supabase: Client, room_id, is_owner=False, username="Player"
     st.session_state.drawing_data = None
     st.session_state.drawing_player_index = None
     st.session_state.hidden_word = ""
-    st.session_state.chat_messages = []
+    st.session_state.word_length = 0
+    st.session_state.chat_messages = deque(maxlen=CHAT_BUFFER_SIZE)
+    st.session_state.chat_ids = deque(maxlen=CHAT_BUFFER_SIZE)
+    st.session_state.chat_cursor = ChatCursor()
     st.session_state.word_options = []
     st.session_state.current_word = ""
+    st.session_state.guess_feedback = ""
+    st.session_state.drawing_id = ""
+    st.session_state.drawing_strokes = []
+    st.session_state.stroke_seq = 0
+    st.session_state.stroke_acked = 0
+    st.session_state.room_row = None
+    st.session_state.room_version = None
+    st.session_state.players_etag = None
 
     try:
-        room_check_start = time.time()
-        room = supabase.table("rooms").select("*").eq("id", room_id).execute()
-        logger.info(f"Room check took {time.time() - room_check_start:.2f} seconds")
+        # A new room's code is unused by construction, so creating one needs no lookup
+        room = None if is_owner else supabase.table("rooms").select("*").eq("id", room_id).execute()
 
-        if not room.data and is_owner:
-            room_insert_start = time.time()
+        if is_owner:
             room_data = {
-                "id": room_id,
                 "owner_id": st.session_state.user_id,
                 "settings": {
                     "difficulty": st.session_state.difficulty,
@@ -55,14 +85,17 @@ def initialize_game(supabase: Client, room_id, is_owner=False, username="Player"
                     "current_word": "",
                     "drawing_player_id": "",
                     "timer_start": 0,
-                    "word_options": []
+                    "word_options": [],
+                    "drawing_id": ""
                 },
                 "drawing_data": None
             }
-            supabase.table("rooms").insert(room_data).execute()
-            logger.info(f"Room insert took {time.time() - room_insert_start:.2f} seconds")
+            if room_id is None:
+                room_id = get_room_code_allocator(supabase).create_room(room_data)
+            else:
+                supabase.table("rooms").insert(dict(room_data, id=room_id)).execute()
+            st.session_state.room_id = room_id
 
-            player_insert_start = time.time()
             player_id = str(uuid.uuid4())
             player_data = {
                 "id": player_id,
@@ -74,53 +107,33 @@ def initialize_game(supabase: Client, room_id, is_owner=False, username="Player"
                 "avatar": username[0].upper(),
                 "last_seen": int(time.time())
             }
-            supabase.table("players").insert(player_data).execute()
-            logger.info(f"Player insert took {time.time() - player_insert_start:.2f} seconds")
+            with MutationBatch(supabase) as batch:
+                batch.insert("players", player_data)
+                batch.system_message(room_id, f"Room {room_id} created! Waiting for at least {st.session_state.min_players} players to join.")
+                batch.system_message(room_id, f"{username} has joined the room.")
 
-            message_insert_start = time.time()
-            system_messages = [
-                {
-                    "room_id": room_id,
-                    "message_data": {
-                        "type": "system",
-                        "content": f"Room {room_id} created! Waiting for at least {st.session_state.min_players} players to join."
-                    }
-                },
-                {
-                    "room_id": room_id,
-                    "message_data": {
-                        "type": "system",
-                        "content": f"{username} has joined the room."
-                    }
-                }
-            ]
-            supabase.table("chat_messages").insert(system_messages).execute()
-            logger.info(f"Message insert took {time.time() - message_insert_start:.2f} seconds")
-
-        elif room.data and not is_owner:
-            join_start = time.time()
+        elif room.data:
             room = room.data[0]
-            player_id = str(uuid.uuid4())
-            player_data = {
-                "id": player_id,
-                "user_id": st.session_state.user_id,
-                "room_id": room_id,
-                "name": username,
-                "score": 0,
-                "color": random.choice(["#FF5722", "#E91E63", "#9C27B0", "#673AB7", "#3F51B5"]),
-                "avatar": username[0].upper(),
-                "last_seen": int(time.time())
-            }
-            supabase.table("players").insert(player_data).execute()
-
-            new_message = {
-                "room_id": room_id,
-                "message_data": {
-                    "type": "system",
-                    "content": f"{username} has joined the room."
+            existing = supabase.table("players").select("id").eq("room_id", room_id).eq("user_id", st.session_state.user_id).execute().data if rejoin else []
+            if existing:
+                st.session_state.is_room_owner = room.get("owner_id") == st.session_state.user_id
+                get_presence_tracker(supabase).heartbeat(room_id, st.session_state.user_id, session_id=current_session_id())
+                logger.info(f"{username} rejoined room {room_id} after a handoff")
+            else:
+                player_id = str(uuid.uuid4())
+                player_data = {
+                    "id": player_id,
+                    "user_id": st.session_state.user_id,
+                    "room_id": room_id,
+                    "name": username,
+                    "score": 0,
+                    "color": random.choice(["#FF5722", "#E91E63", "#9C27B0", "#673AB7", "#3F51B5"]),
+                    "avatar": username[0].upper(),
+                    "last_seen": int(time.time())
                 }
-            }
-            supabase.table("chat_messages").insert(new_message).execute()
+                with MutationBatch(supabase) as batch:
+                    batch.insert("players", player_data)
+                    batch.system_message(room_id, f"{username} has joined the room.")
 
             settings = room.get("settings", {})
             st.session_state.difficulty = settings.get("difficulty", "medium")
@@ -131,59 +144,102 @@ def initialize_game(supabase: Client, room_id, is_owner=False, username="Player"
             st.session_state.drawing_data = room.get("drawing_data", None)
             st.session_state.drawing_player_index = None
             st.session_state.hidden_word = ""
+            st.session_state.word_length = 0
             st.session_state.word_options = []
             st.session_state.current_word = ""
-            logger.info(f"Join room took {time.time() - join_start:.2f} seconds")
 
-        elif not room.data and not is_owner:
+        else:
             st.error(f"Room {room_id} does not exist!")
             st.session_state.in_game = False
             return
 
         st.session_state.game_initialized = True
+        invalidate_room(supabase, room_id)
         sync_game_state(supabase)
-        logger.info(f"Total initialize_game took {time.time() - start_time:.2f} seconds")
 
     except Exception as e:
         st.error(f"Error initializing game: {e}")
         st.session_state.in_game = False
         logger.error(f"Error in initialize_game: {e}")
 
+def remember_room(row):
+    """
+    Keep a room row this session wrote as its copy, so the next sync sees that version as not modified.
+    """
+    if row:
+        st.session_state.room_row = row
+        st.session_state.room_version = row.get("version")
+
+def resync_after_conflict(supabase: Client, action):
+    """
+    Another writer changed the room first: drop the session's copy and sync afresh.
+    """
+    st.warning(f"The game changed before you could {action}; showing the latest state.")
+    logger.info(f"Stale write rejected in room {st.session_state.room_id}: {action}")
+    st.session_state.room_version = None
+    st.session_state.last_sync = 0
+    invalidate_room(supabase, st.session_state.room_id)
+
 def sync_game_state(supabase: Client):
     """
     Synchronize local game state with Supabase.
+
+    Sends the room version and players etag this session already has, so a
+    quiet room answers with only new chat and strokes.
     """
     if not st.session_state.in_game or not st.session_state.room_id or not supabase:
         return
 
     current_time = time.time()
-    if current_time - st.session_state.last_sync < 2:  # Faster sync for chat
+    hub = get_realtime_hub(supabase)
+    live_state = hub.watch(st.session_state.room_id, st.session_state.user_id, current_session_id()) if hub else None
+    st.session_state.live_chat = live_state is not None
+    if live_state is None and current_time - st.session_state.last_sync < 2:  # Faster sync for chat
         return
 
-    sync_start = time.time()
+    sync_start = time.perf_counter()
     try:
-        supabase.table("players").update({"last_seen": int(current_time)}).eq("user_id", st.session_state.user_id).eq("room_id", st.session_state.room_id).execute()
-
-        room = supabase.table("rooms").select("*").eq("id", st.session_state.room_id).execute()
-        if not room.data:
+        get_presence_tracker(supabase).heartbeat(st.session_state.room_id, st.session_state.user_id, current_time, current_session_id())
+        sync_args = {
+            **st.session_state.chat_cursor.sync_args(current_time),
+            "drawing_id": st.session_state.drawing_id,
+            "stroke_after": st.session_state.stroke_seq,
+            "now": current_time,
+            "room_version": st.session_state.room_version,
+            "players_etag": st.session_state.players_etag
+        }
+        room_cache = get_room_cache(supabase)
+        with timed("sync_game_state.snapshot"):
+            if live_state is not None:
+                # Kept current by the realtime hub, which also reruns this session when its view changes
+                snapshot = live_state.snapshot(**sync_args)
+            elif room_cache is not None:
+                snapshot = room_cache.get(st.session_state.room_id).snapshot(**sync_args)
+            else:
+                snapshot = fetch_room_snapshot(supabase, st.session_state.room_id, **sync_args)
+        if snapshot["version"] is None:
             st.error("Room no longer exists!")
             st.session_state.in_game = False
             return
 
-        room = room.data[0]
-        players_data = supabase.table("players").select("*").eq("room_id", st.session_state.room_id).execute()
-        st.session_state.players = [
-            {
-                "id": player["user_id"],
-                "name": player["name"],
-                "score": player["score"],
-                "color": player["color"],
-                "avatar": player["avatar"]
-            }
-            for player in players_data.data
-            if current_time - player["last_seen"] < 60
-        ]
-        st.session_state.players = sorted(st.session_state.players, key=lambda x: x["score"], reverse=True)
+        if snapshot["room"] is not None:
+            st.session_state.room_row = snapshot["room"]
+        st.session_state.room_version = snapshot["version"]
+        room = st.session_state.room_row
+        get_round_timer(supabase).sync_room(st.session_state.room_id, room)
+        if snapshot["players"] is not None:
+            st.session_state.players = [
+                {
+                    "id": player["user_id"],
+                    "name": player["name"],
+                    "score": player["score"],
+                    "color": player["color"],
+                    "avatar": player["avatar"]
+                }
+                for player in snapshot["players"]
+            ]
+            st.session_state.players = sorted(st.session_state.players, key=lambda x: x["score"], reverse=True)
+        st.session_state.players_etag = snapshot["players_etag"]
 
         game_state = room.get("game_state", {})
         st.session_state.game_state = game_state.get("status", "waiting")
@@ -197,43 +253,62 @@ def sync_game_state(supabase: Client):
                     break
 
             if st.session_state.drawing_player_index is not None:
-                st.session_state.current_word = game_state.get("current_word", "")
-                st.session_state.hidden_word = "_ " * len(st.session_state.current_word)
+                is_drawing_player = st.session_state.players[st.session_state.drawing_player_index]["id"] == st.session_state.user_id
+                # Only the drawer's session holds the word; guesses are judged against the room state
+                word = game_state.get("current_word", "")
+                st.session_state.current_word = word if is_drawing_player else ""
+                st.session_state.word_length = len(word)
+                st.session_state.hidden_word = "_ " * len(word)
                 st.session_state.round_number = game_state.get("current_round", 1)
                 st.session_state.rounds_played = game_state.get("rounds_played", 0)
                 st.session_state.timer_start = game_state.get("timer_start", current_time)
                 st.session_state.word_options = game_state.get("word_options", [])
 
-                is_drawing_player = st.session_state.players[st.session_state.drawing_player_index]["id"] == st.session_state.user_id
+                drawing_id = game_state.get("drawing_id", "")
+                if drawing_id != st.session_state.drawing_id:
+                    st.session_state.drawing_id = drawing_id
+                    st.session_state.drawing_strokes = []
+                    st.session_state.stroke_seq = 0
+                    st.session_state.stroke_acked = 0
+
                 if not is_drawing_player:
-                    st.session_state.drawing_data = room.get("drawing_data", None)
+                    if drawing_id and snapshot["strokes"]:
+                        st.session_state.stroke_seq = apply_stroke_rows(st.session_state.drawing_strokes, snapshot["strokes"])
+                    st.session_state.drawing_data = build_drawing(st.session_state.drawing_strokes)
                 else:
                     st.session_state.drawing_data = None
             else:
                 st.session_state.word_options = []
                 st.session_state.current_word = ""
                 st.session_state.hidden_word = ""
+                st.session_state.word_length = 0
         else:
             st.session_state.drawing_player_index = None
             st.session_state.drawing_data = None
+            st.session_state.drawing_id = ""
+            st.session_state.drawing_strokes = []
+            st.session_state.stroke_seq = 0
+            st.session_state.stroke_acked = 0
             st.session_state.current_word = ""
             st.session_state.hidden_word = ""
+            st.session_state.word_length = 0
             st.session_state.round_number = 1
             st.session_state.rounds_played = 0
             st.session_state.timer_start = 0
             st.session_state.word_options = []
 
-        chat_data = supabase.table("chat_messages").select("message_data").eq("room_id", st.session_state.room_id).order("created_at").limit(50).execute()
-        st.session_state.chat_messages = [msg["message_data"] for msg in chat_data.data]
-        logger.info(f"Chat messages synced: {len(st.session_state.chat_messages)}")
+        new_chat = take_new_chat(snapshot["chat"], current_time)
+        logger.info(f"Chat messages synced: {new_chat} new, {len(st.session_state.chat_messages)} buffered")
 
         st.session_state.last_sync = current_time
-        logger.info(f"sync_game_state took {time.time() - sync_start:.2f} seconds")
-        st.experimental_rerun()
+        observe("sync_game_state", time.perf_counter() - sync_start)
+        if live_state is None:
+            st.rerun()
     except Exception as e:
         st.error(f"Error syncing with Supabase: {e}")
         logger.error(f"Error in sync_game_state: {e}")
 
+@instrument
 def start_game(supabase: Client):
     """
     Start the game with word options for the first drawer.
@@ -246,7 +321,7 @@ def start_game(supabase: Client):
         drawer_index = random.randint(0, len(st.session_state.players) - 1)
         drawer_id = st.session_state.players[drawer_index]["id"]
         drawer_name = st.session_state.players[drawer_index]["name"]
-        word_options = random.sample(st.session_state.word_lists[st.session_state.difficulty], 3)
+        word_options = draw_words(st.session_state.room_id, st.session_state.difficulty, 3)
 
         game_state = {
             "status": "active",
@@ -255,37 +330,35 @@ def start_game(supabase: Client):
             "current_word": "",  # Set after drawer chooses
             "drawing_player_id": drawer_id,
             "timer_start": int(time.time()),
-            "word_options": word_options
+            "word_options": word_options,
+            "drawing_id": ""
         }
 
-        supabase.table("rooms").update({
-            "game_state": game_state,
-            "drawing_data": None
-        }).eq("id", st.session_state.room_id).execute()
-
-        new_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "system",
-                "content": f"Game started! {drawer_name} is choosing a word."
-            }
-        }
-        supabase.table("chat_messages").insert(new_message).execute()
+        with MutationBatch(supabase) as batch:
+            batch.update("rooms", {"game_state": game_state, "drawing_data": None}, expect_version=st.session_state.room_version, id=st.session_state.room_id)
+            batch.system_message(st.session_state.room_id, f"Game started! {drawer_name} is choosing a word.")
+        remember_room(batch.latest("rooms"))
+        invalidate_room(supabase, st.session_state.room_id)
+        get_round_timer(supabase).schedule(st.session_state.room_id, 1, game_state["timer_start"] + st.session_state.round_time, st.session_state.difficulty)
 
         st.session_state.game_state = "active"
         st.session_state.drawing_player_index = drawer_index
         st.session_state.word_options = word_options
         st.session_state.current_word = ""
         st.session_state.hidden_word = ""
+        st.session_state.word_length = 0
         st.session_state.timer_start = time.time()
         st.session_state.drawing_data = None
         logger.info("Game started successfully")
-        st.experimental_rerun()
+        st.rerun()
 
+    except StaleStateError:
+        resync_after_conflict(supabase, "start the game")
     except Exception as e:
         st.error(f"Error starting game: {e}")
         logger.error(f"Error starting game: {e}")
 
+@instrument
 def set_chosen_word(supabase: Client, chosen_word: str):
     """
     Drawer selects a word from options.
@@ -294,36 +367,109 @@ def set_chosen_word(supabase: Client, chosen_word: str):
         return
 
     try:
-        room = supabase.table("rooms").select("game_state").eq("id", st.session_state.room_id).execute().data[0]
-        game_state = room["game_state"]
-        game_state["current_word"] = chosen_word
-        game_state["word_options"] = []
-        game_state["timer_start"] = int(time.time())
-
-        supabase.table("rooms").update({
-            "game_state": game_state,
-            "drawing_data": None
-        }).eq("id", st.session_state.room_id).execute()
-
-        new_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "system",
-                "content": f"{st.session_state.username} is drawing!"
-            }
-        }
-        supabase.table("chat_messages").insert(new_message).execute()
+        drawing_id = str(uuid.uuid4())
+        timer_start = int(time.time())
+        with MutationBatch(supabase) as batch:
+            batch.delete("drawing_strokes", room_id=st.session_state.room_id)
+            # Only applies if nobody (the round timer, a correct guess) moved the room on since this session's view
+            batch.merge("rooms", "game_state", {
+                "current_word": chosen_word,
+                "word_options": [],
+                "timer_start": timer_start,
+                "drawing_id": drawing_id
+            }, expect_version=st.session_state.room_version, id=st.session_state.room_id)
+            batch.system_message(st.session_state.room_id, f"{st.session_state.username} is drawing!")
+        remember_room(batch.latest("rooms"))
+        invalidate_room(supabase, st.session_state.room_id)
+        get_round_timer(supabase).schedule(st.session_state.room_id, st.session_state.round_number, timer_start + st.session_state.round_time, st.session_state.difficulty)
 
         st.session_state.current_word = chosen_word
         st.session_state.hidden_word = "_ " * len(chosen_word)
+        st.session_state.word_length = len(chosen_word)
         st.session_state.word_options = []
-        st.experimental_rerun()
+        st.session_state.drawing_id = drawing_id
+        st.session_state.stroke_seq = 0
+        st.session_state.stroke_acked = 0
+        st.rerun()
 
+    except StaleStateError:
+        resync_after_conflict(supabase, "choose a word")
     except Exception as e:
         st.error(f"Error choosing word: {e}")
         logger.error(f"Error choosing word: {e}")
 
-def send_chat_message(supabase: Client, content, is_correct=False):
+def current_room_state(supabase: Client):
+    """
+    The process-wide RoomState of the session's room (realtime or cached), or None if both are off.
+    """
+    hub = get_realtime_hub(supabase)
+    state = hub.watch(st.session_state.room_id, st.session_state.user_id, current_session_id()) if hub else None
+    room_cache = get_room_cache(supabase)
+    if state is None and room_cache is not None:
+        state = room_cache.get(st.session_state.room_id)
+    return state
+
+def current_room_word(supabase: Client):
+    """
+    The room's secret word, read from the process-wide room state rather than the session.
+    """
+    state = current_room_state(supabase)
+    if state is not None:
+        return state.current_word
+    room = supabase.table("rooms").select("game_state").eq("id", st.session_state.room_id).execute().data
+    return (room[0].get("game_state") or {}).get("current_word", "") if room else ""
+
+def pull_chat(supabase: Client):
+    """
+    Append chat that arrived since the last sync, read from the live room state
+    without a database call or rerun. Returns False if realtime is off.
+
+    Called from the chat pane, whose fragment the realtime hub reruns on its own when new chat arrives.
+    """
+    hub = get_realtime_hub(supabase)
+    state = hub.watch(st.session_state.room_id, st.session_state.user_id, current_session_id(), current_fragment_id()) if hub else None
+    if state is None:
+        return False
+    now = time.time()
+    chat_added = state.chat_added
+    take_new_chat(state.snapshot(now=now, **st.session_state.chat_cursor.sync_args(now))["chat"], now)
+    hub.chat_rendered(st.session_state.room_id, current_session_id(), chat_added)
+    return True
+
+def take_new_chat(rows, now):
+    """
+    Add the chat rows this session does not have yet and advance its cursor. Returns how many were new.
+
+    A row can commit after one with a higher id (see room_snapshot.ChatCursor),
+    so rows are inserted in id order rather than appended.
+    """
+    ids = st.session_state.chat_ids
+    messages = st.session_state.chat_messages
+    new_rows = st.session_state.chat_cursor.take(rows, now, held=set(ids))
+    for row in new_rows:
+        position = bisect.bisect(ids, row["id"])
+        if len(ids) == CHAT_BUFFER_SIZE:
+            if position == 0:
+                continue
+            ids.popleft()
+            messages.popleft()
+            position -= 1
+        ids.insert(position, row["id"])
+        messages.insert(position, row["message_data"])
+    return len(new_rows)
+
+def drawing_image(supabase: Client, scale=1.0, fmt="PNG"):
+    """
+    The current drawing as PNG/WebP bytes, painted incrementally once per process for all viewers.
+    """
+    state = current_room_state(supabase)
+    if state is None:
+        return rasterize_drawing(st.session_state.drawing_data, scale, fmt)
+    snapshot = state.snapshot()
+    return get_raster_cache().render(st.session_state.room_id, snapshot["drawing_id"], snapshot["strokes"], scale, fmt)
+
+@instrument
+def send_chat_message(supabase: Client, content):
     """
     Send chat message with Skribbl.io scoring for correct guesses.
     """
@@ -331,97 +477,88 @@ def send_chat_message(supabase: Client, content, is_correct=False):
         return
 
     try:
-        new_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "player",
-                "player": st.session_state.username,
-                "content": content,
-                "correct": is_correct
-            }
+        is_drawer = st.session_state.drawing_player_index is not None and st.session_state.players[st.session_state.drawing_player_index]["id"] == st.session_state.user_id
+        word = current_room_word(supabase) if st.session_state.game_state == "active" and not is_drawer else ""
+        verdict = evaluate_guess(word, content)
+        is_correct = verdict == CORRECT
+        st.session_state.guess_feedback = f"'{content}' is close!" if verdict == CLOSE else ""
+        player_message = {
+            "type": "player",
+            "player": st.session_state.username,
+            "content": content,
+            "correct": is_correct
         }
-        supabase.table("chat_messages").insert(new_message).execute()
-
-        if is_correct and st.session_state.game_state == "active":
-            time_left = st.session_state.round_time - (time.time() - st.session_state.timer_start)
-            if time_left > 0:
-                guesser_score = int(100 * (time_left / st.session_state.round_time)) + 20  # Bonus for first guess
-                drawer_score = int(100 * (time_left / st.session_state.round_time))
-                
-                # Update guesser score
-                player = supabase.table("players").select("score").eq("user_id", st.session_state.user_id).eq("room_id", st.session_state.room_id).execute().data[0]
-                supabase.table("players").update({"score": player["score"] + guesser_score}).eq("user_id", st.session_state.user_id).eq("room_id", st.session_state.room_id).execute()
-
-                # Update drawer score
-                drawer_id = st.session_state.players[st.session_state.drawing_player_index]["id"]
-                drawer = supabase.table("players").select("score").eq("user_id", drawer_id).eq("room_id", st.session_state.room_id).execute().data[0]
-                supabase.table("players").update({"score": drawer["score"] + drawer_score}).eq("user_id", drawer_id).eq("room_id", st.session_state.room_id).execute()
-
-                word_message = {
-                    "room_id": st.session_state.room_id,
-                    "message_data": {
-                        "type": "system",
-                        "content": f"{st.session_state.username} guessed correctly! The word was: {st.session_state.current_word.upper()}"
-                    }
-                }
-                supabase.table("chat_messages").insert(word_message).execute()
-
-                if st.session_state.rounds_played + 1 >= st.session_state.max_rounds:
-                    end_game(supabase)
-                else:
-                    new_round(supabase)
+        record_payload("chat", len(json.dumps(player_message)))
+        time_left = st.session_state.round_time - (time.time() - st.session_state.timer_start) if is_correct and st.session_state.game_state == "active" else 0
+
+        if time_left <= 0:
+            supabase.table("chat_messages").insert({"room_id": st.session_state.room_id, "message_data": player_message}).execute()
+            invalidate_room(supabase, st.session_state.room_id)
+            if not st.session_state.get("live_chat", False):
+                # Polling: sync now so the sender sees their message without waiting for the next poll
+                st.session_state.last_sync = 0
+                st.rerun()
+        else:
+            guesser_score, drawer_score = guess_points(time_left, st.session_state.round_time)
+            word_message = {
+                "type": "system",
+                "content": f"{st.session_state.username} guessed correctly! The word was: {word.upper()}"
+            }
+            result = award_correct_guess(
+                supabase,
+                st.session_state.room_id,
+                st.session_state.user_id,
+                st.session_state.players[st.session_state.drawing_player_index]["id"],
+                guesser_score,
+                drawer_score,
+                [player_message, word_message],
+                st.session_state.round_number,
+                word
+            )
+            invalidate_room(supabase, st.session_state.room_id)
+            if result["round_over"]:
+                # Someone else guessed first, or the round moved on: nothing was scored or posted
+                st.session_state.guess_feedback = "Too late, the round is already over!"
+                st.session_state.last_sync = 0
+                st.rerun()
+            # Any guesser may advance the round; the room's round number guards against double advances
+            game_state = advance_round(supabase, st.session_state.room_id, st.session_state.round_number, st.session_state.difficulty)
+            show_round_change(supabase, game_state)
 
     except Exception as e:
         st.error(f"Error sending message: {e}")
         logger.error(f"Error sending message: {e}")
 
+def show_round_change(supabase: Client, game_state):
+    """
+    Schedule the room's next round timeout and rerun to show the state advance_round wrote.
+    """
+    if game_state is None:
+        return
+    if game_state.get("status") == "active":
+        get_round_timer(supabase).schedule(st.session_state.room_id, game_state["current_round"], game_state["timer_start"] + st.session_state.round_time, st.session_state.difficulty)
+    else:
+        get_round_timer(supabase).cancel(st.session_state.room_id)
+    st.session_state.last_sync = 0
+    st.rerun()
+
+@instrument
 def new_round(supabase: Client):
     """
-    Start a new round with the next drawer and word options.
+    Skip to a new round with the next drawer and word options (game over after the last round).
     """
     if not st.session_state.is_room_owner or not supabase:
         return
 
     try:
-        next_index = (st.session_state.drawing_player_index + 1) % len(st.session_state.players)
-        next_player_id = st.session_state.players[next_index]["id"]
-        next_player_name = st.session_state.players[next_index]["name"]
-        word_options = random.sample(st.session_state.word_lists[st.session_state.difficulty], 3)
-
-        room = supabase.table("rooms").select("game_state").eq("id", st.session_state.room_id).execute().data[0]
-        game_state = room["game_state"]
-        game_state["current_round"] += 1
-        game_state["rounds_played"] += 1
-        game_state["current_word"] = ""
-        game_state["drawing_player_id"] = next_player_id
-        game_state["timer_start"] = int(time.time())
-        game_state["word_options"] = word_options
-
-        supabase.table("rooms").update({
-            "game_state": game_state,
-            "drawing_data": None
-        }).eq("id", st.session_state.room_id).execute()
-
-        new_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "system",
-                "content": f"Round {game_state['current_round']}! {next_player_name} is choosing a word."
-            }
-        }
-        supabase.table("chat_messages").insert(new_message).execute()
-
-        st.session_state.drawing_data = None
-        st.session_state.drawing_player_index = next_index
-        st.session_state.current_word = ""
-        st.session_state.hidden_word = ""
-        st.session_state.word_options = word_options
-        st.experimental_rerun()
+        game_state = advance_round(supabase, st.session_state.room_id, st.session_state.round_number, st.session_state.difficulty)
+        show_round_change(supabase, game_state)
 
     except Exception as e:
         st.error(f"Error starting new round: {e}")
         logger.error(f"Error starting new round: {e}")
 
+@instrument
 def end_game(supabase: Client):
     """
     End the game and announce the winner.
@@ -430,43 +567,14 @@ def end_game(supabase: Client):
         return
 
     try:
-        highest_score = max(player["score"] for player in st.session_state.players)
-        winners = [player["name"] for player in st.session_state.players if player["score"] == highest_score]
-
-        room = supabase.table("rooms").select("game_state").eq("id", st.session_state.room_id).execute().data[0]
-        game_state = room["game_state"]
-        game_state["status"] = "game_over"
-
-        supabase.table("rooms").update({"game_state": game_state}).eq("id", st.session_state.room_id).execute()
-
-        game_over_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "system",
-                "content": "Game over! Thanks for playing!"
-            }
-        }
-        winner_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "system",
-                "content": f"Winner: {', '.join(winners)} with {highest_score} points!"
-            }
-        }
-        supabase.table("chat_messages").insert([game_over_message, winner_message]).execute()
-
-        st.session_state.game_state = "game_over"
-        st.session_state.drawing_data = None
-        st.session_state.drawing_player_index = None
-        st.session_state.hidden_word = ""
-        st.session_state.current_word = ""
-        st.session_state.word_options = []
-        st.experimental_rerun()
+        game_state = advance_round(supabase, st.session_state.room_id, st.session_state.round_number, end_game=True)
+        show_round_change(supabase, game_state)
 
     except Exception as e:
         st.error(f"Error ending game: {e}")
         logger.error(f"Error ending game: {e}")
 
+@instrument
 def leave_game(supabase: Client):
     """
     Allow a player to leave the game, updating ownership if necessary.
@@ -475,41 +583,34 @@ def leave_game(supabase: Client):
         return
 
     try:
-        supabase.table("players").delete().eq("user_id", st.session_state.user_id).eq("room_id", st.session_state.room_id).execute()
-
-        leave_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "system",
-                "content": f"{st.session_state.username} left the room."
-            }
-        }
-        supabase.table("chat_messages").insert(leave_message).execute()
-
-        if st.session_state.is_room_owner and len(st.session_state.players) > 1:
-            for player in st.session_state.players:
-                if player["id"] != st.session_state.user_id:
-                    supabase.table("rooms").update({"owner_id": player["id"]}).eq("id", st.session_state.room_id).execute()
-                    owner_message = {
-                        "room_id": st.session_state.room_id,
-                        "message_data": {
-                            "type": "system",
-                            "content": f"{player['name']} is now the room owner."
-                        }
-                    }
-                    supabase.table("chat_messages").insert(owner_message).execute()
-                    break
+        get_presence_tracker(supabase).forget(st.session_state.room_id, st.session_state.user_id)
+        hub = get_realtime_hub(supabase)
+        if hub:
+            hub.unwatch(st.session_state.room_id, st.session_state.user_id, current_session_id())
+        with MutationBatch(supabase) as batch:
+            batch.delete("players", user_id=st.session_state.user_id, room_id=st.session_state.room_id)
+            batch.system_message(st.session_state.room_id, f"{st.session_state.username} left the room.")
+            if st.session_state.is_room_owner and len(st.session_state.players) > 1:
+                for player in st.session_state.players:
+                    if player["id"] != st.session_state.user_id:
+                        batch.update("rooms", {"owner_id": player["id"]}, id=st.session_state.room_id)
+                        batch.system_message(st.session_state.room_id, f"{player['name']} is now the room owner.")
+                        break
+        invalidate_room(supabase, st.session_state.room_id)
 
         st.session_state.in_game = False
         st.session_state.game_initialized = False
         st.session_state.drawing_data = None
         st.session_state.drawing_player_index = None
         st.session_state.hidden_word = ""
+        st.session_state.word_length = 0
         st.session_state.current_word = ""
         st.session_state.word_options = []
-        st.session_state.chat_messages = []
+        st.session_state.chat_messages = deque(maxlen=CHAT_BUFFER_SIZE)
+        st.session_state.chat_ids = deque(maxlen=CHAT_BUFFER_SIZE)
+        st.session_state.chat_cursor = ChatCursor()
         logger.info("Player left game successfully")
-        st.experimental_rerun()
+        st.rerun()
 
     except Exception as e:
         st.error(f"Error leaving game: {e}")
@@ -517,6 +618,7 @@ def leave_game(supabase: Client):
         st.session_state.in_game = False
         st.session_state.game_initialized = False
 
+@instrument
 def update_difficulty(supabase: Client, new_difficulty):
     """
     Update the game difficulty.
@@ -525,27 +627,18 @@ def update_difficulty(supabase: Client, new_difficulty):
         return
 
     try:
-        room = supabase.table("rooms").select("settings").eq("id", st.session_state.room_id).execute().data[0]
-        settings = room["settings"]
-        settings["difficulty"] = new_difficulty
-
-        supabase.table("rooms").update({"settings": settings}).eq("id", st.session_state.room_id).execute()
+        with MutationBatch(supabase) as batch:
+            batch.merge("rooms", "settings", {"difficulty": new_difficulty}, id=st.session_state.room_id)
+            batch.system_message(st.session_state.room_id, f"Difficulty changed to {new_difficulty.title()}")
 
         st.session_state.difficulty = new_difficulty
-
-        difficulty_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "system",
-                "content": f"Difficulty changed to {new_difficulty.title()}"
-            }
-        }
-        supabase.table("chat_messages").insert(difficulty_message).execute()
+        invalidate_room(supabase, st.session_state.room_id)
 
     except Exception as e:
         st.error(f"Error updating difficulty: {e}")
         logger.error(f"Error updating difficulty: {e}")
 
+@instrument
 def update_min_players(supabase: Client, new_min_players):
     """
     Update the minimum number of players.
@@ -554,48 +647,27 @@ def update_min_players(supabase: Client, new_min_players):
         return
 
     try:
-        room = supabase.table("rooms").select("settings").eq("id", st.session_state.room_id).execute().data[0]
-        settings = room["settings"]
-        settings["min_players"] = new_min_players
-
-        supabase.table("rooms").update({"settings": settings}).eq("id", st.session_state.room_id).execute()
+        with MutationBatch(supabase) as batch:
+            batch.merge("rooms", "settings", {"min_players": new_min_players}, id=st.session_state.room_id)
+            batch.system_message(st.session_state.room_id, f"Minimum players changed to {new_min_players}")
 
         st.session_state.min_players = new_min_players
-
-        min_players_message = {
-            "room_id": st.session_state.room_id,
-            "message_data": {
-                "type": "system",
-                "content": f"Minimum players changed to {new_min_players}"
-            }
-        }
-        supabase.table("chat_messages").insert(min_players_message).execute()
+        invalidate_room(supabase, st.session_state.room_id)
 
     except Exception as e:
         st.error(f"Error updating minimum players: {e}")
         logger.error(f"Error updating minimum players: {e}")
 
+@instrument
 def cleanup_inactive_players(supabase: Client):
     """
-    Remove players inactive for over 60 seconds.
+    Remove players inactive for over 60 seconds, and empty rooms, across all rooms.
     """
     if not supabase:
         return
 
     try:
-        current_time = int(time.time())
-        inactive_players = supabase.table("players").select("name").eq("room_id", st.session_state.room_id).lt("last_seen", current_time - 60).execute()
-        supabase.table("players").delete().eq("room_id", st.session_state.room_id).lt("last_seen", current_time - 60).execute()
-
-        for player in inactive_players.data:
-            leave_message = {
-                "room_id": st.session_state.room_id,
-                "message_data": {
-                    "type": "system",
-                    "content": f"{player['name']} was removed due to inactivity."
-                }
-            }
-            supabase.table("chat_messages").insert(leave_message).execute()
+        get_janitor(supabase).sweep()
 
     except Exception as e:
         st.error(f"Error cleaning up inactive players: {e}")
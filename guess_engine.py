@@ -0,0 +1,130 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+CORRECT = "correct"
+CLOSE = "close"
+WRONG = "wrong"
+
+MAX_GUESS_LENGTH = 100  # longer messages are chat, not guesses; bounds the work per message
+
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r" +")
+
+def normalize_guess(text):
+    """
+    Lower-case, strip accents and punctuation, and collapse whitespace.
+    """
+    text = unicodedata.normalize("NFKD", text[:MAX_GUESS_LENGTH])
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = _NON_WORD.sub(" ", text.replace("-", " "))
+    return _SPACES.sub(" ", text).strip()
+
+def match_key(normalized):
+    """
+    Comparison key of a normalized guess: spaces dropped, so "ice cream" matches "icecream".
+    """
+    return normalized.replace(" ", "")
+
+def number_forms(key):
+    """
+    Singular and plural spellings accepted for a word key.
+    """
+    forms = {key, key + "s", key + "es"}
+    if key.endswith("y"):
+        forms.add(key[:-1] + "ies")
+    if key.endswith("ies"):
+        forms.add(key[:-3] + "y")
+    if key.endswith("es"):
+        forms.add(key[:-2])
+    if key.endswith("s") and not key.endswith("ss"):
+        forms.add(key[:-1])
+    return {form for form in forms if len(form) >= min(3, len(key))}
+
+def bounded_edit_distance(a, b, limit):
+    """
+    Edit distance between a and b (insertions, deletions, substitutions and
+    adjacent transpositions), or limit + 1 if it exceeds limit.
+
+    Only the diagonal band of width 2 * limit + 1 is computed, so the cost
+    is O(len(a) * limit).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    width = 2 * limit + 1
+    # row[d] holds the distance for prefix lengths (i, i - limit + d)
+    row = [j if 0 <= j <= len(b) else over for j in range(-limit, limit + 1)]
+    previous = None
+    for i in range(1, len(a) + 1):
+        current = [over] * width
+        for d in range(width):
+            j = i - limit + d
+            if j < 0 or j > len(b):
+                continue
+            if j == 0:
+                current[d] = i
+                continue
+            best = row[d] + (a[i - 1] != b[j - 1])
+            if d + 1 < width:
+                best = min(best, row[d + 1] + 1)
+            if d > 0:
+                best = min(best, current[d - 1] + 1)
+            if previous is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                best = min(best, previous[d] + 1)
+            current[d] = min(best, over)
+        if min(current) > limit:
+            return over
+        previous, row = row, current
+    return row[len(b) - len(a) + limit]
+
+class WordMatcher:
+    """
+    Precomputed forms of one secret word for judging guesses against it.
+    """
+    def __init__(self, word):
+        self.word = word
+        self.key = match_key(normalize_guess(word))
+        self.forms = frozenset(number_forms(self.key)) if self.key else frozenset()
+        self.close_limit = 0 if len(self.key) < 4 else 1 if len(self.key) < 8 else 2
+
+    def evaluate_key(self, key):
+        if not key or not self.key:
+            return WRONG
+        if key in self.forms:
+            return CORRECT
+        if self.close_limit and bounded_edit_distance(key, self.key, self.close_limit) <= self.close_limit:
+            return CLOSE
+        return WRONG
+
+    def evaluate(self, guess):
+        return self.evaluate_key(match_key(normalize_guess(guess)))
+
+@lru_cache(maxsize=1024)
+def get_matcher(word):
+    return WordMatcher(word)
+
+def evaluate_guess(word, guess):
+    """
+    Judge one guess against the secret word: CORRECT, CLOSE or WRONG.
+    """
+    return evaluate_guesses(word, [guess])[0]
+
+def evaluate_guesses(word, guesses):
+    """
+    Judge a burst of guesses against the secret word in one pass.
+
+    The word's forms are computed once per word, and repeated guesses
+    (after normalization) are judged once per batch.
+    """
+    if not word:
+        return [WRONG] * len(guesses)
+    matcher = get_matcher(word)
+    results = {}
+    verdicts = []
+    for guess in guesses:
+        key = match_key(normalize_guess(guess))
+        if key not in results:
+            results[key] = matcher.evaluate_key(key)
+        verdicts.append(results[key])
+    return verdicts
@@ -0,0 +1,153 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from supabase import Client
+from room_snapshot import PLAYER_TIMEOUT
+from room_cache import invalidate_room
+from presence import get_presence_tracker
+from round_timer import get_round_timer
+from metrics import timed
+from chat_archive import compact_chat
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JANITOR_INTERVAL = float(os.getenv("DRAWING_GAME_JANITOR_INTERVAL", "30"))  # seconds; 0 disables the background sweep
+EMPTY_ROOM_GRACE = 300  # seconds an empty room is kept after creation, so its owner can still join it
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+def sweep_rooms(supabase: Client, now=None, timeout=PLAYER_TIMEOUT, empty_grace=EMPTY_ROOM_GRACE):
+    """
+    Remove timed-out players from every room, with one departure notice each,
+    and delete rooms left without players along with their chat and strokes,
+    releasing their codes for reuse.
+
+    Returns {"players": removed player count, "rooms": ids of rooms with
+    departures, "deleted_rooms": ids of deleted rooms}.
+    """
+    params = {
+        "p_now": int(now if now is not None else time.time()),
+        "p_timeout": timeout,
+        "p_empty_grace": empty_grace
+    }
+    try:
+        return supabase.rpc("sweep_rooms", params).execute().data
+    except Exception as e:
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        logger.warning("sweep_rooms function is not deployed; sweeping with separate, non-atomic queries")
+        return sweep_rooms_local(supabase, **params)
+
+def sweep_rooms_local(client, p_now, p_timeout=PLAYER_TIMEOUT, p_empty_grace=EMPTY_ROOM_GRACE):
+    """
+    sweep_rooms for local backends; runs inside the backend's transaction.
+    """
+    removed = client.table("players").delete().lt("last_seen", p_now - p_timeout).execute().data
+    if removed:
+        client.table("chat_messages").insert([
+            {"room_id": player["room_id"], "message_data": {"type": "system", "content": f"{player['name']} was removed due to inactivity."}}
+            for player in removed
+        ]).execute()
+
+    cutoff = datetime.fromtimestamp(p_now - p_empty_grace, timezone.utc).isoformat()
+    candidates = [room["id"] for room in client.table("rooms").select("id").lt("created_at", cutoff).execute().data]
+    occupied = {player["room_id"] for player in client.table("players").select("room_id").in_("room_id", candidates).execute().data} if candidates else set()
+    empty = [room_id for room_id in candidates if room_id not in occupied]
+    if empty:
+        client.table("chat_messages").delete().in_("room_id", empty).execute()
+        client.table("drawing_strokes").delete().in_("room_id", empty).execute()
+        client.table("chat_archive").delete().in_("room_id", empty).execute()
+        client.table("rooms").delete().in_("id", empty).execute()
+        client.table("recycled_room_codes").upsert([{"code": room_id, "released_at": p_now} for room_id in empty], on_conflict="code").execute()
+
+    return {
+        "players": len(removed),
+        "rooms": sorted({player["room_id"] for player in removed} - set(empty)),
+        "deleted_rooms": empty
+    }
+
+class Janitor:
+    """
+    Background sweep of stale players and abandoned rooms across all rooms.
+
+    Each sweep first renews and flushes this process's heartbeats, so
+    players still connected here are never mistaken for stale ones, even
+    if their session has been idle. It then runs one
+    sweep_rooms call and archives chat beyond each room's hot tail. A
+    player whose heartbeat times out in this process's presence tracker
+    triggers a sweep right away.
+    """
+    def __init__(self, supabase, interval=JANITOR_INTERVAL):
+        self.supabase = supabase
+        self.interval = interval
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def sweep(self, now=None):
+        if not self.supabase:
+            return None
+        with timed("janitor_sweep"):
+            tracker = get_presence_tracker(self.supabase)
+            tracker.keep_alive(now)
+            tracker.flush()
+            result = sweep_rooms(self.supabase, now)
+            result["archived_messages"] = sum(compact_chat(self.supabase).values())
+        for room_id in result["rooms"]:
+            invalidate_room(self.supabase, room_id)
+        for room_id in result["deleted_rooms"]:
+            invalidate_room(self.supabase, room_id)
+            get_round_timer(self.supabase).cancel(room_id)
+        if result["players"] or result["deleted_rooms"] or result["archived_messages"]:
+            logger.info(f"Removed {result['players']} inactive players and {len(result['deleted_rooms'])} empty rooms; archived {result['archived_messages']} chat messages")
+        return result
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                get_presence_tracker(self.supabase).on_expired = self.players_expired
+                self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def players_expired(self, expired):
+        """
+        Sweep now for players whose heartbeat timed out in the presence tracker.
+        """
+        logger.info(f"{len(expired)} players timed out; sweeping")
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping inactive players and rooms: {e}")
+
+def get_janitor(supabase):
+    """
+    Return the process-wide janitor, pointing it at the given backend.
+    """
+    global _janitor
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = Janitor(supabase)
+        elif supabase is not None:
+            _janitor.supabase = supabase
+        return _janitor
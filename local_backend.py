@@ -0,0 +1,629 @@
+import copy
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from room_snapshot import room_snapshot_local
+from presence import touch_players_local
+from scoring import award_correct_guess_local
+from round_timer import advance_round_local
+from janitor import sweep_rooms_local
+from chat_archive import chat_compaction_candidates_local
+from room_codes import reserve_room_codes_local
+from mutations import apply_mutations_local
+from room_affinity import worker_heartbeat_local
+from metrics import db_call
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Column types are "text", "integer" or "json". Tables with a "serial" column
+# get an auto-incrementing id like a Postgres identity column; tables with a
+# "version" column have it incremented on every update, like the
+# rooms_bump_version trigger.
+TABLES = {
+    "rooms": {
+        "primary_key": ("id",),
+        "columns": {
+            "id": "text",
+            "owner_id": "text",
+            "settings": "json",
+            "game_state": "json",
+            "drawing_data": "json",
+            "version": "integer",
+            "created_at": "text"
+        },
+        "version": "version"
+    },
+    "players": {
+        "primary_key": ("id",),
+        "columns": {
+            "id": "text",
+            "user_id": "text",
+            "room_id": "text",
+            "name": "text",
+            "score": "integer",
+            "color": "text",
+            "avatar": "text",
+            "last_seen": "integer",
+            "created_at": "text"
+        },
+        "indexes": (("room_id",), ("last_seen",))
+    },
+    "chat_messages": {
+        "primary_key": ("id",),
+        "serial": "id",
+        "columns": {
+            "id": "integer",
+            "room_id": "text",
+            "message_data": "json",
+            "created_at": "text"
+        },
+        "indexes": (("room_id", "id"),)
+    },
+    "drawing_strokes": {
+        "primary_key": ("room_id", "drawing_id", "seq"),
+        "columns": {
+            "room_id": "text",
+            "drawing_id": "text",
+            "seq": "integer",
+            "base": "integer",
+            "strokes": "json",
+            "created_at": "text"
+        }
+    },
+    "chat_archive": {
+        "primary_key": ("room_id", "first_id"),
+        "columns": {
+            "room_id": "text",
+            "first_id": "integer",
+            "last_id": "integer",
+            "message_count": "integer",
+            "payload": "text",
+            "created_at": "text"
+        }
+    },
+    "room_code_counter": {
+        "primary_key": ("id",),
+        "columns": {
+            "id": "integer",
+            "next_index": "integer"
+        }
+    },
+    "recycled_room_codes": {
+        "primary_key": ("code",),
+        "columns": {
+            "code": "text",
+            "released_at": "integer"
+        }
+    },
+    "workers": {
+        "primary_key": ("id",),
+        "columns": {
+            "id": "text",
+            "url": "text",
+            "last_seen": "integer"
+        }
+    }
+}
+
+_COMPARATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "in": lambda a, b: a in b
+}
+
+_SQL_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+class LocalAPIError(Exception):
+    """
+    Error raised by local backends, shaped like postgrest's APIError.
+    """
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+class LocalResponse:
+    def __init__(self, data):
+        self.data = data
+        self.count = None
+
+class LocalQuery:
+    """
+    Chainable query mirroring the subset of the postgrest builder the game uses.
+    """
+    def __init__(self, backend, table, charged=True):
+        if table not in TABLES:
+            raise LocalAPIError(f"relation \"{table}\" does not exist", code="42P01")
+        self.backend = backend
+        self.table = table
+        self.charged = charged
+        self.action = "select"
+        self.columns = None
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.ordering = []
+        self.row_limit = None
+        self.row_offset = 0
+
+    def select(self, columns="*"):
+        self.action = "select"
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows):
+        self.action = "insert"
+        self.payload = rows
+        return self
+
+    def upsert(self, rows, on_conflict=""):
+        self.action = "upsert"
+        self.payload = rows
+        self.on_conflict = [c.strip() for c in on_conflict.split(",") if c.strip()] or None
+        return self
+
+    def update(self, values):
+        self.action = "update"
+        self.payload = values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def _filter(self, op, column, value):
+        self.filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+
+    def order(self, column, desc=False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self.row_limit = size
+        return self
+
+    def range(self, start, end):
+        self.row_offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def execute(self):
+        if not self.charged:
+            return LocalResponse(self.backend._execute(self))
+        with db_call(self.table, self.action):
+            self.backend._charge(self.table, self.action)
+            return LocalResponse(self.backend._execute(self))
+
+class LocalRpc:
+    def __init__(self, backend, name, params):
+        self.backend = backend
+        self.name = name
+        self.params = params or {}
+
+    def execute(self):
+        with db_call("rpc", self.name):
+            return self._execute()
+
+    def _execute(self):
+        function = self.backend.rpc_functions.get(self.name)
+        if function is None:
+            raise LocalAPIError(f"Could not find the function {self.name}", code="PGRST202")
+        self.backend._charge("rpc", self.name)
+        with self.backend.lock:
+            outer = self.backend._event_buffer is None
+            if outer:
+                self.backend._event_buffer = []
+            try:
+                with self.backend.transaction():
+                    result = function(self.backend.in_process(), **self.params)
+                events = self.backend._event_buffer if outer else []
+            finally:
+                if outer:
+                    self.backend._event_buffer = None
+            self.backend._dispatch(events)
+            return LocalResponse(copy.deepcopy(result))
+
+class InProcessClient:
+    """
+    Latency-free, uncounted view of a backend used to implement its RPCs.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def table(self, name):
+        return LocalQuery(self.backend, name, charged=False)
+
+class LocalBackend:
+    """
+    Base for local stand-ins for the Supabase client.
+
+    Exposes table(name) and rpc(name, params) with the same call shape as
+    supabase.Client. Every execute() counts as one round trip: it is recorded
+    in `calls` and sleeps for `latency` seconds (a number or a callable
+    returning one) to imitate network time.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.RLock()
+        self.rpc_functions = {}
+        self.listeners = []
+        self._event_buffer = None
+        self._register_default_rpcs()
+
+    def _register_default_rpcs(self):
+        self.rpc_functions["room_snapshot"] = room_snapshot_local
+        self.rpc_functions["touch_players"] = touch_players_local
+        self.rpc_functions["award_correct_guess"] = award_correct_guess_local
+        self.rpc_functions["advance_round"] = advance_round_local
+        self.rpc_functions["sweep_rooms"] = sweep_rooms_local
+        self.rpc_functions["chat_compaction_candidates"] = chat_compaction_candidates_local
+        self.rpc_functions["reserve_room_codes"] = reserve_room_codes_local
+        self.rpc_functions["apply_mutations"] = apply_mutations_local
+        self.rpc_functions["worker_heartbeat"] = worker_heartbeat_local
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return LocalRpc(self, name, params)
+
+    def in_process(self):
+        return InProcessClient(self)
+
+    def add_listener(self, listener):
+        """
+        Register listener(table, event, new, old) for row changes, like a realtime feed.
+
+        Events are delivered synchronously after the statement (or, inside an
+        RPC, after its transaction commits), so listeners must be quick.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _emit(self, table, event, rows):
+        if not self.listeners or not rows:
+            return
+        rows = copy.deepcopy(rows)
+        events = [(table, event, {} if event == "DELETE" else row, row if event == "DELETE" else {}) for row in rows]
+        if self._event_buffer is not None:
+            self._event_buffer.extend(events)
+            return
+        self._dispatch(events)
+
+    def _dispatch(self, events):
+        for event in events:
+            for listener in list(self.listeners):
+                try:
+                    listener(*event)
+                except Exception as e:
+                    logger.error(f"Change listener failed on {event[0]} {event[1]}: {e}")
+
+    def _charge(self, table, action):
+        self.calls[(table, action)] += 1
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+
+    def reset_calls(self):
+        self.calls = Counter()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            yield
+
+    def _execute(self, query):
+        with self.lock:
+            if query.action == "select":
+                rows = self._select(query.table, query.filters, query.ordering, query.row_limit, query.row_offset)
+                if query.columns:
+                    rows = [{c: row.get(c) for c in query.columns} for row in rows]
+                return rows
+            if query.action in ("insert", "upsert"):
+                rows = query.payload if isinstance(query.payload, list) else [query.payload]
+                rows = [self._prepare_row(query.table, row) for row in rows]
+                if query.action == "upsert":
+                    result = self._upsert(query.table, rows, query.on_conflict or list(TABLES[query.table]["primary_key"]))
+                    self._emit(query.table, "UPDATE", result)
+                    return result
+                result = self._insert(query.table, rows)
+                self._emit(query.table, "INSERT", result)
+                return result
+            if query.action == "update":
+                self._check_columns(query.table, query.payload)
+                if TABLES[query.table].get("version"):
+                    result = self._update_versioned(query.table, query.filters, copy.deepcopy(query.payload))
+                else:
+                    result = self._update(query.table, query.filters, copy.deepcopy(query.payload))
+                self._emit(query.table, "UPDATE", result)
+                return result
+            if query.action == "delete":
+                result = self._delete(query.table, query.filters)
+                self._emit(query.table, "DELETE", result)
+                return result
+        raise LocalAPIError(f"Unsupported action {query.action}")
+
+    def _check_columns(self, table, row):
+        unknown = set(row) - set(TABLES[table]["columns"])
+        if unknown:
+            raise LocalAPIError(f"Could not find the '{sorted(unknown)[0]}' column of '{table}'", code="PGRST204")
+
+    def _prepare_row(self, table, row):
+        self._check_columns(table, row)
+        row = copy.deepcopy(row)
+        if "created_at" in TABLES[table]["columns"]:
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        if TABLES[table].get("version"):
+            row.setdefault(TABLES[table]["version"], 0)
+        return row
+
+    def _update_versioned(self, table, filters, values):
+        column = TABLES[table]["version"]
+        key = TABLES[table]["primary_key"]
+        result = []
+        for row in self._select(table, filters, [], None, 0):
+            match = [("eq", c, row[c]) for c in key]
+            result.extend(self._update(table, match, dict(values, **{column: (row[column] or 0) + 1})))
+        return result
+
+    def _upsert(self, table, rows, conflict_columns):
+        result = []
+        for row in rows:
+            match = [("eq", c, row.get(c)) for c in conflict_columns]
+            if self._select(table, match, [], 1, 0):
+                version = TABLES[table].get("version")
+                values = {k: v for k, v in row.items() if k not in ("created_at", version)}
+                result.extend(self._update_versioned(table, match, values) if version else self._update(table, match, values))
+            else:
+                result.extend(self._insert(table, [row]))
+        return result
+
+    def _select(self, table, filters, ordering, limit, offset):
+        raise NotImplementedError
+
+    def _insert(self, table, rows):
+        raise NotImplementedError
+
+    def _update(self, table, filters, values):
+        raise NotImplementedError
+
+    def _delete(self, table, filters):
+        raise NotImplementedError
+
+def _matches(row, filters):
+    for op, column, value in filters:
+        current = row.get(column)
+        if current is None or not _COMPARATORS[op](current, value):
+            return False
+    return True
+
+def _sort_rows(rows, ordering):
+    for column, desc in reversed(ordering):
+        rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+    return rows
+
+class MemoryBackend(LocalBackend):
+    """
+    Dict-of-lists backend. Rows are deep-copied in and out, as over the wire.
+    """
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.rows = {name: [] for name in TABLES}
+        self.serials = Counter()
+        self._undo = None
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self._undo is not None:
+                yield
+                return
+            self._undo = {}
+            try:
+                yield
+            except Exception:
+                for table, rows in self._undo.items():
+                    self.rows[table] = rows
+                raise
+            finally:
+                self._undo = None
+
+    def _touch(self, table):
+        if self._undo is not None and table not in self._undo:
+            self._undo[table] = [dict(row) for row in self.rows[table]]
+
+    def _select(self, table, filters, ordering, limit, offset):
+        rows = [row for row in self.rows[table] if _matches(row, filters)]
+        rows = _sort_rows(rows, ordering)[offset:]
+        if limit is not None:
+            rows = rows[:limit]
+        return copy.deepcopy(rows)
+
+    def _insert(self, table, rows):
+        self._touch(table)
+        spec = TABLES[table]
+        serial = spec.get("serial")
+        keys = {tuple(row.get(c) for c in spec["primary_key"]) for row in self.rows[table]}
+        inserted = []
+        for row in rows:
+            if serial and row.get(serial) is None:
+                self.serials[table] += 1
+                row[serial] = self.serials[table]
+            key = tuple(row.get(c) for c in spec["primary_key"])
+            if key in keys:
+                raise LocalAPIError(f"duplicate key value violates unique constraint \"{table}_pkey\"", code="23505")
+            keys.add(key)
+            full_row = {column: None for column in spec["columns"]}
+            full_row.update(row)
+            inserted.append(full_row)
+        self.rows[table].extend(inserted)
+        return copy.deepcopy(inserted)
+
+    def _update(self, table, filters, values):
+        self._touch(table)
+        updated = []
+        for row in self.rows[table]:
+            if _matches(row, filters):
+                row.update(copy.deepcopy(values))
+                updated.append(row)
+        return copy.deepcopy(updated)
+
+    def _delete(self, table, filters):
+        self._touch(table)
+        kept, deleted = [], []
+        for row in self.rows[table]:
+            (deleted if _matches(row, filters) else kept).append(row)
+        self.rows[table] = kept
+        return deleted
+
+class SQLiteBackend(LocalBackend):
+    """
+    SQLite-file backend. Several processes can share one database file.
+    """
+    def __init__(self, path=":memory:", latency=0.0):
+        super().__init__(latency)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self._depth = 0
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        for table, spec in TABLES.items():
+            columns = []
+            for column, kind in spec["columns"].items():
+                sql_type = "INTEGER" if kind == "integer" else "TEXT"
+                if column == spec.get("serial"):
+                    columns.append(f"\"{column}\" INTEGER PRIMARY KEY AUTOINCREMENT")
+                else:
+                    columns.append(f"\"{column}\" {sql_type}")
+            if not spec.get("serial"):
+                columns.append("PRIMARY KEY (" + ", ".join(f"\"{c}\"" for c in spec["primary_key"]) + ")")
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS \"{table}\" ({', '.join(columns)})")
+            for index in spec.get("indexes", ()):
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS \"{table}_{'_'.join(index)}_idx\" ON \"{table}\" ({', '.join(index)})")
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                yield
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+            finally:
+                self._depth = 0
+
+    def _encode(self, table, column, value):
+        if value is not None and TABLES[table]["columns"].get(column) == "json":
+            return json.dumps(value)
+        return value
+
+    def _decode(self, table, row):
+        columns = TABLES[table]["columns"]
+        return {
+            key: json.loads(row[key]) if columns.get(key) == "json" and row[key] is not None else row[key]
+            for key in row.keys()
+        }
+
+    def _where(self, table, filters):
+        clauses, params = [], []
+        for op, column, value in filters:
+            if column not in TABLES[table]["columns"]:
+                raise LocalAPIError(f"column {table}.{column} does not exist", code="42703")
+            if op == "in":
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"\"{column}\" IN ({', '.join('?' for _ in value)})")
+                params.extend(self._encode(table, column, v) for v in value)
+            else:
+                clauses.append(f"\"{column}\" {_SQL_OPERATORS[op]} ?")
+                params.append(self._encode(table, column, value))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _select(self, table, filters, ordering, limit, offset):
+        where, params = self._where(table, filters)
+        sql = f"SELECT * FROM \"{table}\"{where}"
+        if ordering:
+            sql += " ORDER BY " + ", ".join(f"\"{c}\" IS NULL, \"{c}\" {'DESC' if desc else 'ASC'}" for c, desc in ordering)
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit if limit is not None else -1, offset]
+        return [self._decode(table, row) for row in self.conn.execute(sql, params)]
+
+    def _insert(self, table, rows):
+        inserted = []
+        for row in rows:
+            columns = list(row)
+            column_list = ", ".join(f'"{c}"' for c in columns)
+            sql = f"INSERT INTO \"{table}\" ({column_list}) VALUES ({', '.join('?' for _ in columns)}) RETURNING *"
+            try:
+                cursor = self.conn.execute(sql, [self._encode(table, c, row[c]) for c in columns])
+            except sqlite3.IntegrityError as e:
+                raise LocalAPIError(str(e), code="23505")
+            inserted.extend(self._decode(table, r) for r in cursor.fetchall())
+        return inserted
+
+    def _update(self, table, filters, values):
+        if not values:
+            return self._select(table, filters, [], None, 0)
+        where, params = self._where(table, filters)
+        assignments = ", ".join(f"\"{c}\" = ?" for c in values)
+        sql = f"UPDATE \"{table}\" SET {assignments}{where} RETURNING *"
+        cursor = self.conn.execute(sql, [self._encode(table, c, v) for c, v in values.items()] + params)
+        return [self._decode(table, r) for r in cursor.fetchall()]
+
+    def _delete(self, table, filters):
+        where, params = self._where(table, filters)
+        cursor = self.conn.execute(f"DELETE FROM \"{table}\"{where} RETURNING *", params)
+        return [self._decode(table, r) for r in cursor.fetchall()]
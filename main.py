@@ -1,11 +1,14 @@
 import streamlit as st
 import os
+import time
 import uuid
-import string
-import random
-from supabase_client import get_supabase_client
+from storage_backend import create_backend
 from game_logic import initialize_game, sync_game_state, start_game, send_chat_message, leave_game, update_difficulty, update_min_players
-from ui_components import render_game_ui
+from ui_components import render_game_ui, render_handoff, render_spectator_ui
+from metrics import begin_script_run, start_exporter
+from janitor import get_janitor
+from app_sessions import current_session_id
+from room_affinity import get_room_affinity
 
 # Disable pages watcher
 os.environ["STREAMLIT_SERVER_ENABLE_STATIC_SERVING"] = "false"
@@ -18,6 +21,10 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Metrics: export once per process, and account this run's DB calls to its session
+start_exporter()
+begin_script_run(current_session_id())
+
 # Apply Skribbl.io-style CSS
 st.markdown("""
     <style>
@@ -30,11 +37,6 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Generate unique room code
-def generate_room_code(length=6):
-    characters = string.ascii_uppercase + string.digits
-    return ''.join(random.choice(characters) for _ in range(length))
-
 # Initialize session state
 if "user_id" not in st.session_state:
     st.session_state.user_id = str(uuid.uuid4())
@@ -48,12 +50,6 @@ if "max_rounds" not in st.session_state:
     st.session_state.max_rounds = 3
 if "min_players" not in st.session_state:
     st.session_state.min_players = 2
-if "word_lists" not in st.session_state:
-    st.session_state.word_lists = {
-        "easy": ["cat", "dog", "tree", "sun", "book"],
-        "medium": ["house", "car", "boat", "chair", "lamp"],
-        "hard": ["airplane", "mountain", "castle", "volcano", "bridge"]
-    }
 if "drawing_data" not in st.session_state:
     st.session_state.drawing_data = None
 if "drawing_player_index" not in st.session_state:
@@ -66,29 +62,49 @@ if "word_options" not in st.session_state:
     st.session_state.word_options = []
 if "current_word" not in st.session_state:
     st.session_state.current_word = ""
+if "word_length" not in st.session_state:
+    st.session_state.word_length = 0
+if "spectate_room" not in st.session_state:
+    st.session_state.spectate_room = None
 
 # Debug environment variables
 st.write("SUPABASE_URL:", os.getenv("SUPABASE_URL"))
 st.write("SUPABASE_ANON_KEY:", os.getenv("SUPABASE_ANON_KEY")[:10] + "..." if os.getenv("SUPABASE_ANON_KEY") else None)
 
-# Initialize Supabase client
+# Initialize storage backend (Supabase unless DRAWING_GAME_BACKEND says otherwise)
 supabase = None
 try:
-    url = os.getenv("SUPABASE_URL")
-    anon_key = os.getenv("SUPABASE_ANON_KEY")
-    if not url or not anon_key:
-        raise ValueError("SUPABASE_URL or SUPABASE_ANON_KEY is not set")
-    supabase = get_supabase_client(url, anon_key)
+    supabase = create_backend()
+    get_janitor(supabase).start()
 except ValueError as e:
     st.error(f"Failed to connect to database: {e}")
 
+# Room affinity: with several workers, each room is served by one of them
+affinity = get_room_affinity(supabase)
+if affinity is not None and not st.session_state.in_game and "handoff" in st.query_params:
+    # Handed off by another worker: continue as the same player
+    handoff = affinity.accept_handoff(st.query_params["handoff"])
+    st.query_params.clear()
+    if handoff is None:
+        st.error("This room link is invalid or has expired. Please join the room again.")
+    else:
+        st.session_state.user_id = handoff["user"]
+        st.session_state.handed_off_at = time.time()
+        initialize_game(supabase, handoff["room"], False, handoff["name"], rejoin=True)
+
 # Main app logic
 st.title("That Drawing Game")
 
-if not st.session_state.in_game:
+if st.session_state.spectate_room:
+    # Spectators only read the shared room state; they never join, sync or write
+    render_spectator_ui(supabase)
+    if st.button("Stop Watching"):
+        st.session_state.spectate_room = None
+        st.rerun()
+elif not st.session_state.in_game:
     with st.form("join_form"):
         username = st.text_input("Enter your username", value="Player")
-        action = st.radio("Choose an action", ["Join Room", "Create New Room"])
+        action = st.radio("Choose an action", ["Join Room", "Create New Room", "Watch Room"])
         room_id = st.text_input("Enter room ID", disabled=action == "Create New Room")
         difficulty = st.selectbox("Difficulty", ["easy", "medium", "hard"], index=["easy", "medium", "hard"].index(st.session_state.difficulty))
         min_players = st.number_input("Minimum players", min_value=2, max_value=10, value=st.session_state.min_players)
@@ -97,15 +113,19 @@ if not st.session_state.in_game:
         if submit:
             if username:
                 if action == "Create New Room":
-                    room_id = generate_room_code()
-                    while supabase.table("rooms").select("id").eq("id", room_id).execute().data:
-                        room_id = generate_room_code()
+                    room_id = None  # allocated by initialize_game
                     is_owner = True
                 else:
                     if not room_id:
                         st.error("Please enter a room ID")
                         st.stop()
+                    if action == "Watch Room":
+                        st.session_state.spectate_room = room_id
+                        st.rerun()
                     is_owner = False
+                    if affinity is not None and affinity.should_hand_off(room_id):
+                        render_handoff(affinity.handoff_url(room_id, st.session_state.user_id, username))
+                        st.stop()
                 
                 st.session_state.difficulty = difficulty
                 st.session_state.min_players = min_players
@@ -113,6 +133,11 @@ if not st.session_state.in_game:
             else:
                 st.error("Please enter a username")
 else:
+    if affinity is not None and affinity.should_hand_off(st.session_state.room_id, st.session_state.get("handed_off_at", 0)):
+        # Created here, or the room moved when workers were added or removed
+        st.session_state.in_game = False
+        render_handoff(affinity.handoff_url(st.session_state.room_id, st.session_state.user_id, st.session_state.username))
+        st.stop()
     sync_game_state(supabase)
     st.write("Rendering game UI, in_game:", st.session_state.in_game, "game_state:", st.session_state.game_state)
     render_game_ui(supabase)
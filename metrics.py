@@ -0,0 +1,228 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import functools
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+MAX_TRACKED_SESSIONS = 1000
+DUMP_INTERVAL = 15
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, (counts, total, count) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+OPERATION_SECONDS = Histogram("drawing_game_operation_seconds", "Latency of game operations and their steps.", ("operation",))
+DB_CALLS = Counter("drawing_game_db_calls_total", "Database requests by table (or rpc) and action.", ("table", "action"))
+DB_ERRORS = Counter("drawing_game_db_errors_total", "Database requests that raised.", ("table", "action"))
+DB_SECONDS = Histogram("drawing_game_db_seconds", "Latency of database requests.", ("table", "action"))
+DB_CALLS_PER_RUN = Histogram("drawing_game_db_calls_per_script_run", "Database requests made by one Streamlit script run.", buckets=COUNT_BUCKETS)
+PAYLOAD_BYTES = Histogram("drawing_game_payload_bytes", "Size of written and synced payloads.", ("kind",), buckets=SIZE_BUCKETS)
+SCRIPT_RUNS = Counter("drawing_game_script_runs_total", "Streamlit script runs (reruns included), full or of one fragment.", ("run",))
+SESSION_SCRIPT_RUNS = Counter("drawing_game_session_script_runs_total", f"Script runs per session, for the {MAX_TRACKED_SESSIONS} most recent sessions.", ("session",))
+
+REGISTRY = [OPERATION_SECONDS, DB_CALLS, DB_ERRORS, DB_SECONDS, DB_CALLS_PER_RUN, PAYLOAD_BYTES, SCRIPT_RUNS, SESSION_SCRIPT_RUNS]
+
+class ScriptRun:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.db_calls = 0
+
+_local = threading.local()
+_runs = OrderedDict()
+_runs_lock = threading.Lock()
+
+@contextmanager
+def timed(operation):
+    """
+    Record the duration of the enclosed block under operation.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        OPERATION_SECONDS.observe(time.perf_counter() - start, operation)
+
+def observe(operation, seconds):
+    OPERATION_SECONDS.observe(seconds, operation)
+
+def instrument(fn):
+    """
+    Decorator recording every call of fn under its name, including calls ended by a rerun.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with timed(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def db_call(table, action):
+    """
+    Count and time one database request, attributing it to the current script run.
+    """
+    DB_CALLS.inc(table, action or "unknown")
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.db_calls += 1
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DB_ERRORS.inc(table, action or "unknown")
+        raise
+    finally:
+        DB_SECONDS.observe(time.perf_counter() - start, table, action or "unknown")
+
+def record_payload(kind, size):
+    PAYLOAD_BYTES.observe(size, kind)
+
+def begin_script_run(session_id, run_label="full"):
+    """
+    Start accounting a script run on this thread, closing the session's previous run.
+
+    run_label is "full", or the function name for a rerun of only that
+    fragment. A run stopped by st.rerun never reaches the end of the
+    script, so runs are closed when the next one of the session begins.
+    """
+    SCRIPT_RUNS.inc(run_label)
+    run = ScriptRun(session_id)
+    with _runs_lock:
+        previous = _runs.pop(session_id, None)
+        _runs[session_id] = run
+        while len(_runs) > MAX_TRACKED_SESSIONS:
+            _, stale = _runs.popitem(last=False)
+            with SESSION_SCRIPT_RUNS.lock:
+                SESSION_SCRIPT_RUNS.values.pop((str(stale.session_id)[:8],), None)
+    if previous is not None:
+        DB_CALLS_PER_RUN.observe(previous.db_calls)
+    SESSION_SCRIPT_RUNS.inc(str(session_id)[:8])
+    _local.run = run
+    return run
+
+def render_prometheus():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def write_metrics_file(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+def _dump_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(path)
+        except OSError as e:
+            logger.error(f"Could not write metrics to {path}: {e}")
+
+def start_exporter(port=None, path=None, interval=DUMP_INTERVAL):
+    """
+    Serve /metrics on DRAWING_GAME_METRICS_PORT (localhost) and/or dump to
+    DRAWING_GAME_METRICS_FILE every interval seconds. Runs once per process.
+    """
+    global _exporter_started
+    port = port or os.getenv("DRAWING_GAME_METRICS_PORT")
+    path = path or os.getenv("DRAWING_GAME_METRICS_FILE")
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+        if port:
+            try:
+                server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+                threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+                logger.info(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+            except OSError as e:
+                logger.error(f"Could not serve metrics on port {port}: {e}")
+        if path:
+            threading.Thread(target=_dump_loop, args=(path, interval), name="metrics-dump", daemon=True).start()
+            logger.info(f"Writing metrics to {path} every {interval} seconds")
@@ -0,0 +1,139 @@
+import logging
+from supabase import Client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MUTABLE_TABLES = ("rooms", "players", "chat_messages", "drawing_strokes")
+STALE_WRITE = "40001"
+
+class StaleStateError(Exception):
+    """
+    A compare-and-set change found the row at a newer version than expected; nothing was applied.
+    """
+    code = STALE_WRITE
+
+class MutationBatch:
+    """
+    Unit of work for one game action: row changes are staged in order and
+    committed together by a single apply_mutations call, in one transaction.
+
+        with MutationBatch(supabase) as batch:
+            batch.delete("players", room_id=room_id, user_id=user_id)
+            batch.system_message(room_id, f"{name} left the room.")
+
+    Leaving the block commits unless it raised; commit() can also be called directly.
+    Passing expect_version to update or merge makes it a compare-and-set on
+    the row's version column: if the row has moved on, the whole batch is
+    rejected with StaleStateError.
+    """
+    def __init__(self, supabase: Client = None):
+        self.supabase = supabase
+        self.ops = []
+        self.committed = []
+
+    def _stage(self, op, table, **fields):
+        if table not in MUTABLE_TABLES:
+            raise ValueError(f"Table {table!r} cannot be changed in a mutation batch")
+        if op != "insert" and not fields.get("match"):
+            raise ValueError(f"Mutation {op!r} on {table!r} needs at least one match column")
+        self.ops.append(dict(fields, op=op, table=table))
+        return self
+
+    def insert(self, table, rows):
+        return self._stage("insert", table, rows=rows if isinstance(rows, list) else [rows])
+
+    def update(self, table, values, expect_version=None, **match):
+        if expect_version is not None:
+            return self._stage("update", table, values=values, match=dict(match, version=expect_version), require=True)
+        return self._stage("update", table, values=values, match=match)
+
+    def merge(self, table, column, values, expect_version=None, **match):
+        """
+        Shallow-merge values into a JSON column (e.g. settings or game_state) without reading it first.
+        """
+        if expect_version is not None:
+            return self._stage("merge", table, column=column, values=values, match=dict(match, version=expect_version), require=True)
+        return self._stage("merge", table, column=column, values=values, match=match)
+
+    def delete(self, table, **match):
+        return self._stage("delete", table, match=match)
+
+    def system_message(self, room_id, content):
+        return self.insert("chat_messages", {"room_id": room_id, "message_data": {"type": "system", "content": content}})
+
+    def commit(self, supabase: Client = None):
+        """
+        Apply the staged changes atomically. Returns the affected rows of each change, in order.
+        """
+        supabase = supabase or self.supabase
+        ops, self.ops = self.ops, []
+        if not ops:
+            return []
+        try:
+            results = supabase.rpc("apply_mutations", {"p_ops": ops}).execute().data
+        except StaleStateError:
+            raise
+        except Exception as e:
+            if getattr(e, "code", None) == STALE_WRITE:
+                raise StaleStateError(getattr(e, "message", None) or str(e)) from e
+            if getattr(e, "code", None) != "PGRST202":
+                raise
+            logger.warning("apply_mutations function is not deployed; applying changes with separate, non-atomic queries")
+            results = apply_mutations_local(supabase, ops)
+        self.committed = list(zip(ops, results))
+        return results
+
+    def latest(self, table):
+        """
+        The last row a committed change left in table (e.g. the room with its new version), or None.
+        """
+        for op, rows in reversed(self.committed):
+            if op["table"] == table and op["op"] != "delete" and rows:
+                return rows[-1]
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.ops = []
+        return False
+
+def _matching(query, match):
+    for column, value in match.items():
+        query = query.eq(column, value)
+    return query
+
+def apply_mutations_local(client, p_ops):
+    """
+    apply_mutations for local backends; runs inside the backend's transaction.
+    """
+    results = []
+    for op in p_ops:
+        table = op["table"]
+        if table not in MUTABLE_TABLES:
+            raise ValueError(f"Table {table!r} cannot be changed in a mutation batch")
+        if op["op"] != "insert" and not op.get("match"):
+            raise ValueError(f"Mutation {op['op']!r} on {table!r} needs at least one match column")
+        if op["op"] == "insert":
+            rows = client.table(table).insert(op["rows"]).execute().data
+        elif op["op"] == "update":
+            rows = _matching(client.table(table).update(op["values"]), op["match"]).execute().data
+        elif op["op"] == "merge":
+            rows = []
+            for row in _matching(client.table(table).select("*"), op["match"]).execute().data:
+                merged = dict(row[op["column"]] or {}, **op["values"])
+                key = {"id": row["id"]} if "id" in row else op["match"]
+                rows.extend(_matching(client.table(table).update({op["column"]: merged}), key).execute().data)
+        elif op["op"] == "delete":
+            rows = _matching(client.table(table).delete(), op["match"]).execute().data
+        else:
+            raise ValueError(f"Unknown mutation {op['op']!r}")
+        if op.get("require") and not rows:
+            raise StaleStateError(f"Stale write to {table}: no row matches {op['match']}")
+        results.append(rows)
+    return results
@@ -0,0 +1,186 @@
+import time
+import heapq
+import logging
+import threading
+from room_snapshot import PLAYER_TIMEOUT
+from app_sessions import is_session_active
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0
+
+_touch_rpc_available = True
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+class PresenceTracker:
+    """
+    Process-wide record of player heartbeats.
+
+    Heartbeats are kept in memory and written to players.last_seen in one
+    touch_players call per flush interval. An expiry heap (with lazy
+    deletion of superseded entries) finds timed-out players in O(log n).
+    Each flush cycle forgets them, so memory follows the live players, and
+    passes them to on_expired; the janitor uses it to sweep them out of
+    their rooms without waiting for its next interval.
+
+    A heartbeat made from a Streamlit session is renewed on every flush
+    while that session stays connected to this server. Idle sessions do not
+    rerun, in polling mode or between realtime updates, so without this
+    the janitor would remove players who are still watching the room.
+    """
+    def __init__(self, supabase, flush_interval=FLUSH_INTERVAL, timeout=PLAYER_TIMEOUT):
+        self.supabase = supabase
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.last_seen = {}
+        self.pending = {}
+        self.expiries = []
+        self.sessions = {}  # session_id -> (room_id, user_id) it keeps alive
+        self.on_expired = None  # called with the (room_id, user_id) pairs that timed out
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def heartbeat(self, room_id, user_id, now=None, session_id=None):
+        now = int(now if now is not None else time.time())
+        key = (room_id, user_id)
+        with self.lock:
+            if session_id is not None:
+                self.sessions[session_id] = key
+            self.last_seen[key] = now
+            self.pending[key] = now
+            heapq.heappush(self.expiries, (now + self.timeout, room_id, user_id))
+            if len(self.expiries) > 4 * len(self.last_seen) + 64:
+                self._compact()
+        self.start()
+
+    def forget(self, room_id, user_id):
+        with self.lock:
+            self.last_seen.pop((room_id, user_id), None)
+            self.pending.pop((room_id, user_id), None)
+            for session_id in [sid for sid, key in self.sessions.items() if key == (room_id, user_id)]:
+                del self.sessions[session_id]
+
+    def keep_alive(self, now=None):
+        """
+        Heartbeat for every session still connected to this server, and stop tracking the others.
+        """
+        now = now if now is not None else time.time()
+        with self.lock:
+            sessions = list(self.sessions.items())
+        for session_id, (room_id, user_id) in sessions:
+            if is_session_active(session_id):
+                self.heartbeat(room_id, user_id, now)
+            else:
+                with self.lock:
+                    if self.sessions.get(session_id) == (room_id, user_id):
+                        del self.sessions[session_id]
+
+    def pop_expired(self, now=None):
+        """
+        Remove and return (room_id, user_id) pairs whose heartbeat has timed out.
+
+        A heartbeat times out once it is older than the timeout, the same test sweep_rooms applies to last_seen.
+        """
+        now = int(now if now is not None else time.time())
+        expired = []
+        with self.lock:
+            while self.expiries and self.expiries[0][0] < now:
+                expiry, room_id, user_id = heapq.heappop(self.expiries)
+                key = (room_id, user_id)
+                if key in self.last_seen and self.last_seen[key] + self.timeout == expiry:
+                    del self.last_seen[key]
+                    expired.append(key)
+            for session_id in [sid for sid, key in self.sessions.items() if key in expired]:
+                del self.sessions[session_id]
+        return expired
+
+    def _compact(self):
+        self.expiries = [(seen + self.timeout, room_id, user_id) for (room_id, user_id), seen in self.last_seen.items()]
+        heapq.heapify(self.expiries)
+
+    def flush(self):
+        """
+        Write pending heartbeats in one call. Returns the number of heartbeats sent.
+        """
+        global _touch_rpc_available
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending or not self.supabase:
+            return 0
+
+        beats = [{"room_id": room_id, "user_id": user_id, "last_seen": seen} for (room_id, user_id), seen in pending.items()]
+        try:
+            if _touch_rpc_available:
+                try:
+                    self.supabase.rpc("touch_players", {"p_beats": beats}).execute()
+                except Exception as e:
+                    if getattr(e, "code", None) != "PGRST202":
+                        raise
+                    _touch_rpc_available = False
+                    logger.warning("touch_players function is not deployed; writing heartbeats one by one")
+                    touch_players_local(self.supabase, beats)
+            else:
+                touch_players_local(self.supabase, beats)
+        except Exception as e:
+            with self.lock:
+                for key, seen in pending.items():
+                    self.pending[key] = max(seen, self.pending.get(key, 0))
+            logger.error(f"Error flushing {len(beats)} heartbeats: {e}")
+            return 0
+        return len(beats)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="presence-flush", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.keep_alive()
+            flushed = self.flush()
+            if flushed:
+                logger.info(f"Flushed {flushed} heartbeats")
+            expired = self.pop_expired()
+            if expired and self.on_expired is not None:
+                try:
+                    self.on_expired(expired)
+                except Exception as e:
+                    logger.error(f"Error handling {len(expired)} timed-out players: {e}")
+
+def get_presence_tracker(supabase):
+    """
+    Return the process-wide tracker, pointing it at the given backend.
+    """
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PresenceTracker(supabase)
+        elif supabase is not None:
+            _tracker.supabase = supabase
+        return _tracker
+
+def touch_players_local(client, p_beats):
+    """
+    touch_players for local backends; runs inside the backend's transaction.
+    """
+    touched = 0
+    for beat in p_beats:
+        rows = client.table("players").select("last_seen").eq("room_id", beat["room_id"]).eq("user_id", beat["user_id"]).execute().data
+        if rows and (rows[0]["last_seen"] or 0) < beat["last_seen"]:
+            client.table("players").update({"last_seen": beat["last_seen"]}).eq("room_id", beat["room_id"]).eq("user_id", beat["user_id"]).execute()
+            touched += 1
+    return touched
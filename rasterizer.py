@@ -0,0 +1,208 @@
+import io
+import re
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+from stroke_sync import apply_stroke_rows
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CANVAS_WIDTH = 600
+CANVAS_HEIGHT = 450
+BACKGROUND = "#ffffff"
+BEZIER_STEPS = 4  # samples per quadratic segment; PencilBrush segments are only a few pixels long
+MOVED_THRESHOLD = 3  # pixels between a path's left/top and its points before it counts as moved
+ROUND_JOINT_WIDTH = 4  # below this width the gaps at sharp joints are not visible
+RASTER_FORMATS = ("PNG", "WEBP")
+MAX_CACHED_RASTERS = 128
+
+_RGBA = re.compile(r"rgba?\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def parse_color(color, default=(0, 0, 0)):
+    """
+    RGB tuple for a fabric.js color string (#hex, names, rgb() or rgba()).
+    """
+    if not color:
+        return default
+    try:
+        return ImageColor.getrgb(color)[:3]
+    except ValueError:
+        match = _RGBA.match(color)
+        return tuple(int(v) for v in match.groups()) if match else default
+
+def flatten_path(obj):
+    """
+    Polylines (numpy arrays of canvas points) tracing a fabric.js path object.
+
+    Quadratic segments are sampled at BEZIER_STEPS points, all segments of a
+    subpath at once; lines are treated as degenerate quadratics.
+    """
+    starts, controls, ends = [], [], []
+    polylines = []
+    current = None
+
+    def close_subpath():
+        if starts:
+            p0, c, p1 = np.array(starts), np.array(controls), np.array(ends)
+            t = np.linspace(1 / BEZIER_STEPS, 1, BEZIER_STEPS)[None, :, None]
+            points = (1 - t) ** 2 * p0[:, None] + 2 * (1 - t) * t * c[:, None] + t ** 2 * p1[:, None]
+            polylines.append(np.vstack([p0[:1], points.reshape(-1, 2)]))
+        elif current is not None:
+            polylines.append(np.array([current]))
+        starts.clear()
+        controls.clear()
+        ends.clear()
+
+    for command in obj.get("path") or []:
+        op = command[0]
+        if op == "M":
+            close_subpath()
+            current = (command[1], command[2])
+        elif op == "Q" and current is not None:
+            starts.append(current)
+            controls.append((command[1], command[2]))
+            current = (command[3], command[4])
+            ends.append(current)
+        elif op == "L" and current is not None:
+            end = (command[1], command[2])
+            starts.append(current)
+            controls.append(((current[0] + end[0]) / 2, (current[1] + end[1]) / 2))
+            ends.append(end)
+            current = end
+    close_subpath()
+
+    if polylines and obj.get("left") is not None:
+        # Paths moved on the canvas keep their coordinates and change left/top instead
+        width = obj.get("strokeWidth", 1) or 0
+        origin = np.min(np.vstack(polylines), axis=0)
+        offset = np.array([obj["left"] + width / 2, obj.get("top", 0) + width / 2]) - origin
+        # fabric.js measures left/top on the curve, not the control points; ignore that small gap
+        if np.abs(offset).max() > MOVED_THRESHOLD:
+            polylines = [line + offset for line in polylines]
+    return polylines
+
+class DrawingRaster:
+    """
+    A bitmap of one drawing at one scale, drawn onto incrementally.
+    """
+    def __init__(self, scale=1.0, width=CANVAS_WIDTH, height=CANVAS_HEIGHT, background=BACKGROUND):
+        self.scale = scale
+        self.size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        self.background = background
+        self.version = 0
+        self._encoded = {}
+        self.reset()
+
+    def reset(self):
+        self.image = Image.new("RGB", self.size, self.background)
+        self._draw = ImageDraw.Draw(self.image)
+        self._touch()
+
+    def _touch(self):
+        self.version += 1
+        self._encoded.clear()
+
+    def draw(self, objects):
+        """
+        Paint path objects over the current bitmap.
+        """
+        for obj in objects:
+            if obj.get("type") != "path" or obj.get("visible") is False:
+                continue
+            color = parse_color(obj.get("stroke"))
+            width = max(1, round((obj.get("strokeWidth") or 1) * self.scale))
+            radius = width / 2
+            for line in flatten_path(obj):
+                points = [tuple(p) for p in (line * self.scale).tolist()]
+                if len(points) > 1:
+                    self._draw.line(points, fill=color, width=width)
+                # Round caps and joints; Pillow's joint="curve" does the same far more slowly
+                if width >= ROUND_JOINT_WIDTH:
+                    dots = points
+                elif width > 2:
+                    dots = [points[0], points[-1]]
+                else:
+                    dots = []
+                for x, y in dots:
+                    self._draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+        self._touch()
+
+    def encode(self, fmt="PNG"):
+        """
+        The bitmap as PNG or WebP bytes, encoded once per version.
+        """
+        fmt = fmt.upper()
+        if fmt not in RASTER_FORMATS:
+            raise ValueError(f"Unsupported raster format {fmt!r}; expected one of {', '.join(RASTER_FORMATS)}")
+        if fmt not in self._encoded:
+            buffer = io.BytesIO()
+            if fmt == "PNG":
+                self.image.save(buffer, format="PNG", compress_level=6)
+            else:
+                self.image.save(buffer, format="WEBP", lossless=True, method=2)
+            self._encoded[fmt] = buffer.getvalue()
+        return self._encoded[fmt]
+
+def rasterize_drawing(json_data, scale=1.0, fmt="PNG"):
+    """
+    Render a whole fabric.js document (e.g. st_canvas json_data) to image bytes.
+    """
+    raster = DrawingRaster(scale)
+    raster.draw((json_data or {}).get("objects", []))
+    return raster.encode(fmt)
+
+class RasterEntry:
+    def __init__(self, scale):
+        self.lock = threading.Lock()
+        self.raster = DrawingRaster(scale)
+        self.strokes = []
+        self.seq = 0
+
+class RasterCache:
+    """
+    Process-wide bitmaps of the drawings in progress, per room, drawing and scale.
+
+    render() takes the stroke rows of a drawing (as kept by RoomState) and
+    paints only rows newer than the cached bitmap, unless a row rewrites
+    strokes already painted (undo or clear), which repaints from scratch.
+    """
+    def __init__(self, max_entries=MAX_CACHED_RASTERS):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def render(self, room_id, drawing_id, rows, scale=1.0, fmt="PNG"):
+        key = (room_id, scale)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.drawing_id != drawing_id:
+                entry = self.entries[key] = RasterEntry(scale)
+                entry.drawing_id = drawing_id
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+        with entry.lock:
+            rows = [row for row in rows if row["seq"] > entry.seq]
+            if rows:
+                painted = len(entry.strokes)
+                entry.seq = apply_stroke_rows(entry.strokes, rows)
+                if min(row["base"] for row in rows) < painted:
+                    entry.raster.reset()
+                    entry.raster.draw(entry.strokes)
+                else:
+                    entry.raster.draw(entry.strokes[painted:])
+            return entry.raster.encode(fmt)
+
+def get_raster_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RasterCache()
+        return _cache
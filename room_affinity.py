@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import hmac
+import base64
+import bisect
+import hashlib
+import logging
+import threading
+from urllib.parse import urlencode
+from supabase import Client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORKER_URL = os.getenv("DRAWING_GAME_WORKER_URL", "")  # this process's own address; unset disables affinity
+WORKER_ID = os.getenv("DRAWING_GAME_WORKER_ID", "") or WORKER_URL
+HEARTBEAT_INTERVAL = float(os.getenv("DRAWING_GAME_WORKER_HEARTBEAT", "5"))
+WORKER_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+VIRTUAL_NODES = 160
+HANDOFF_SECRET = os.getenv("DRAWING_GAME_HANDOFF_SECRET", "")  # shared by all workers; required for affinity
+HANDOFF_TTL = 60  # seconds a handoff link stays valid
+
+_affinity = None
+_missing_secret_logged = False
+_affinity_lock = threading.Lock()
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """
+    Consistent hash ring of worker ids, with VIRTUAL_NODES points per worker.
+
+    A room belongs to the first worker point at or after its own hash.
+    Adding or removing one of n workers only moves about 1/n of the rooms.
+    """
+    def __init__(self, workers=(), vnodes=VIRTUAL_NODES):
+        self.workers = frozenset(workers)
+        points = sorted((ring_hash(f"{worker}#{i}"), worker) for worker in self.workers for i in range(vnodes))
+        self.hashes = [point for point, _ in points]
+        self.owners = [worker for _, worker in points]
+
+    def owner(self, key):
+        if not self.hashes:
+            return None
+        return self.owners[bisect.bisect(self.hashes, ring_hash(key)) % len(self.hashes)]
+
+def _handoff_signature(payload, secret):
+    return base64.urlsafe_b64encode(hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest()).decode().rstrip("=")
+
+def sign_handoff(room_id, user_id, username, now=None, secret=HANDOFF_SECRET, ttl=HANDOFF_TTL):
+    """
+    Token that lets another worker rejoin this player to a room for the next ttl seconds.
+    """
+    expires = int(now if now is not None else time.time()) + ttl
+    body = json.dumps({"room": room_id, "user": user_id, "name": username, "exp": expires}, separators=(",", ":"))
+    payload = base64.urlsafe_b64encode(body.encode()).decode().rstrip("=")
+    return f"{payload}.{_handoff_signature(payload, secret)}"
+
+def verify_handoff(token, now=None, secret=HANDOFF_SECRET):
+    """
+    The {"room", "user", "name"} a handoff token was signed for, or None if it is forged, malformed or expired.
+    """
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _handoff_signature(payload, secret)):
+            return None
+        handoff = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if handoff.get("exp", 0) < (now if now is not None else time.time()):
+        return None
+    return handoff
+
+def worker_heartbeat(supabase: Client, worker_id, url, now=None, timeout=WORKER_TIMEOUT):
+    """
+    Register this worker as alive and return {worker_id: url} of every live worker.
+    """
+    params = {"p_worker_id": worker_id, "p_url": url, "p_now": int(now if now is not None else time.time()), "p_timeout": timeout}
+    try:
+        return supabase.rpc("worker_heartbeat", params).execute().data
+    except Exception as e:
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        logger.warning("worker_heartbeat function is not deployed; registering with separate queries")
+        return worker_heartbeat_local(supabase, **params)
+
+def worker_heartbeat_local(client, p_worker_id, p_url, p_now, p_timeout=WORKER_TIMEOUT):
+    """
+    worker_heartbeat for local backends; runs inside the backend's transaction.
+    """
+    client.table("workers").upsert({"id": p_worker_id, "url": p_url, "last_seen": p_now}, on_conflict="id").execute()
+    client.table("workers").delete().lt("last_seen", p_now - 10 * p_timeout).execute()
+    rows = client.table("workers").select("id, url").gt("last_seen", p_now - p_timeout).execute().data
+    return {row["id"]: row["url"] for row in rows}
+
+class RoomAffinity:
+    """
+    Maps each room to the one worker process that serves it.
+
+    Every worker heartbeats into the workers table and rebuilds the ring
+    from the live workers it reads back. All sessions of a room then share
+    one worker, and so share its room cache, realtime copy and round timer.
+    When a worker joins or disappears, the ring changes. Sessions in rooms
+    that moved away get a rerun, so they hand off to the new owner.
+    """
+    def __init__(self, supabase, worker_id=WORKER_ID, url=WORKER_URL, interval=HEARTBEAT_INTERVAL):
+        self.supabase = supabase
+        self.worker_id = worker_id
+        self.url = url
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.urls = {worker_id: url}
+        self.ring = HashRing([worker_id])
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def refresh(self, now=None):
+        """
+        Heartbeat and rebuild the ring if the set of live workers changed. Returns True if it did.
+        """
+        workers = dict(worker_heartbeat(self.supabase, self.worker_id, self.url, now), **{self.worker_id: self.url})
+        with self.lock:
+            self.urls = workers
+            if workers.keys() == self.ring.workers:
+                return False
+            self.ring = HashRing(workers)
+        logger.info(f"Rebalanced rooms over {len(workers)} workers")
+        self._release_moved_rooms()
+        return True
+
+    def _release_moved_rooms(self):
+        from room_realtime import get_realtime_hub
+        hub = get_realtime_hub(self.supabase)
+        if hub is None:
+            return
+        for room_id in hub.watched_rooms():
+            if not self.is_local(room_id):
+                hub.rerun_room(room_id)
+
+    def owner(self, room_id):
+        """
+        The (worker_id, url) serving a room.
+        """
+        with self.lock:
+            worker = self.ring.owner(room_id)
+            return worker, self.urls.get(worker)
+
+    def is_local(self, room_id):
+        return self.owner(room_id)[0] == self.worker_id
+
+    def should_hand_off(self, room_id, arrived_at=0, now=None):
+        """
+        True if another worker serves the room. A session handed here less than
+        a heartbeat interval ago stays, since the two workers' rings may
+        briefly disagree and would otherwise bounce it back and forth.
+        """
+        now = now if now is not None else time.time()
+        return not self.is_local(room_id) and now - arrived_at >= self.interval
+
+    def handoff_url(self, room_id, user_id, username):
+        """
+        Address on the room's worker that rejoins this player to the room (see main.py).
+
+        The player is carried in a token signed with the workers' shared
+        secret and valid for HANDOFF_TTL seconds, so a crafted link cannot
+        take over another player.
+        """
+        _, url = self.owner(room_id)
+        return f"{url.rstrip('/')}/?{urlencode({'handoff': sign_handoff(room_id, user_id, username)})}"
+
+    def accept_handoff(self, token):
+        return verify_handoff(token)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="room-affinity", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.supabase.table("workers").delete().eq("id", self.worker_id).execute()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing worker ring: {e}")
+
+def get_room_affinity(supabase):
+    """
+    Return the process-wide room affinity for this backend, or None if
+    DRAWING_GAME_WORKER_URL or DRAWING_GAME_HANDOFF_SECRET is unset.
+    """
+    global _affinity, _missing_secret_logged
+    if not WORKER_URL or supabase is None:
+        return None
+    if not HANDOFF_SECRET:
+        if not _missing_secret_logged:
+            _missing_secret_logged = True
+            logger.warning("DRAWING_GAME_HANDOFF_SECRET is not set; room affinity is off")
+        return None
+    with _affinity_lock:
+        if _affinity is None or _affinity.supabase is not supabase:
+            _affinity = RoomAffinity(supabase)
+            try:
+                _affinity.refresh()
+            except Exception as e:
+                logger.error(f"Error registering worker {WORKER_ID}: {e}")
+            _affinity.start()
+        return _affinity
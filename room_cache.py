@@ -0,0 +1,126 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from room_snapshot import fetch_room_snapshot
+from room_state import RoomState
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROOM_CACHE_TTL = float(os.getenv("DRAWING_GAME_ROOM_CACHE_TTL", "2"))
+ROOM_CACHE_MAX_ROOMS = 256
+ROOM_IDLE_TIMEOUT = 300  # seconds without a reader before a room is evicted
+
+_cache = None
+_cache_lock = threading.Lock()
+
+class RoomCacheEntry:
+    def __init__(self, room_id):
+        self.state = RoomState(room_id)
+        self.fetched_at = 0
+        self.last_used = time.time()
+        self.refreshing = None  # threading.Event while a fetch is in flight
+        self.error = None
+
+class RoomCache:
+    """
+    Process-wide cache of RoomState per room, shared by every session.
+
+    A room is fetched at most once per TTL however many sessions read it:
+    the first reader after expiry refreshes it (incrementally, from the
+    cached chat and stroke cursors) while the others wait for that fetch.
+    Rooms are evicted least recently used first, beyond max_rooms or after
+    ROOM_IDLE_TIMEOUT without a reader.
+    """
+    def __init__(self, supabase, ttl=ROOM_CACHE_TTL, max_rooms=ROOM_CACHE_MAX_ROOMS, idle_timeout=ROOM_IDLE_TIMEOUT):
+        self.supabase = supabase
+        self.ttl = ttl
+        self.max_rooms = max_rooms
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.fetches = 0
+
+    def get(self, room_id):
+        """
+        Return the room's RoomState, refreshed if it is older than the TTL.
+        """
+        with self.lock:
+            now = time.time()
+            entry = self.entries.get(room_id)
+            if entry is None:
+                entry = self.entries[room_id] = RoomCacheEntry(room_id)
+            self.entries.move_to_end(room_id)
+            entry.last_used = now
+            self._evict(now)
+            if entry.state.ready and now - entry.fetched_at < self.ttl:
+                return entry.state
+            flight = entry.refreshing
+            if flight is None:
+                flight = entry.refreshing = threading.Event()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            flight.wait()
+            if not entry.state.ready:
+                raise entry.error or RuntimeError(f"Room {room_id} could not be loaded")
+            return entry.state
+
+        try:
+            self._refresh(entry)
+            entry.error = None
+        except Exception as e:
+            entry.error = e
+            raise
+        finally:
+            with self.lock:
+                entry.refreshing = None
+            flight.set()
+        return entry.state
+
+    def _refresh(self, entry):
+        cursors = entry.state.cursors() if entry.state.ready else {}
+        snapshot = fetch_room_snapshot(self.supabase, entry.state.room_id, **cursors)
+        entry.state.merge(snapshot)
+        entry.fetched_at = time.time()
+        self.fetches += 1
+
+    def invalidate(self, room_id):
+        """
+        Make the next read of the room fetch from the database, e.g. after writing to it.
+        """
+        with self.lock:
+            entry = self.entries.get(room_id)
+            if entry is not None:
+                entry.fetched_at = 0
+
+    def _evict(self, now):
+        for room_id, entry in list(self.entries.items()):
+            if len(self.entries) <= self.max_rooms and now - entry.last_used < self.idle_timeout:
+                break
+            if entry.refreshing is None:
+                del self.entries[room_id]
+
+def get_room_cache(supabase):
+    """
+    Return the process-wide room cache for this backend, or None if ROOM_CACHE_TTL is 0.
+    """
+    global _cache
+    if ROOM_CACHE_TTL <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.supabase is not supabase:
+            _cache = RoomCache(supabase, ttl=ROOM_CACHE_TTL)
+        return _cache
+
+def invalidate_room(supabase, room_id):
+    """
+    Drop the cached freshness of a room this process has just written to.
+    """
+    cache = get_room_cache(supabase)
+    if cache is not None:
+        cache.invalidate(room_id)
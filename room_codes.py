@@ -0,0 +1,135 @@
+import os
+import time
+import string
+import hashlib
+import logging
+import threading
+from collections import deque
+from supabase import Client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+HALF_SPACE = len(CODE_ALPHABET) ** (CODE_LENGTH // 2)  # the code space is HALF_SPACE ** 2
+FEISTEL_ROUNDS = 4
+ROOM_CODE_KEY = hashlib.blake2b(os.getenv("DRAWING_GAME_ROOM_CODE_KEY", "drawing-game").encode()).digest()
+RESERVE_BATCH = 32
+RECYCLE_AFTER = 3600  # seconds before the code of a deleted room is handed out again
+MAX_CREATE_ATTEMPTS = 8
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+def _round_value(key, round_number, value):
+    digest = hashlib.blake2b(value.to_bytes(4, "big"), key=key, digest_size=8, person=bytes([round_number]) * 16).digest()
+    return int.from_bytes(digest, "big") % HALF_SPACE
+
+def permute_index(index, key=ROOM_CODE_KEY):
+    """
+    Keyed bijection of [0, 36**6): a balanced Feistel network over two base-36**3 halves.
+
+    Consecutive indexes map to unrelated codes, so codes handed out in
+    sequence are neither guessable nor clustered.
+    """
+    left, right = divmod(index, HALF_SPACE)
+    for round_number in range(FEISTEL_ROUNDS):
+        left, right = right, (left + _round_value(key, round_number, right)) % HALF_SPACE
+    return left * HALF_SPACE + right
+
+def encode_code(number):
+    chars = []
+    for _ in range(CODE_LENGTH):
+        number, digit = divmod(number, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+def code_for_index(index, key=ROOM_CODE_KEY):
+    return encode_code(permute_index(index % (HALF_SPACE * HALF_SPACE), key))
+
+def reserve_room_codes(supabase: Client, count=RESERVE_BATCH, now=None):
+    """
+    Claim count codes for this process: recycled ones first, then a fresh block of indexes.
+
+    Returns {"recycled": [codes], "start": first index, "count": block size}.
+    """
+    params = {"p_count": count, "p_now": int(now if now is not None else time.time()), "p_recycle_after": RECYCLE_AFTER}
+    try:
+        return supabase.rpc("reserve_room_codes", params).execute().data
+    except Exception as e:
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        logger.warning("reserve_room_codes function is not deployed; reserving with separate, non-atomic queries")
+        return reserve_room_codes_local(supabase, **params)
+
+def reserve_room_codes_local(client, p_count, p_now, p_recycle_after=RECYCLE_AFTER):
+    """
+    reserve_room_codes for local backends; runs inside the backend's transaction.
+    """
+    recycled = client.table("recycled_room_codes").select("code").lte("released_at", p_now - p_recycle_after).order("released_at").limit(p_count).execute().data
+    codes = [row["code"] for row in recycled]
+    if codes:
+        client.table("recycled_room_codes").delete().in_("code", codes).execute()
+
+    fresh = p_count - len(codes)
+    counter = client.table("room_code_counter").select("next_index").eq("id", 1).execute().data
+    start = counter[0]["next_index"] if counter else 0
+    if fresh:
+        if counter:
+            client.table("room_code_counter").update({"next_index": start + fresh}).eq("id", 1).execute()
+        else:
+            client.table("room_code_counter").insert({"id": 1, "next_index": fresh}).execute()
+    return {"recycled": codes, "start": start, "count": fresh}
+
+class RoomCodeAllocator:
+    """
+    Process-wide source of unused room codes.
+
+    Codes are claimed in batches with one reserve_room_codes call, so
+    creating a room needs no existence probe, and no two processes (or
+    sessions) are ever handed the same code.
+    """
+    def __init__(self, supabase, batch=RESERVE_BATCH, key=ROOM_CODE_KEY):
+        self.supabase = supabase
+        self.batch = batch
+        self.key = key
+        self.lock = threading.Lock()
+        self.codes = deque()
+
+    def next_code(self):
+        with self.lock:
+            if not self.codes:
+                reserved = reserve_room_codes(self.supabase, self.batch)
+                self.codes.extend(reserved["recycled"])
+                self.codes.extend(code_for_index(index, self.key) for index in range(reserved["start"], reserved["start"] + reserved["count"]))
+            return self.codes.popleft()
+
+    def create_room(self, room_data):
+        """
+        Insert room_data under a fresh code in a single insert. Returns the code.
+
+        A code only collides with a room created before the allocator
+        existed; that insert fails and the next code is tried.
+        """
+        for _ in range(MAX_CREATE_ATTEMPTS):
+            code = self.next_code()
+            try:
+                self.supabase.table("rooms").insert(dict(room_data, id=code)).execute()
+                return code
+            except Exception as e:
+                if getattr(e, "code", None) != "23505":
+                    raise
+                logger.warning(f"Room code {code} is taken by an older room; trying the next one")
+        raise RuntimeError(f"Could not allocate a room code in {MAX_CREATE_ATTEMPTS} attempts")
+
+def get_room_code_allocator(supabase):
+    """
+    Return the process-wide allocator for the given backend.
+    """
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None or (supabase is not None and _allocator.supabase is not supabase):
+            # Reserved codes belong to the database they were reserved from
+            _allocator = RoomCodeAllocator(supabase)
+        return _allocator
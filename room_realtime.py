@@ -0,0 +1,329 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from room_snapshot import fetch_room_snapshot, PLAYER_TIMEOUT
+from room_state import RoomState
+from local_backend import LocalBackend
+from fragments import FRAGMENTS_SUPPORTED
+from app_sessions import require_session_control, request_session_rerun, is_session_active
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REALTIME_TABLES = ("rooms", "players", "chat_messages", "drawing_strokes")
+RERUN_COALESCE_INTERVAL = 0.15  # seconds to gather events before rerunning sessions
+MAINTENANCE_INTERVAL = 5.0
+RESYNC_INTERVAL = 60.0  # full reload of a room as a safety net against missed events
+
+_hub = None
+_hub_lock = threading.Lock()
+
+class LocalChangeFeed:
+    """
+    Change feed from a local backend's in-process listeners.
+    """
+    def __init__(self, backend, on_change):
+        self.backend = backend
+        self.on_change = on_change
+        backend.add_listener(on_change)
+
+    def subscribe(self, room_id):
+        pass
+
+    def unsubscribe(self, room_id):
+        pass
+
+    def close(self):
+        self.backend.remove_listener(self.on_change)
+
+class SupabaseChangeFeed:
+    """
+    Change feed from Supabase Realtime, one channel per room, on a private event loop.
+
+    The tables must be in the supabase_realtime publication (see schema.sql).
+    """
+    def __init__(self, url, anon_key, on_change):
+        self.url = url
+        self.anon_key = anon_key
+        self.on_change = on_change
+        self.client = None
+        self.channels = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="supabase-realtime", daemon=True)
+        self.thread.start()
+
+    def subscribe(self, room_id):
+        asyncio.run_coroutine_threadsafe(self._subscribe(room_id), self.loop)
+
+    def unsubscribe(self, room_id):
+        asyncio.run_coroutine_threadsafe(self._unsubscribe(room_id), self.loop)
+
+    def close(self, timeout=5.0):
+        """
+        Remove every channel, disconnect and stop the event loop.
+        """
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), self.loop).result(timeout)
+        except Exception as e:
+            logger.error(f"Error closing realtime connection: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+    async def _connect(self):
+        if self.client is None:
+            from supabase import acreate_client
+            self.client = await acreate_client(self.url, self.anon_key)
+            await self.client.realtime.connect()
+            self.loop.create_task(self.client.realtime.listen())
+
+    async def _subscribe(self, room_id):
+        try:
+            await self._connect()
+            if room_id in self.channels:
+                return
+            channel = self.client.channel(f"room-{room_id}")
+            for table in REALTIME_TABLES:
+                column = "id" if table == "rooms" else "room_id"
+                channel.on_postgres_changes(
+                    "*",
+                    schema="public",
+                    table=table,
+                    filter=f"{column}=eq.{room_id}",
+                    callback=lambda payload, table=table: self._handle(table, payload)
+                )
+            await channel.subscribe()
+            self.channels[room_id] = channel
+            logger.info(f"Subscribed to realtime changes for room {room_id}")
+        except Exception as e:
+            logger.error(f"Realtime subscribe failed for room {room_id}: {e}")
+
+    async def _unsubscribe(self, room_id):
+        channel = self.channels.pop(room_id, None)
+        if channel is not None and self.client is not None:
+            try:
+                await self.client.remove_channel(channel)
+            except Exception as e:
+                logger.error(f"Realtime unsubscribe failed for room {room_id}: {e}")
+
+    async def _close(self):
+        for room_id in list(self.channels):
+            await self._unsubscribe(room_id)
+        if self.client is not None:
+            await self.client.realtime.close()
+            self.client = None
+
+    def _handle(self, table, payload):
+        data = payload.get("data", payload)
+        event = data.get("type") or data.get("eventType")
+        new = data.get("record") or data.get("new") or {}
+        old = data.get("old_record") or data.get("old") or {}
+        self.on_change(table, str(event).split(".")[-1].upper(), new, old)
+
+class RealtimeHub:
+    """
+    Keeps one RoomState per watched room current from a change feed.
+
+    Sessions watch the room they are in; each change event is applied once
+    to the shared state, and only sessions whose view changed (strokes are
+    not news to the drawer, heartbeat-only player updates are news to no
+    one) get a rerun, coalesced over RERUN_COALESCE_INTERVAL.
+    """
+    def __init__(self, supabase, feed_factory):
+        self.supabase = supabase
+        self.lock = threading.Lock()
+        self.rooms = {}
+        self.watchers = defaultdict(dict)
+        self.loading = set()
+        self.pending_reruns = {}  # session_id -> (RoomState, fragment to rerun or None for the whole script)
+        self.feed = feed_factory(self._on_change)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="realtime-hub", daemon=True)
+        self._thread.start()
+
+    def watch(self, room_id, user_id, session_id=None, chat_fragment=None):
+        """
+        Register a session's interest in a room. Returns the live RoomState, or None if not loaded yet.
+
+        chat_fragment is the id of the session's chat pane fragment, rerun on
+        its own when only chat changed.
+        """
+        with self.lock:
+            self.watchers[room_id][session_id or user_id] = {"user_id": user_id, "session_id": session_id, "chat_fragment": chat_fragment, "seen": time.time()}
+            state = self.rooms.get(room_id)
+            if state is None:
+                state = self.rooms[room_id] = RoomState(room_id)
+                self.feed.subscribe(room_id)
+            needs_load = not state.ready and room_id not in self.loading
+            if needs_load:
+                self.loading.add(room_id)
+
+        if needs_load:
+            self._load(state)
+        return state if state.ready else None
+
+    def unwatch(self, room_id, user_id, session_id=None):
+        with self.lock:
+            watchers = self.watchers.get(room_id, {})
+            watchers.pop(session_id or user_id, None)
+            if not watchers:
+                self._drop_room(room_id)
+
+    def chat_rendered(self, room_id, session_id, chat_added):
+        """
+        Record the room state's chat_added count as of a session's last chat read, so it is not rerun for messages it already has.
+        """
+        with self.lock:
+            watcher = self.watchers.get(room_id, {}).get(session_id)
+            if watcher is not None:
+                watcher["chat_added"] = chat_added
+
+    def _chat_shown(self, state, session_id):
+        with self.lock:
+            watcher = self.watchers.get(state.room_id, {}).get(session_id)
+            shown = watcher.get("chat_added") if watcher else None
+        return shown is not None and shown >= state.chat_added
+
+    def watched_rooms(self):
+        with self.lock:
+            return list(self.rooms)
+
+    def rerun_room(self, room_id):
+        """
+        Rerun every session watching a room, e.g. after the room moved to another worker.
+        """
+        with self.lock:
+            state = self.rooms.get(room_id)
+        if state is not None:
+            self._schedule_reruns(state, {"room"})
+
+    def close(self):
+        """
+        Stop the rerun thread and detach from the change feed. The hub cannot be used afterwards.
+        """
+        self._stop.set()
+        self._thread.join()
+        with self.lock:
+            self.rooms.clear()
+            self.watchers.clear()
+        self.feed.close()
+
+    def _drop_room(self, room_id):
+        self.watchers.pop(room_id, None)
+        if self.rooms.pop(room_id, None) is not None:
+            self.feed.unsubscribe(room_id)
+
+    def _load(self, state):
+        state.begin_load()
+        try:
+            snapshot = fetch_room_snapshot(self.supabase, state.room_id)
+            players = self.supabase.table("players").select("*").eq("room_id", state.room_id).execute().data
+            state.load(snapshot, players)
+            return True
+        except Exception as e:
+            logger.error(f"Error loading room {state.room_id} for realtime: {e}")
+            return False
+        finally:
+            with self.lock:
+                self.loading.discard(state.room_id)
+
+    def _on_change(self, table, event, new, old):
+        if table not in REALTIME_TABLES:
+            return
+        row = new or old
+        room_id = row.get("id") if table == "rooms" else row.get("room_id")
+        with self.lock:
+            targets = [self.rooms[room_id]] if room_id in self.rooms else ([] if room_id else list(self.rooms.values()))
+        for state in targets:
+            changed = state.apply(table, event, new, old)
+            if changed:
+                self._schedule_reruns(state, changed)
+
+    def _schedule_reruns(self, state, changed):
+        drawer_id = state.drawer_id
+        chat_only = changed == {"chat"} and FRAGMENTS_SUPPORTED
+        with self.lock:
+            for watcher in self.watchers.get(state.room_id, {}).values():
+                session_id = watcher["session_id"]
+                if session_id is None:
+                    continue
+                if changed == {"strokes"} and watcher["user_id"] == drawer_id:
+                    continue
+                # New chat only reruns the chat pane (ui_components.render_chat_pane); a full rerun covers it too
+                fragment_id = watcher["chat_fragment"] if chat_only else None
+                if session_id not in self.pending_reruns or fragment_id is None:
+                    self.pending_reruns[session_id] = (state, fragment_id)
+
+    def _run(self):
+        last_maintenance = time.time()
+        while not self._stop.wait(RERUN_COALESCE_INTERVAL):
+            with self.lock:
+                pending, self.pending_reruns = self.pending_reruns, {}
+            for session_id, (state, fragment_id) in pending.items():
+                if fragment_id is not None and self._chat_shown(state, session_id):
+                    continue
+                request_session_rerun(session_id, fragment_id)
+            if time.time() - last_maintenance >= MAINTENANCE_INTERVAL:
+                last_maintenance = time.time()
+                self._maintain()
+
+    def _maintain(self):
+        """
+        Drop watchers whose browser disconnected and reload rooms not
+        resynced for RESYNC_INTERVAL. Connected players are kept alive by
+        the presence tracker.
+        """
+        now = time.time()
+        with self.lock:
+            stale = [state for room_id, state in self.rooms.items()
+                     if state.ready and now - state.loaded_at > RESYNC_INTERVAL and room_id not in self.loading]
+            self.loading.update(state.room_id for state in stale)
+        for state in stale:
+            if self._load(state):
+                self._schedule_reruns(state, {"room", "players", "chat", "strokes"})
+
+        with self.lock:
+            for room_id in list(self.watchers):
+                watchers = self.watchers[room_id]
+                for key, watcher in list(watchers.items()):
+                    if watcher["session_id"] is not None and is_session_active(watcher["session_id"]):
+                        watcher["seen"] = now
+                    elif now - watcher["seen"] > PLAYER_TIMEOUT:
+                        del watchers[key]
+                if not watchers:
+                    self._drop_room(room_id)
+
+def realtime_enabled(supabase):
+    """
+    Realtime is on by default for local backends and opt-in (DRAWING_GAME_REALTIME=1) for Supabase.
+    """
+    setting = os.getenv("DRAWING_GAME_REALTIME")
+    if setting == "0" or supabase is None:
+        return False
+    if isinstance(supabase, LocalBackend):
+        return True
+    return setting == "1" and hasattr(supabase, "shared")
+
+def get_realtime_hub(supabase):
+    """
+    Return the process-wide hub for this backend, or None if realtime is off.
+
+    Raises RuntimeError if this Streamlit version cannot rerun sessions
+    from the hub's thread (see app_sessions.py).
+    """
+    global _hub
+    if not realtime_enabled(supabase):
+        return None
+    with _hub_lock:
+        if _hub is None or _hub.supabase is not supabase:
+            require_session_control()
+            if _hub is not None:
+                _hub.close()
+            if isinstance(supabase, LocalBackend):
+                factory = lambda on_change: LocalChangeFeed(supabase, on_change)
+            else:
+                factory = lambda on_change: SupabaseChangeFeed(supabase.shared.url, supabase.shared.anon_key, on_change)
+            _hub = RealtimeHub(supabase, factory)
+        return _hub
@@ -0,0 +1,170 @@
+import time
+import json
+from datetime import datetime, timedelta
+import hashlib
+import logging
+from supabase import Client
+from metrics import record_payload
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PLAYER_TIMEOUT = 60
+CHAT_TAIL_LIMIT = 50
+VISIBLE_PLAYER_FIELDS = ("user_id", "name", "score", "color", "avatar")
+CHAT_SETTLE = 10  # seconds within which a chat message can commit after one with a higher id
+CHAT_RECENT = 3 * CHAT_SETTLE  # seconds a reader remembers the chat ids it read
+
+_snapshot_rpc_available = True
+
+def players_etag(players):
+    """
+    Digest of the visible fields of a room's live players, matching the room_snapshot function's.
+    """
+    rows = sorted(players, key=lambda p: p["user_id"])
+    text = ",".join(":".join(str(p[f]) for f in VISIBLE_PLAYER_FIELDS if p.get(f) is not None) for p in rows)
+    return hashlib.md5(text.encode()).hexdigest()
+
+class ChatCursor:
+    """
+    A reader's position in a room's chat: the newest id it has read and the ids it read recently.
+
+    Chat ids come from one sequence shared by every room, so a message can
+    commit after one with a higher id, e.g. a guess racing the round
+    timer's advance_round. Until a sync made CHAT_SETTLE seconds after the
+    cursor last moved, syncs send the recently read ids as chat_seen and
+    also get the messages below the cursor, created at most CHAT_SETTLE
+    seconds before it, that are not among them. Only those late rows are
+    transferred, and a settled cursor asks for nothing extra.
+    """
+    def __init__(self):
+        self.after = None
+        self.moved_at = 0
+        self.settled = True
+        self.recent = {}  # chat id -> when it was read
+        self._checked_at = None
+
+    def sync_args(self, now):
+        """
+        chat_after and chat_seen for the next sync.
+        """
+        self._checked_at = None if self.settled or self.after is None else now
+        return {"chat_after": self.after, "chat_seen": None if self._checked_at is None else sorted(self.recent)}
+
+    def take(self, rows, now, held=()):
+        """
+        Record the chat rows of a sync made with sync_args. Returns the ones not read before (or in held), in id order.
+        """
+        new_rows = sorted((row for row in rows if row["id"] not in self.recent and row["id"] not in held), key=lambda row: row["id"])
+        for row in new_rows:
+            self.recent[row["id"]] = now
+        if new_rows and (self.after is None or new_rows[-1]["id"] > self.after):
+            self.after = new_rows[-1]["id"]
+            self.moved_at = now
+            self.settled = False
+        elif self._checked_at is not None and self._checked_at - self.moved_at >= CHAT_SETTLE:
+            self.settled = True
+        self._checked_at = None
+        self.recent = {chat_id: read_at for chat_id, read_at in self.recent.items() if now - read_at < CHAT_RECENT}
+        return new_rows
+
+def fetch_room_snapshot(supabase: Client, room_id, user_id=None, chat_after=None, drawing_id="", stroke_after=0, now=None, room_version=None, players_etag=None, chat_seen=None):
+    """
+    Record a heartbeat and fetch room, live players, new chat and new strokes in one call.
+
+    Returns a dict with "room", "version", "players", "players_etag",
+    "chat", "drawing_id" and "strokes". "version" is None if the room is
+    gone. "room" (without drawing_data) is None if its version is still
+    room_version, and "players" is None if their etag is still
+    players_etag. Chat rows ({"id", "message_data"}) are the latest
+    CHAT_TAIL_LIMIT messages, only those after chat_after if given. With
+    chat_seen, they also include the messages that committed late (see
+    ChatCursor). Strokes are the rows of the room's current drawing after stroke_after,
+    or all of them if drawing_id is stale.
+    """
+    global _snapshot_rpc_available
+    now = int(now if now is not None else time.time())
+
+    if _snapshot_rpc_available:
+        params = {
+            "p_room_id": room_id,
+            "p_user_id": user_id,
+            "p_now": now,
+            "p_timeout": PLAYER_TIMEOUT,
+            "p_chat_limit": CHAT_TAIL_LIMIT,
+            "p_chat_after": chat_after,
+            "p_drawing_id": drawing_id,
+            "p_stroke_after": stroke_after,
+            "p_room_version": room_version,
+            "p_players_etag": players_etag,
+            "p_chat_seen": chat_seen,
+            "p_chat_settle": CHAT_SETTLE
+        }
+        try:
+            snapshot = supabase.rpc("room_snapshot", params).execute().data
+            record_payload("room_snapshot", len(json.dumps(snapshot)))
+            return snapshot
+        except Exception as e:
+            if getattr(e, "code", None) != "PGRST202":
+                raise
+            _snapshot_rpc_available = False
+            logger.warning("room_snapshot function is not deployed; falling back to per-table queries")
+
+    return _fetch_room_snapshot_tables(supabase, room_id, user_id, chat_after, drawing_id, stroke_after, now, room_version, players_etag, chat_seen=chat_seen)
+
+def _fetch_room_snapshot_tables(supabase: Client, room_id, user_id, chat_after, drawing_id, stroke_after, now, room_version=None, known_etag=None, timeout=PLAYER_TIMEOUT, chat_limit=CHAT_TAIL_LIMIT, chat_seen=None, chat_settle=CHAT_SETTLE):
+    """
+    Same contract as the room_snapshot function, built from individual table queries.
+    """
+    if user_id:
+        supabase.table("players").update({"last_seen": now}).eq("user_id", user_id).eq("room_id", room_id).execute()
+
+    room = supabase.table("rooms").select("*").eq("id", room_id).execute()
+    if not room.data:
+        return {"room": None, "version": None, "players": [], "players_etag": None, "chat": [], "drawing_id": "", "strokes": []}
+    room = room.data[0]
+    room.pop("drawing_data", None)
+
+    players = supabase.table("players").select("*").eq("room_id", room_id).gt("last_seen", now - timeout).execute()
+    chat = supabase.table("chat_messages").select("id, message_data").eq("room_id", room_id)
+    if chat_after is not None:
+        chat = chat.gt("id", chat_after)
+    chat = list(reversed(chat.order("id", desc=True).limit(chat_limit).execute().data))
+    if chat_after is not None and chat_seen is not None:
+        chat = _late_chat(supabase, room_id, chat_after, chat_seen, chat_settle) + chat
+
+    current_drawing_id = (room.get("game_state") or {}).get("drawing_id", "")
+    strokes = []
+    if current_drawing_id:
+        after = stroke_after if current_drawing_id == drawing_id else 0
+        strokes = supabase.table("drawing_strokes").select("seq, base, strokes").eq("room_id", room_id).eq("drawing_id", current_drawing_id).gt("seq", after).order("seq").execute().data
+
+    etag = players_etag(players.data)
+    return {
+        "room": room if room_version is None or room.get("version") != room_version else None,
+        "version": room.get("version", 0),
+        "players": players.data if etag != known_etag else None,
+        "players_etag": etag,
+        "chat": chat,
+        "drawing_id": current_drawing_id,
+        "strokes": strokes
+    }
+
+def _late_chat(supabase: Client, room_id, chat_after, chat_seen, settle):
+    """
+    Messages below chat_after, created at most settle seconds before it, that are not in chat_seen.
+    """
+    cursor = supabase.table("chat_messages").select("created_at").eq("id", chat_after).execute().data
+    if not cursor or not cursor[0]["created_at"]:
+        return []
+    since = datetime.fromisoformat(cursor[0]["created_at"]) - timedelta(seconds=settle)
+    rows = supabase.table("chat_messages").select("id, message_data").eq("room_id", room_id).lt("id", chat_after).gte("created_at", since.isoformat()).order("id").execute().data
+    seen = set(chat_seen)
+    return [row for row in rows if row["id"] not in seen]
+
+def room_snapshot_local(client, p_room_id, p_user_id=None, p_now=None, p_timeout=PLAYER_TIMEOUT, p_chat_limit=CHAT_TAIL_LIMIT, p_chat_after=None, p_drawing_id="", p_stroke_after=0, p_room_version=None, p_players_etag=None, p_chat_seen=None, p_chat_settle=CHAT_SETTLE):
+    """
+    room_snapshot for local backends; runs inside the backend's transaction.
+    """
+    now = int(p_now if p_now is not None else time.time())
+    return _fetch_room_snapshot_tables(client, p_room_id, p_user_id, p_chat_after, p_drawing_id, p_stroke_after, now, p_room_version, p_players_etag, p_timeout, p_chat_limit, p_chat_seen, p_chat_settle)
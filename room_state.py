@@ -0,0 +1,241 @@
+import time
+import logging
+import threading
+from collections import deque
+from room_snapshot import PLAYER_TIMEOUT, CHAT_TAIL_LIMIT, CHAT_SETTLE, VISIBLE_PLAYER_FIELDS, ChatCursor, players_etag as _players_etag
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_SIZE = 2 * CHAT_TAIL_LIMIT
+
+class RoomState:
+    """
+    In-process copy of one room, kept current by applying change events.
+
+    Holds the room row, every player row, the latest chat rows and the
+    stroke rows of the current drawing, and answers snapshot() with the
+    same shape as room_snapshot.fetch_room_snapshot. Each apply_* method
+    returns the set of aspects ("room", "players", "chat", "strokes") whose
+    visible content changed.
+    """
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.lock = threading.Lock()
+        self.room = None
+        self.players = {}
+        self.chat = deque(maxlen=CHAT_HISTORY_SIZE)
+        self.chat_arrived = {}  # chat id -> when this state got the row
+        self.chat_cursor = ChatCursor()
+        self.chat_added = 0  # rows ever added to chat, to tell readers whether they are behind
+        self.strokes = []
+        self.players_etag = None
+        self.version = 0
+        self.ready = False
+        self.loaded_at = 0
+        self._recording = False
+        self._backlog = []
+
+    @property
+    def drawing_id(self):
+        return ((self.room or {}).get("game_state") or {}).get("drawing_id", "")
+
+    @property
+    def current_word(self):
+        return ((self.room or {}).get("game_state") or {}).get("current_word", "")
+
+    @property
+    def drawer_id(self):
+        return ((self.room or {}).get("game_state") or {}).get("drawing_player_id", "")
+
+    def begin_load(self):
+        """
+        Start recording events, to be replayed over the snapshot passed to load().
+        """
+        with self.lock:
+            self._recording = True
+            self._backlog = []
+
+    def load(self, snapshot, players):
+        """
+        Replace the state from a fresh snapshot and every player row, then replay queued events.
+
+        Replays are harmless for events the snapshot already contains: chat
+        and stroke rows are deduplicated by id/seq, row updates are merges.
+        """
+        with self.lock:
+            self._recording = False
+            self.room = snapshot["room"]
+            self.players = {player["id"]: player for player in players}
+            self.chat.clear()
+            self.chat_arrived = {}
+            self.chat_cursor = ChatCursor()
+            for row in self.chat_cursor.take(snapshot["chat"], time.time()):
+                self._add_chat(row)
+            self.strokes = list(snapshot["strokes"])
+            self.players_etag = snapshot.get("players_etag")
+            self.ready = True
+            self.loaded_at = time.time()
+            self.version += 1
+            backlog, self._backlog = self._backlog, []
+        for table, event, new, old in backlog:
+            self.apply(table, event, new, old)
+
+    def merge(self, snapshot):
+        """
+        Fold in an incremental fetch_room_snapshot result taken after this state's cursors.
+
+        A room or player list the snapshot left out as not modified is kept.
+        Returns the aspects that changed.
+        """
+        with self.lock:
+            changed = set()
+            room = self.room if snapshot["room"] is None and snapshot["version"] is not None else snapshot["room"]
+            if room != self.room:
+                changed.add("room")
+            if room and snapshot["drawing_id"] != self.drawing_id:
+                self.strokes = []
+            self.room = room
+            if snapshot["players"] is None:
+                # The same players are still live as of this fetch
+                seen = int(time.time())
+                for player in self.players.values():
+                    player["last_seen"] = max(player.get("last_seen") or 0, seen)
+            else:
+                players = {player["id"]: player for player in snapshot["players"]}
+                if players.keys() != self.players.keys() or any(
+                        self.players[pid].get(f) != player.get(f) for pid, player in players.items() for f in VISIBLE_PLAYER_FIELDS):
+                    changed.add("players")
+                self.players = players
+            self.players_etag = snapshot.get("players_etag")
+            for row in self.chat_cursor.take(snapshot["chat"], time.time(), held=self.chat_arrived):
+                if self._add_chat(row):
+                    changed.add("chat")
+            for row in snapshot["strokes"]:
+                if not self.strokes or row["seq"] > self.strokes[-1]["seq"]:
+                    self.strokes.append(row)
+                    changed.add("strokes")
+            self.ready = True
+            self.loaded_at = time.time()
+            if changed:
+                self.version += 1
+            return changed
+
+    def cursors(self):
+        """
+        Arguments for an incremental fetch_room_snapshot: chat_after, chat_seen,
+        drawing_id, stroke_after, room_version and players_etag.
+        """
+        with self.lock:
+            return {
+                **self.chat_cursor.sync_args(time.time()),
+                "drawing_id": self.drawing_id,
+                "stroke_after": self.strokes[-1]["seq"] if self.strokes else 0,
+                "room_version": self.room.get("version") if self.room else None,
+                "players_etag": self.players_etag
+            }
+
+    def apply(self, table, event, new, old):
+        """
+        Apply one INSERT/UPDATE/DELETE event. Returns the aspects that changed.
+        """
+        with self.lock:
+            if not self.ready or self._recording:
+                self._backlog.append((table, event, new, old))
+            if not self.ready:
+                return set()
+            if table == "rooms":
+                changed = self._apply_room(event, new)
+            elif table == "players":
+                changed = self._apply_player(event, new, old)
+            elif table == "chat_messages":
+                changed = self._apply_chat(event, new)
+            elif table == "drawing_strokes":
+                changed = self._apply_stroke(event, new)
+            else:
+                changed = set()
+            if changed:
+                self.version += 1
+            return changed
+
+    def _apply_room(self, event, new):
+        if event == "DELETE":
+            self.room = None
+            return {"room"}
+        previous_drawing_id = self.drawing_id
+        self.room = dict(self.room or {}, **new)
+        if self.drawing_id != previous_drawing_id:
+            self.strokes = []
+        return {"room"}
+
+    def _apply_player(self, event, new, old):
+        if event == "DELETE":
+            return {"players"} if self.players.pop(old.get("id"), None) is not None else set()
+        previous = self.players.get(new["id"])
+        self.players[new["id"]] = dict(previous or {}, **new)
+        if previous is None:
+            return {"players"}
+        return {"players"} if any(previous.get(f) != new.get(f, previous.get(f)) for f in VISIBLE_PLAYER_FIELDS) else set()
+
+    def _apply_chat(self, event, new):
+        if event != "INSERT":
+            return set()
+        return {"chat"} if self._add_chat({"id": new["id"], "message_data": new["message_data"]}) else set()
+
+    def _add_chat(self, row):
+        """
+        Add a chat row in id order unless it is already held. Returns True if added.
+
+        A row can arrive after one with a higher id (see room_snapshot.ChatCursor).
+        """
+        if row["id"] in self.chat_arrived:
+            return False
+        if not self.chat or row["id"] > self.chat[-1]["id"]:
+            self.chat.append(row)
+        else:
+            self.chat = deque(sorted([*self.chat, row], key=lambda held: held["id"]), maxlen=CHAT_HISTORY_SIZE)
+            if self.chat[0]["id"] > row["id"]:
+                return False
+        self.chat_arrived[row["id"]] = time.time()
+        self.chat_added += 1
+        if len(self.chat_arrived) > 2 * CHAT_HISTORY_SIZE:
+            self.chat_arrived = {held["id"]: self.chat_arrived[held["id"]] for held in self.chat if held["id"] in self.chat_arrived}
+        return True
+
+    def _apply_stroke(self, event, new):
+        if event != "INSERT" or new.get("drawing_id") != self.drawing_id:
+            return set()
+        if self.strokes and new["seq"] <= self.strokes[-1]["seq"]:
+            return set()
+        self.strokes.append({"seq": new["seq"], "base": new["base"], "strokes": new["strokes"]})
+        return {"strokes"}
+
+    def snapshot(self, chat_after=None, drawing_id="", stroke_after=0, now=None, room_version=None, players_etag=None, timeout=PLAYER_TIMEOUT, chat_seen=None):
+        """
+        Answer a sync from memory, with the same contract as fetch_room_snapshot.
+
+        Late chat rows are judged by when this state got them rather than by created_at.
+        """
+        now = now if now is not None else time.time()
+        with self.lock:
+            if not self.room:
+                return {"room": None, "version": None, "players": [], "players_etag": None, "chat": [], "drawing_id": "", "strokes": []}
+            version = self.room.get("version", 0)
+            players = [dict(p) for p in self.players.values() if (p.get("last_seen") or 0) > now - timeout]
+            etag = _players_etag(players)
+            chat = [row for row in self.chat if chat_after is None or row["id"] > chat_after][-CHAT_TAIL_LIMIT:]
+            if chat_after is not None and chat_seen is not None:
+                seen = set(chat_seen)
+                since = self.chat_arrived.get(chat_after, now) - CHAT_SETTLE
+                chat = [row for row in self.chat if row["id"] < chat_after and row["id"] not in seen and self.chat_arrived.get(row["id"], 0) >= since] + chat
+            current_drawing_id = self.drawing_id
+            after = stroke_after if current_drawing_id == drawing_id else 0
+            return {
+                "room": dict(self.room) if room_version is None or self.room.get("version") != room_version else None,
+                "version": version,
+                "players": players if etag != players_etag else None,
+                "players_etag": etag,
+                "chat": list(chat),
+                "drawing_id": current_drawing_id,
+                "strokes": [row for row in self.strokes if row["seq"] > after] if current_drawing_id else []
+            }
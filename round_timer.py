@@ -0,0 +1,221 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from supabase import Client
+from room_snapshot import PLAYER_TIMEOUT
+from room_cache import invalidate_room
+from word_bank import draw_words
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROUND_GRACE = float(os.getenv("DRAWING_GAME_ROUND_GRACE", "1.0"))  # seconds after the deadline for guesses in flight
+TIMER_WORKERS = int(os.getenv("DRAWING_GAME_ROUND_TIMER_WORKERS", "4"))
+
+_timer = None
+_timer_lock = threading.Lock()
+
+def advance_round(supabase: Client, room_id, expected_round, difficulty="medium", timed_out=False, end_game=False, now=None):
+    """
+    Move a room on from round expected_round: to the next drawer, or to game over
+    after its last round (or when end_game is set). Posts the system messages.
+
+    Nothing happens if the room has already left that round, so a correct
+    guess, the round timer and the owner can all race to advance it safely.
+    Returns the room's new game_state, or None if it was not advanced.
+    """
+    params = {
+        "p_room_id": room_id,
+        "p_expected_round": expected_round,
+        "p_word_options": [] if end_game else draw_words(room_id, difficulty, 3),
+        "p_now": int(now if now is not None else time.time()),
+        "p_timed_out": timed_out,
+        "p_end_game": end_game,
+        "p_timeout": PLAYER_TIMEOUT
+    }
+    try:
+        game_state = supabase.rpc("advance_round", params).execute().data
+    except Exception as e:
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        logger.warning("advance_round function is not deployed; advancing with separate, non-atomic queries")
+        game_state = advance_round_local(supabase, **params)
+    invalidate_room(supabase, room_id)
+    return game_state
+
+def advance_round_local(client, p_room_id, p_expected_round, p_word_options, p_now, p_timed_out=False, p_end_game=False, p_timeout=PLAYER_TIMEOUT):
+    """
+    advance_round for local backends; runs inside the backend's transaction.
+    """
+    room = client.table("rooms").select("game_state, settings").eq("id", p_room_id).execute().data
+    if not room:
+        return None
+    game_state = room[0]["game_state"] or {}
+    settings = room[0]["settings"] or {}
+    if game_state.get("status") != "active" or game_state.get("current_round") != p_expected_round:
+        return None
+
+    players = client.table("players").select("user_id, name, score, last_seen").eq("room_id", p_room_id).gte("last_seen", p_now - p_timeout).execute().data
+    players.sort(key=lambda p: (-p["score"], p["user_id"]))
+
+    messages = []
+    if p_timed_out:
+        word = game_state.get("current_word", "")
+        messages.append(f"Time's up! The word was: {word.upper()}" if word else "Time's up! No word was chosen.")
+
+    if p_end_game or not players or game_state.get("rounds_played", 0) + 1 >= settings.get("max_rounds", 3):
+        game_state["status"] = "game_over"
+        client.table("rooms").update({"game_state": game_state}).eq("id", p_room_id).execute()
+        messages.append("Game over! Thanks for playing!")
+        if players:
+            highest_score = players[0]["score"]
+            winners = [p["name"] for p in players if p["score"] == highest_score]
+            messages.append(f"Winner: {', '.join(winners)} with {highest_score} points!")
+    else:
+        drawer_ids = [p["user_id"] for p in players]
+        current = game_state.get("drawing_player_id", "")
+        next_player = players[(drawer_ids.index(current) + 1) % len(players)] if current in drawer_ids else players[0]
+        game_state["current_round"] += 1
+        game_state["rounds_played"] = game_state.get("rounds_played", 0) + 1
+        game_state["current_word"] = ""
+        game_state["drawing_player_id"] = next_player["user_id"]
+        game_state["timer_start"] = p_now
+        game_state["word_options"] = p_word_options
+        game_state["drawing_id"] = ""
+        game_state["guessed_by"] = None
+        client.table("rooms").update({"game_state": game_state, "drawing_data": None}).eq("id", p_room_id).execute()
+        messages.append(f"Round {game_state['current_round']}! {next_player['name']} is choosing a word.")
+
+    client.table("chat_messages").insert([
+        {"room_id": p_room_id, "message_data": {"type": "system", "content": content}}
+        for content in messages
+    ]).execute()
+    return game_state
+
+def round_deadline(game_state, settings):
+    """
+    When the round in game_state times out (choosing and drawing share the round time).
+    """
+    return (game_state.get("timer_start") or 0) + (settings or {}).get("round_time", 60)
+
+class RoundTimer:
+    """
+    Process-wide scheduler advancing rounds whose time has run out.
+
+    Deadlines of every room this process knows of sit in one heap, with
+    lazy deletion of superseded entries; a single thread sleeps until the
+    earliest one and hands expired rounds to a small worker pool, so
+    thousands of rooms cost no thread each.
+    """
+    def __init__(self, supabase, grace=ROUND_GRACE, workers=TIMER_WORKERS):
+        self.supabase = supabase
+        self.grace = grace
+        self.condition = threading.Condition()
+        self.deadlines = {}
+        self.heap = []
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="round-timer")
+        self._thread = None
+        self._stop = False
+
+    def schedule(self, room_id, current_round, deadline, difficulty="medium"):
+        """
+        Advance room_id from current_round at deadline, replacing its previous deadline.
+        """
+        entry = (deadline + self.grace, current_round, difficulty)
+        with self.condition:
+            if self.deadlines.get(room_id) == entry:
+                return
+            self.deadlines[room_id] = entry
+            heapq.heappush(self.heap, (entry[0], room_id, current_round))
+            if len(self.heap) > 4 * len(self.deadlines) + 64:
+                self.heap = [(due, room, round_number) for room, (due, round_number, _) in self.deadlines.items()]
+                heapq.heapify(self.heap)
+            if self.heap[0][1] == room_id:
+                self.condition.notify()
+        self.start()
+
+    def sync_room(self, room_id, room):
+        """
+        Schedule or cancel a room's deadline from its row (game_state and settings).
+        """
+        game_state = (room or {}).get("game_state") or {}
+        if game_state.get("status") != "active" or not game_state.get("timer_start"):
+            self.cancel(room_id)
+            return
+        settings = room.get("settings") or {}
+        self.schedule(room_id, game_state.get("current_round", 1), round_deadline(game_state, settings), settings.get("difficulty", "medium"))
+
+    def cancel(self, room_id):
+        with self.condition:
+            self.deadlines.pop(room_id, None)
+
+    def pop_due(self, now=None):
+        """
+        Remove and return (room_id, current_round, difficulty) for every deadline that has passed.
+        """
+        now = now if now is not None else time.time()
+        due = []
+        with self.condition:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, room_id, current_round = heapq.heappop(self.heap)
+                entry = self.deadlines.get(room_id)
+                if entry is not None and entry[:2] == (deadline, current_round):
+                    del self.deadlines[room_id]
+                    due.append((room_id, current_round, entry[2]))
+        return due
+
+    def expire(self, room_id, current_round, difficulty):
+        try:
+            game_state = advance_round(self.supabase, room_id, current_round, difficulty, timed_out=True)
+        except Exception as e:
+            logger.error(f"Error advancing room {room_id} past round {current_round}: {e}")
+            return
+        if game_state is None:
+            return
+        logger.info(f"Round {current_round} of room {room_id} timed out")
+        room = self.supabase.table("rooms").select("game_state, settings").eq("id", room_id).execute().data
+        if room:
+            self.sync_room(room_id, room[0])
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self.condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="round-timer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self.condition:
+            self._stop = True
+            self.condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.executor.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if self._stop:
+                    return
+                timeout = self.heap[0][0] - time.time() if self.heap else None
+                if timeout is None or timeout > 0:
+                    self.condition.wait(timeout)
+                    continue
+            for room_id, current_round, difficulty in self.pop_due():
+                self.executor.submit(self.expire, room_id, current_round, difficulty)
+
+def get_round_timer(supabase):
+    """
+    Return the process-wide round timer, pointing it at the given backend.
+    """
+    global _timer
+    with _timer_lock:
+        if _timer is None:
+            _timer = RoundTimer(supabase)
+        elif supabase is not None:
+            _timer.supabase = supabase
+        return _timer
@@ -0,0 +1,528 @@
+-- Schema additions on top of the rooms, players and chat_messages tables.
+-- Run in the Supabase SQL editor (or psql) after the base tables exist.
+
+-- Append-only stroke log written by stroke_sync.py. Each row carries the
+-- strokes the drawer added since the previous row; `base` is the stroke count
+-- the row applies on top of, so an undo or clear is a row with a smaller base.
+-- `strokes` holds a stroke_codec.pack_strokes string (older rows: a raw array).
+create table if not exists drawing_strokes (
+    room_id text not null references rooms(id) on delete cascade,
+    drawing_id text not null,
+    seq integer not null,
+    base integer not null,
+    strokes jsonb not null,
+    created_at timestamptz not null default now(),
+    primary key (room_id, drawing_id, seq)
+);
+
+-- Room state version: bumped by every update of a room row, so writers can
+-- make compare-and-set updates (mutations.MutationBatch expect_version) and
+-- room_snapshot can answer "not modified" to a caller that already has it.
+alter table rooms add column if not exists version bigint not null default 0;
+
+create or replace function bump_room_version() returns trigger
+language plpgsql
+as $$
+begin
+    new.version := old.version + 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists rooms_bump_version on rooms;
+create trigger rooms_bump_version before update on rooms
+for each row execute function bump_room_version();
+
+-- One-round-trip sync used by room_snapshot.py: records the caller's
+-- heartbeat and returns the room row, live players, chat messages and the
+-- stroke rows of the current drawing after p_stroke_after (all of them if
+-- p_drawing_id is not the current drawing). Chat is the latest p_chat_limit
+-- messages, restricted to ids after p_chat_after when a cursor is given,
+-- oldest first. Ids come from one sequence shared by all rooms, so a message
+-- can commit after one with a higher id. With p_chat_seen, chat also includes
+-- the messages below the cursor created at most p_chat_settle seconds before
+-- it whose ids are not in p_chat_seen (room_snapshot.ChatCursor). The room
+-- row (without the legacy drawing_data) is null when
+-- its version is still p_room_version, and players is null when their
+-- players_etag is still p_players_etag, so a sync of a quiet room returns
+-- little more than the version and etag. version is null if the room is gone.
+drop function if exists room_snapshot(text, text, bigint, integer, integer, text, integer);
+drop function if exists room_snapshot(text, text, bigint, integer, integer, bigint, text, integer);
+drop function if exists room_snapshot(text, text, bigint, integer, integer, bigint, text, integer, bigint, text);
+create or replace function room_snapshot(
+    p_room_id text,
+    p_user_id text default null,
+    p_now bigint default null,
+    p_timeout integer default 60,
+    p_chat_limit integer default 50,
+    p_chat_after bigint default null,
+    p_drawing_id text default '',
+    p_stroke_after integer default 0,
+    p_room_version bigint default null,
+    p_players_etag text default null,
+    p_chat_seen bigint[] default null,
+    p_chat_settle integer default 10
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_now bigint := coalesce(p_now, extract(epoch from now())::bigint);
+    v_room rooms%rowtype;
+    v_drawing_id text;
+    v_players jsonb;
+    v_players_etag text;
+begin
+    if p_user_id is not null then
+        update players set last_seen = v_now
+        where room_id = p_room_id and user_id = p_user_id;
+    end if;
+
+    select * into v_room from rooms where id = p_room_id;
+    if not found then
+        return jsonb_build_object('room', null, 'version', null, 'players', '[]'::jsonb, 'players_etag', null,
+                                  'chat', '[]'::jsonb, 'drawing_id', '', 'strokes', '[]'::jsonb);
+    end if;
+
+    v_drawing_id := coalesce(v_room.game_state ->> 'drawing_id', '');
+
+    -- Same digest as room_snapshot.players_etag
+    select coalesce(jsonb_agg(to_jsonb(p) order by p.user_id), '[]'::jsonb),
+           md5(coalesce(string_agg(concat_ws(':', p.user_id, p.name, p.score, p.color, p.avatar), ',' order by p.user_id), ''))
+    into v_players, v_players_etag
+    from players p
+    where p.room_id = p_room_id and p.last_seen > v_now - p_timeout;
+
+    return jsonb_build_object(
+        'room', case when v_room.version is distinct from p_room_version then to_jsonb(v_room) - 'drawing_data' end,
+        'version', v_room.version,
+        'players', case when v_players_etag is distinct from p_players_etag then v_players end,
+        'players_etag', v_players_etag,
+        'chat', coalesce((
+            select jsonb_agg(jsonb_build_object('id', t.id, 'message_data', t.message_data) order by t.id) from (
+                (select id, message_data from chat_messages
+                 where room_id = p_room_id and (p_chat_after is null or id > p_chat_after)
+                 order by id desc
+                 limit p_chat_limit)
+                union all
+                select l.id, l.message_data from chat_messages l
+                where p_chat_after is not null and p_chat_seen is not null
+                  and l.room_id = p_room_id and l.id < p_chat_after
+                  and l.created_at >= (select c.created_at from chat_messages c where c.id = p_chat_after)
+                                      - make_interval(secs => p_chat_settle)
+                  and not (l.id = any(p_chat_seen))
+            ) t
+        ), '[]'::jsonb),
+        'drawing_id', v_drawing_id,
+        'strokes', coalesce((
+            select jsonb_agg(jsonb_build_object('seq', s.seq, 'base', s.base, 'strokes', s.strokes) order by s.seq)
+            from drawing_strokes s
+            where s.room_id = p_room_id and s.drawing_id = v_drawing_id and v_drawing_id <> ''
+              and s.seq > case when v_drawing_id = p_drawing_id then p_stroke_after else 0 end
+        ), '[]'::jsonb)
+    );
+end;
+$$;
+
+-- Bulk heartbeat write used by presence.py: one call per flush interval
+-- carries [{"room_id", "user_id", "last_seen"}, ...] for every session the
+-- server process has heard from. Rows that no longer exist are skipped
+-- rather than re-created, so a flush never resurrects a player who left.
+create or replace function touch_players(p_beats jsonb)
+returns integer
+language sql
+as $$
+    with beats as (
+        select * from jsonb_to_recordset(p_beats) as b(room_id text, user_id text, last_seen bigint)
+    ), touched as (
+        update players p set last_seen = b.last_seen
+        from beats b
+        where p.room_id = b.room_id and p.user_id = b.user_id and p.last_seen < b.last_seen
+        returning 1
+    )
+    select count(*)::integer from touched;
+$$;
+
+-- Correct-guess scoring used by scoring.py: increments the guesser's and the
+-- drawer's scores in place (no read-modify-write race between simultaneous
+-- guessers) and inserts the round's chat messages in the same transaction.
+-- Like advance_round, it locks the room and only scores a guess of
+-- p_word in round p_expected_round of an active game that nobody has won
+-- yet. It marks the round won (game_state.guessed_by) so a simultaneous
+-- guess finds it over, and returns round_over true without changing anything.
+drop function if exists award_correct_guess(text, text, text, integer, integer, jsonb);
+create or replace function award_correct_guess(
+    p_room_id text,
+    p_guesser_id text,
+    p_drawer_id text,
+    p_guesser_points integer,
+    p_drawer_points integer,
+    p_messages jsonb default '[]'::jsonb,
+    p_expected_round integer default null,
+    p_word text default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_state jsonb;
+    v_guesser_score integer;
+    v_drawer_score integer;
+begin
+    select game_state into v_state from rooms where id = p_room_id for update;
+    if v_state is null or v_state->>'status' <> 'active'
+       or (v_state->>'current_round')::integer is distinct from p_expected_round
+       or v_state->>'current_word' is distinct from p_word
+       or v_state->>'guessed_by' is not null then
+        return jsonb_build_object('round_over', true, 'guesser_score', null, 'drawer_score', null);
+    end if;
+    update rooms set game_state = v_state || jsonb_build_object('guessed_by', p_guesser_id) where id = p_room_id;
+
+    update players set score = score + p_guesser_points
+    where room_id = p_room_id and user_id = p_guesser_id
+    returning score into v_guesser_score;
+
+    update players set score = score + p_drawer_points
+    where room_id = p_room_id and user_id = p_drawer_id
+    returning score into v_drawer_score;
+
+    insert into chat_messages (room_id, message_data)
+    select p_room_id, m from jsonb_array_elements(p_messages) as m;
+
+    return jsonb_build_object('round_over', false, 'guesser_score', v_guesser_score, 'drawer_score', v_drawer_score);
+end;
+$$;
+
+-- Unit of work for game actions (mutations.MutationBatch): applies a list of
+-- insert/update/merge/delete changes in order, in one transaction, and
+-- returns the affected rows of each. Rows are matched by column equality,
+-- compared with the types of the table's own columns. Only the tables the
+-- client may already write to directly are accepted, and an update, merge
+-- or delete without match columns is rejected rather than applied to every
+-- row of the table. An update or merge marked "require" that matches no row
+-- (a compare-and-set on a version the room has moved past) aborts the whole
+-- batch with SQLSTATE 40001.
+create or replace function apply_mutations(p_ops jsonb) returns jsonb
+language plpgsql
+as $$
+declare
+    v_op jsonb;
+    v_table text;
+    v_where text;
+    v_columns text;
+    v_rows jsonb;
+    v_results jsonb := '[]'::jsonb;
+begin
+    for v_op in select value from jsonb_array_elements(p_ops) loop
+        v_table := v_op->>'table';
+        if v_table not in ('rooms', 'players', 'chat_messages', 'drawing_strokes') then
+            raise exception 'Table % cannot be changed in a mutation batch', v_table;
+        end if;
+        if v_op->>'op' <> 'insert' then
+            select string_agg(format('t.%1$I = m.%1$I', k), ' and ') into v_where
+            from jsonb_object_keys(coalesce(v_op->'match', '{}'::jsonb)) as k;
+            if v_where is null then
+                raise exception 'Mutation % on % has no match columns', v_op->>'op', v_table;
+            end if;
+        end if;
+
+        if v_op->>'op' = 'insert' then
+            select string_agg(quote_ident(k), ', ') into v_columns
+            from (select distinct jsonb_object_keys(r) as k from jsonb_array_elements(v_op->'rows') as r) keys;
+            execute format(
+                'with ins as (insert into %1$I (%2$s) select %2$s from jsonb_populate_recordset(null::%1$I, $1) returning *) '
+                'select coalesce(jsonb_agg(to_jsonb(ins)), ''[]'') from ins', v_table, v_columns)
+            into v_rows using v_op->'rows';
+        elsif v_op->>'op' = 'update' then
+            select string_agg(format('%1$I = v.%1$I', k), ', ') into v_columns
+            from jsonb_object_keys(v_op->'values') as k;
+            execute format(
+                'with upd as (update %1$I t set %2$s from jsonb_populate_record(null::%1$I, $1) v, '
+                'jsonb_populate_record(null::%1$I, $2) m where %3$s returning t.*) '
+                'select coalesce(jsonb_agg(to_jsonb(upd)), ''[]'') from upd', v_table, v_columns, v_where)
+            into v_rows using v_op->'values', v_op->'match';
+        elsif v_op->>'op' = 'merge' then
+            execute format(
+                'with upd as (update %1$I t set %2$I = coalesce(t.%2$I, ''{}''::jsonb) || $1 '
+                'from jsonb_populate_record(null::%1$I, $2) m where %3$s returning t.*) '
+                'select coalesce(jsonb_agg(to_jsonb(upd)), ''[]'') from upd', v_table, v_op->>'column', v_where)
+            into v_rows using v_op->'values', v_op->'match';
+        elsif v_op->>'op' = 'delete' then
+            execute format(
+                'with del as (delete from %1$I t using jsonb_populate_record(null::%1$I, $1) m where %2$s returning t.*) '
+                'select coalesce(jsonb_agg(to_jsonb(del)), ''[]'') from del', v_table, v_where)
+            into v_rows using v_op->'match';
+        else
+            raise exception 'Unknown mutation %', v_op->>'op';
+        end if;
+        if coalesce((v_op->>'require')::boolean, false) and v_rows = '[]'::jsonb then
+            raise exception 'Stale write to %: no row matches %', v_table, v_op->'match' using errcode = '40001';
+        end if;
+        v_results := v_results || jsonb_build_array(v_rows);
+    end loop;
+    return v_results;
+end;
+$$;
+
+-- Move a room past p_expected_round in one transaction (round_timer.py).
+-- Returns the new game_state, or null if the room already left that round.
+create or replace function advance_round(
+    p_room_id text,
+    p_expected_round integer,
+    p_word_options jsonb,
+    p_now bigint,
+    p_timed_out boolean default false,
+    p_end_game boolean default false,
+    p_timeout integer default 60
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_room rooms%rowtype;
+    v_state jsonb;
+    v_word text;
+    v_players jsonb;
+    v_count integer;
+    v_index integer;
+    v_next jsonb;
+    v_high integer;
+    v_messages text[] := '{}';
+begin
+    select * into v_room from rooms where id = p_room_id for update;
+    v_state := v_room.game_state;
+    if v_state is null or v_state->>'status' <> 'active'
+       or (v_state->>'current_round')::integer <> p_expected_round then
+        return null;
+    end if;
+
+    select coalesce(jsonb_agg(jsonb_build_object('user_id', user_id, 'name', name, 'score', score)
+                              order by score desc, user_id), '[]'::jsonb)
+    into v_players
+    from players
+    where room_id = p_room_id and last_seen >= p_now - p_timeout;
+    v_count := jsonb_array_length(v_players);
+
+    if p_timed_out then
+        v_word := coalesce(v_state->>'current_word', '');
+        v_messages := v_messages || case when v_word <> '' then 'Time''s up! The word was: ' || upper(v_word)
+                                         else 'Time''s up! No word was chosen.' end;
+    end if;
+
+    if p_end_game or v_count = 0
+       or coalesce((v_state->>'rounds_played')::integer, 0) + 1 >= coalesce((v_room.settings->>'max_rounds')::integer, 3) then
+        v_state := jsonb_set(v_state, '{status}', '"game_over"');
+        update rooms set game_state = v_state where id = p_room_id;
+        v_messages := v_messages || 'Game over! Thanks for playing!'::text;
+        if v_count > 0 then
+            v_high := (v_players->0->>'score')::integer;
+            v_messages := v_messages || ('Winner: ' || (
+                select string_agg(p->>'name', ', ' order by ord) from jsonb_array_elements(v_players) with ordinality as t(p, ord)
+                where (p->>'score')::integer = v_high
+            ) || ' with ' || v_high || ' points!');
+        end if;
+    else
+        select ord - 1 into v_index from jsonb_array_elements(v_players) with ordinality as t(p, ord)
+        where p->>'user_id' = v_state->>'drawing_player_id';
+        v_next := v_players->(case when v_index is null then 0 else (v_index + 1) % v_count end);
+        v_state := v_state || jsonb_build_object(
+            'current_round', (v_state->>'current_round')::integer + 1,
+            'rounds_played', coalesce((v_state->>'rounds_played')::integer, 0) + 1,
+            'current_word', '',
+            'drawing_player_id', v_next->>'user_id',
+            'timer_start', p_now,
+            'word_options', p_word_options,
+            'drawing_id', '',
+            'guessed_by', null
+        );
+        update rooms set game_state = v_state, drawing_data = null where id = p_room_id;
+        v_messages := v_messages || ('Round ' || (v_state->>'current_round') || '! ' || (v_next->>'name') || ' is choosing a word.');
+    end if;
+
+    insert into chat_messages (room_id, message_data)
+    select p_room_id, jsonb_build_object('type', 'system', 'content', m) from unnest(v_messages) as m;
+    return v_state;
+end;
+$$;
+
+-- Room code allocation (room_codes.py). Servers claim batches of indexes
+-- into a keyed permutation of the 36^6 code space, so no two rooms are ever
+-- offered the same code; codes of deleted rooms are reused after an hour.
+create table if not exists room_code_counter (
+    id integer primary key,
+    next_index bigint not null
+);
+
+create table if not exists recycled_room_codes (
+    code text primary key,
+    released_at bigint not null
+);
+
+create or replace function reserve_room_codes(
+    p_count integer,
+    p_now bigint,
+    p_recycle_after integer default 3600
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_codes text[];
+    v_fresh integer;
+    v_start bigint;
+begin
+    with claimed as (
+        delete from recycled_room_codes
+        where code in (
+            select code from recycled_room_codes
+            where released_at <= p_now - p_recycle_after
+            order by released_at
+            limit p_count
+            for update skip locked
+        )
+        returning code
+    )
+    select coalesce(array_agg(code), '{}') into v_codes from claimed;
+
+    v_fresh := p_count - cardinality(v_codes);
+    insert into room_code_counter (id, next_index) values (1, v_fresh)
+    on conflict (id) do update set next_index = room_code_counter.next_index + v_fresh
+    returning next_index - v_fresh into v_start;
+
+    return jsonb_build_object('recycled', to_jsonb(v_codes), 'start', v_start, 'count', v_fresh);
+end;
+$$;
+
+-- Background sweep used by janitor.py: removes timed-out players from every
+-- room with one notice each, then deletes rooms that have had no players for
+-- p_empty_grace seconds since creation, with their chat and strokes, and
+-- releases their codes to recycled_room_codes.
+create or replace function sweep_rooms(
+    p_now bigint,
+    p_timeout integer default 60,
+    p_empty_grace integer default 300
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_removed integer;
+    v_rooms text[];
+    v_deleted text[];
+begin
+    with removed as (
+        delete from players where last_seen < p_now - p_timeout
+        returning room_id, name
+    ), notices as (
+        insert into chat_messages (room_id, message_data)
+        select room_id, jsonb_build_object('type', 'system', 'content', name || ' was removed due to inactivity.')
+        from removed
+        returning room_id
+    )
+    select count(*), coalesce(array_agg(distinct room_id), '{}') into v_removed, v_rooms from notices;
+
+    select coalesce(array_agg(r.id), '{}') into v_deleted
+    from rooms r
+    where r.created_at < to_timestamp(p_now - p_empty_grace)
+      and not exists (select 1 from players p where p.room_id = r.id);
+
+    if cardinality(v_deleted) > 0 then
+        delete from chat_messages where room_id = any(v_deleted);
+        delete from drawing_strokes where room_id = any(v_deleted);
+        delete from rooms where id = any(v_deleted);
+        insert into recycled_room_codes (code, released_at)
+        select unnest(v_deleted), p_now
+        on conflict (code) do update set released_at = excluded.released_at;
+    end if;
+
+    return jsonb_build_object(
+        'players', v_removed,
+        'rooms', to_jsonb(array(select unnest(v_rooms) except select unnest(v_deleted))),
+        'deleted_rooms', to_jsonb(v_deleted)
+    );
+end;
+$$;
+
+-- Indexes behind the hot queries. Every sync reads a room's players and the
+-- newest chat ids of a room (room_snapshot), so both stay index range scans
+-- whose cost does not grow with the room's age; the janitor finds stale
+-- players by last_seen.
+create index if not exists players_room_id_idx on players (room_id);
+create index if not exists players_last_seen_idx on players (last_seen);
+create index if not exists chat_messages_room_id_id_idx on chat_messages (room_id, id);
+
+-- Chat older than each room's hot tail (chat_archive.py), moved out of
+-- chat_messages by the janitor. `payload` is a chat_archive.pack_segment
+-- string: zlib-compressed JSON of up to 500 rows (id, message_data, created_at).
+create table if not exists chat_archive (
+    room_id text not null references rooms(id) on delete cascade,
+    first_id bigint not null,
+    last_id bigint not null,
+    message_count integer not null,
+    payload text not null,
+    created_at timestamptz not null default now(),
+    primary key (room_id, first_id)
+);
+
+-- Rooms holding at least p_min_batch messages beyond their newest p_keep,
+-- with the id of the newest message to archive.
+create or replace function chat_compaction_candidates(
+    p_keep integer default 200,
+    p_min_batch integer default 100
+) returns jsonb
+language sql
+stable
+as $$
+    select coalesce(jsonb_agg(jsonb_build_object('room_id', room_id, 'cutoff_id', cutoff_id)), '[]'::jsonb)
+    from (
+        select room_id, max(id) filter (where rn > p_keep) as cutoff_id, count(*) filter (where rn > p_keep) as excess
+        from (
+            select room_id, id, row_number() over (partition by room_id order by id desc) as rn
+            from chat_messages
+        ) ranked
+        group by room_id
+    ) rooms_over
+    where excess >= p_min_batch;
+$$;
+
+-- Worker registry for room affinity (room_affinity.py). Each server process
+-- heartbeats its own address and reads back the live workers, from which
+-- every process builds the same consistent hash ring of rooms to workers.
+create table if not exists workers (
+    id text primary key,
+    url text not null,
+    last_seen bigint not null
+);
+
+create or replace function worker_heartbeat(
+    p_worker_id text,
+    p_url text,
+    p_now bigint,
+    p_timeout integer default 15
+) returns jsonb
+language plpgsql
+as $$
+begin
+    insert into workers (id, url, last_seen) values (p_worker_id, p_url, p_now)
+    on conflict (id) do update set url = excluded.url, last_seen = excluded.last_seen;
+    delete from workers where last_seen < p_now - 10 * p_timeout;
+    return coalesce((
+        select jsonb_object_agg(id, url) from workers where last_seen > p_now - p_timeout
+    ), '{}'::jsonb);
+end;
+$$;
+
+-- Realtime: the server subscribes to these tables per room (room_realtime.py).
+-- Full replica identity lets DELETE events on players carry room_id for the room filter.
+-- Only tables not yet published are added, so the file can be rerun.
+alter table players replica identity full;
+do $$
+declare
+    v_table text;
+begin
+    for v_table in
+        select t from unnest(array['rooms', 'players', 'chat_messages', 'drawing_strokes']) as t
+        where not exists (
+            select 1 from pg_publication_tables p
+            where p.pubname = 'supabase_realtime' and p.schemaname = 'public' and p.tablename = t
+        )
+    loop
+        execute format('alter publication supabase_realtime add table public.%I', v_table);
+    end loop;
+end
+$$;
@@ -0,0 +1,63 @@
+import logging
+from supabase import Client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def guess_points(time_left, round_time):
+    """
+    Points for the guesser and the drawer when a guess lands with time_left seconds to go.
+    """
+    drawer_points = int(100 * (time_left / round_time))
+    return drawer_points + 20, drawer_points  # Bonus for first guess
+
+def award_correct_guess(supabase: Client, room_id, guesser_id, drawer_id, guesser_points, drawer_points, messages, expected_round, word):
+    """
+    Add both players' points and post the round's chat messages in one atomic call.
+
+    Only the first correct guess of word in round expected_round scores;
+    the call marks the round won. Returns {"round_over", "guesser_score",
+    "drawer_score"}, with round_over True and nothing written if the round
+    had already been won or moved on.
+    """
+    params = {
+        "p_room_id": room_id,
+        "p_guesser_id": guesser_id,
+        "p_drawer_id": drawer_id,
+        "p_guesser_points": guesser_points,
+        "p_drawer_points": drawer_points,
+        "p_messages": messages,
+        "p_expected_round": expected_round,
+        "p_word": word
+    }
+    try:
+        return supabase.rpc("award_correct_guess", params).execute().data
+    except Exception as e:
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        logger.warning("award_correct_guess function is not deployed; scoring with separate, non-atomic queries")
+        return award_correct_guess_local(supabase, **params)
+
+def award_correct_guess_local(client, p_room_id, p_guesser_id, p_drawer_id, p_guesser_points, p_drawer_points, p_messages, p_expected_round=None, p_word=None):
+    """
+    award_correct_guess for local backends; runs inside the backend's transaction.
+    """
+    room = client.table("rooms").select("game_state").eq("id", p_room_id).execute().data
+    game_state = (room[0]["game_state"] or {}) if room else {}
+    if (game_state.get("status") != "active" or game_state.get("current_round") != p_expected_round
+            or game_state.get("current_word") != p_word or game_state.get("guessed_by")):
+        return {"round_over": True, "guesser_score": None, "drawer_score": None}
+    client.table("rooms").update({"game_state": dict(game_state, guessed_by=p_guesser_id)}).eq("id", p_room_id).execute()
+
+    scores = {"round_over": False}
+    for key, user_id, points in (("guesser_score", p_guesser_id, p_guesser_points), ("drawer_score", p_drawer_id, p_drawer_points)):
+        player = client.table("players").select("score").eq("room_id", p_room_id).eq("user_id", user_id).execute().data
+        if not player:
+            scores[key] = None
+            continue
+        scores[key] = player[0]["score"] + points
+        client.table("players").update({"score": scores[key]}).eq("room_id", p_room_id).eq("user_id", user_id).execute()
+
+    if p_messages:
+        client.table("chat_messages").insert([{"room_id": p_room_id, "message_data": message} for message in p_messages]).execute()
+    return scores
@@ -0,0 +1,64 @@
+import os
+import logging
+import threading
+from supabase import Client
+from room_cache import RoomCache
+from room_realtime import get_realtime_hub
+from rasterizer import get_raster_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SPECTATOR_REFRESH = float(os.getenv("DRAWING_GAME_SPECTATOR_REFRESH", "1"))
+SPECTATOR_CHAT_TAIL = 20
+SPECTATOR_SCALE = 0.5  # spectators get a half-size image of the drawing
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_spectator_feed(supabase):
+    """
+    Return the process-wide cache rooms are watched from, refreshed at most every SPECTATOR_REFRESH seconds.
+    """
+    global _feed
+    with _feed_lock:
+        if _feed is None or _feed.supabase is not supabase:
+            _feed = RoomCache(supabase, ttl=SPECTATOR_REFRESH)
+        return _feed
+
+def spectator_view(supabase: Client, room_id, now=None):
+    """
+    What a spectator sees of a room, or None if the room is gone.
+
+    Every spectator of a room on this server reads the same state. That is
+    the live realtime copy if realtime is on. Otherwise it is one
+    snapshot fetched per SPECTATOR_REFRESH, with no heartbeat. So the
+    database load stays the same however many people watch, and watching
+    never writes. Spectators are not players: they are not in the player
+    list, cannot score, and never receive the secret word. The drawing is
+    a shared PNG, rendered once per change for all of them.
+    """
+    hub = get_realtime_hub(supabase)
+    # Watching without a user or session: no heartbeats and no reruns, the spectator pane polls
+    state = hub.watch(room_id, None) if hub else None
+    if state is None:
+        state = get_spectator_feed(supabase).get(room_id)
+    snapshot = state.snapshot(now=now)
+    if snapshot["room"] is None:
+        return None
+
+    game_state = snapshot["room"].get("game_state") or {}
+    players = sorted(snapshot["players"], key=lambda p: p["score"], reverse=True)
+    drawer_id = game_state.get("drawing_player_id", "") if game_state.get("status") == "active" else ""
+    drawing_id = game_state.get("drawing_id", "")
+    return {
+        "status": game_state.get("status", "waiting"),
+        "round": game_state.get("current_round", 1),
+        "word_length": len(game_state.get("current_word", "")),
+        "players": [
+            {"name": p["name"], "score": p["score"], "avatar": p["avatar"], "drawing": p["user_id"] == drawer_id}
+            for p in players
+        ],
+        "chat": [row["message_data"] for row in snapshot["chat"][-SPECTATOR_CHAT_TAIL:]],
+        "image": get_raster_cache().render(room_id, drawing_id, snapshot["strokes"], SPECTATOR_SCALE) if drawing_id else None
+    }
@@ -0,0 +1,114 @@
+import os
+import logging
+import threading
+import httpx
+from supabase_client import get_shared_client, SharedSupabaseClient
+from local_backend import MemoryBackend, SQLiteBackend
+from metrics import db_call
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A backend is anything with the supabase.Client call shape the game uses:
+#   table(name).select(cols) / insert(rows) / upsert(rows, on_conflict=) /
+#   update(values) / delete(), filtered with eq/neq/gt/gte/lt/lte/in_,
+#   shaped with order(col, desc=)/limit(n)/range(a, b), then execute() -> .data
+#   rpc(name, params).execute() -> .data
+BACKEND_KINDS = ("supabase", "memory", "sqlite")
+QUERY_ACTIONS = ("select", "insert", "upsert", "update", "delete")
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+class InstrumentedQuery:
+    """
+    Wraps a postgrest request builder so execute() is counted and timed in metrics.
+
+    on_connection_error is called when a request fails below the API: the
+    connection could not be made or broke (httpx transport errors). Errors
+    returned by PostgREST itself do not call it.
+    """
+    def __init__(self, builder, table, action=None, on_connection_error=None):
+        self._builder = builder
+        self._table = table
+        self._action = action
+        self._on_connection_error = on_connection_error
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+        action = self._action or (name if name in QUERY_ACTIONS else None)
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return InstrumentedQuery(result, self._table, action, self._on_connection_error) if hasattr(result, "execute") else result
+        return call
+
+    def execute(self):
+        try:
+            with db_call(self._table, self._action):
+                return self._builder.execute()
+        except httpx.TransportError:
+            if self._on_connection_error is not None:
+                self._on_connection_error()
+            raise
+
+class SupabaseBackend:
+    """
+    Supabase implementation of the backend interface.
+
+    Delegates to the process-wide shared client, so a reconnect by its
+    health checker is picked up by the next query. A connection error on
+    any query triggers that health check right away.
+    """
+    def __init__(self, shared: SharedSupabaseClient):
+        self.shared = shared
+
+    @property
+    def client(self):
+        return self.shared.client
+
+    def table(self, name):
+        return InstrumentedQuery(self.client.table(name), name, on_connection_error=self.shared.report_failure)
+
+    def rpc(self, name, params=None):
+        return InstrumentedQuery(self.client.rpc(name, params or {}), "rpc", name, self.shared.report_failure)
+
+def _env_latency():
+    latency_ms = os.getenv("DRAWING_GAME_BACKEND_LATENCY_MS")
+    return float(latency_ms) / 1000 if latency_ms else 0.0
+
+def create_backend(kind=None, url=None, anon_key=None, sqlite_path=None, latency=None):
+    """
+    Return the process-wide backend for the game, creating it on first use.
+
+    kind defaults to the DRAWING_GAME_BACKEND environment variable, then
+    "supabase". Local backends honour DRAWING_GAME_BACKEND_LATENCY_MS and,
+    for SQLite, DRAWING_GAME_SQLITE_PATH.
+    """
+    kind = kind or os.getenv("DRAWING_GAME_BACKEND", "supabase")
+    if kind not in BACKEND_KINDS:
+        raise ValueError(f"Unknown backend {kind!r}; expected one of {', '.join(BACKEND_KINDS)}")
+
+    if kind == "supabase":
+        url = url or os.getenv("SUPABASE_URL")
+        anon_key = anon_key or os.getenv("SUPABASE_ANON_KEY")
+        if not url or not anon_key:
+            raise ValueError("SUPABASE_URL or SUPABASE_ANON_KEY is not set")
+        key = (kind, url, anon_key)
+    else:
+        latency = _env_latency() if latency is None else latency
+        sqlite_path = sqlite_path or os.getenv("DRAWING_GAME_SQLITE_PATH", "drawing_game.sqlite3")
+        key = (kind, sqlite_path if kind == "sqlite" else None)
+
+    with _backends_lock:
+        if key not in _backends:
+            if kind == "supabase":
+                _backends[key] = SupabaseBackend(get_shared_client(url, anon_key))
+            elif kind == "memory":
+                _backends[key] = MemoryBackend(latency=latency)
+            else:
+                _backends[key] = SQLiteBackend(sqlite_path, latency=latency)
+            logger.info(f"Created {kind} backend")
+        return _backends[key]
@@ -0,0 +1,211 @@
+import base64
+import json
+import logging
+import zlib
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SC01"
+QUANT_SCALE = 4  # quarter-pixel grid on the 600x450 canvas
+ZLIB_LEVEL = 6
+GEOMETRY_KEYS = ("path", "left", "top", "width", "height")
+
+def _zigzag(values):
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+def _unzigzag(values):
+    values = values.astype(np.uint64)
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+def _encode_varints(values):
+    """
+    LEB128-encode an array of unsigned integers without a per-value Python loop.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if values.size == 0:
+        return b""
+    nbytes = np.ones(values.size, dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+    width = int(nbytes.max())
+    positions = np.arange(width)
+    groups = (values[:, None] >> (positions * 7).astype(np.uint64)[None, :]) & np.uint64(0x7F)
+    groups |= (positions[None, :] < (nbytes[:, None] - 1)).astype(np.uint64) << np.uint64(7)
+    return groups[positions[None, :] < nbytes[:, None]].astype(np.uint8).tobytes()
+
+def _decode_varints(buf):
+    """
+    Decode a LEB128 byte string produced by _encode_varints.
+    """
+    data = np.frombuffer(buf, dtype=np.uint8)
+    if data.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    if ends.size == 0 or ends[-1] != data.size - 1:
+        raise ValueError("Truncated varint stream")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    owner = np.repeat(np.arange(ends.size), ends - starts + 1)
+    shifts = ((np.arange(data.size) - starts[owner]) * 7).astype(np.uint64)
+    parts = (data & 0x7F).astype(np.uint64) << shifts
+    return np.add.reduceat(parts, starts)
+
+def encode_strokes(objects):
+    """
+    Encode a list of fabric.js objects into the compact binary stroke format.
+
+    Path geometry is quantized to QUANT_SCALE, delta-encoded per axis and
+    varint-packed; the remaining keys go into a shared style table. Objects
+    that are not paths are kept verbatim in the header. The result is
+    deflated, which mostly pays off on the repeated small deltas.
+    """
+    styles, style_index = [], {}
+    ops, arity = [], []
+    raw = {}
+    meta, cmds, boxes, coords = [], [], [], []
+
+    for i, obj in enumerate(objects):
+        if obj.get("type") != "path" or not isinstance(obj.get("path"), list) or not obj["path"]:
+            raw[str(i)] = obj
+            continue
+
+        style = {k: v for k, v in obj.items() if k not in GEOMETRY_KEYS}
+        style_key = json.dumps(style, sort_keys=True, separators=(",", ":"))
+        if style_key not in style_index:
+            style_index[style_key] = len(styles)
+            styles.append(style)
+
+        for command in obj["path"]:
+            letter = command[0]
+            if letter not in ops:
+                ops.append(letter)
+                arity.append(len(command) - 1)
+            code = ops.index(letter)
+            if arity[code] != len(command) - 1:
+                raise ValueError(f"Inconsistent arity for path command {letter!r}")
+            cmds.append(code)
+            coords.extend(command[1:])
+
+        meta.extend((style_index[style_key], len(obj["path"])))
+        boxes.extend((obj.get("left", 0), obj.get("top", 0), obj.get("width", 0), obj.get("height", 0)))
+
+    quantized = np.rint(np.asarray(coords, dtype=np.float64) * QUANT_SCALE).astype(np.int64)
+    deltas = quantized.copy()
+    deltas[2:] -= quantized[:-2]
+    box_values = np.rint(np.asarray(boxes, dtype=np.float64) * QUANT_SCALE).astype(np.int64)
+
+    header = json.dumps({
+        "q": QUANT_SCALE,
+        "n": len(meta) // 2,
+        "ops": ops,
+        "arity": arity,
+        "styles": styles,
+        "raw": raw
+    }, separators=(",", ":")).encode("utf-8")
+
+    # Freehand paths are "M Q Q ... Q L", so commands are stored as per-stroke runs.
+    cmds = np.asarray(cmds, dtype=np.int64)
+    meta = np.asarray(meta, dtype=np.int64).reshape(-1, 2)
+    stroke_starts = np.zeros(cmds.size, dtype=bool)
+    stroke_starts[np.cumsum(meta[:, 1])[:-1]] = True
+    if cmds.size:
+        stroke_starts[0] = True
+    run_starts = np.flatnonzero(stroke_starts | np.concatenate(([True], cmds[1:] != cmds[:-1]))) if cmds.size else cmds
+    run_lengths = np.diff(np.append(run_starts, cmds.size))
+    runs_per_stroke = np.bincount(np.cumsum(stroke_starts)[run_starts] - 1, minlength=len(meta))
+    meta[:, 1] = runs_per_stroke
+
+    body = np.concatenate((
+        meta.ravel().astype(np.uint64),
+        np.column_stack((cmds[run_starts], run_lengths)).ravel().astype(np.uint64),
+        _zigzag(box_values),
+        _zigzag(deltas)
+    ))
+    payload = _encode_varints([len(header)]) + header + _encode_varints(body)
+    return MAGIC + zlib.compress(payload, ZLIB_LEVEL)
+
+def decode_strokes(buf):
+    """
+    Decode bytes produced by encode_strokes back into fabric.js objects.
+    """
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not an encoded stroke buffer")
+    buf = zlib.decompress(buf[len(MAGIC):])
+    header_end = 0
+    while buf[header_end] & 0x80:
+        header_end += 1
+    header_len = int(_decode_varints(buf[:header_end + 1])[0])
+    header_start = header_end + 1
+    header = json.loads(buf[header_start:header_start + header_len].decode("utf-8"))
+    values = _decode_varints(buf[header_start + header_len:])
+
+    n = header["n"]
+    scale = header["q"]
+    ops = header["ops"]
+    arity = np.asarray(header["arity"], dtype=np.int64)
+    meta = values[:2 * n].astype(np.int64).reshape(n, 2)
+    pos = 2 * n
+    n_runs = int(meta[:, 1].sum())
+    runs = values[pos:pos + 2 * n_runs].astype(np.int64).reshape(n_runs, 2)
+    pos += 2 * n_runs
+    cmds = np.repeat(runs[:, 0], runs[:, 1])
+    n_cmds = cmds.size
+    run_bounds = np.concatenate(([0], np.cumsum(meta[:, 1])))
+    cmds_per_stroke = np.add.reduceat(runs[:, 1], run_bounds[:-1]) if n_runs else np.zeros(n, dtype=np.int64)
+    boxes = (_unzigzag(values[pos:pos + 4 * n]) / scale).reshape(n, 4).tolist()
+    pos += 4 * n
+    deltas = _unzigzag(values[pos:])
+    quantized = np.empty_like(deltas)
+    quantized[0::2] = np.cumsum(deltas[0::2])
+    quantized[1::2] = np.cumsum(deltas[1::2])
+    coords = (quantized / scale).tolist()
+
+    cmd_arity = arity[cmds] if n_cmds else np.zeros(0, dtype=np.int64)
+    coord_offsets = np.concatenate(([0], np.cumsum(cmd_arity))).tolist()
+    cmd_letters = [ops[c] for c in cmds.tolist()]
+    cmd_bounds = np.concatenate(([0], np.cumsum(cmds_per_stroke))).tolist()
+
+    paths = []
+    for s in range(n):
+        style = header["styles"][int(meta[s, 0])]
+        path = [
+            [cmd_letters[c]] + coords[coord_offsets[c]:coord_offsets[c + 1]]
+            for c in range(cmd_bounds[s], cmd_bounds[s + 1])
+        ]
+        left, top, width, height = boxes[s]
+        paths.append(dict(style, left=left, top=top, width=width, height=height, path=path))
+
+    raw = {int(k): v for k, v in header["raw"].items()}
+    objects = []
+    paths_iter = iter(paths)
+    for i in range(n + len(raw)):
+        objects.append(raw[i] if i in raw else next(paths_iter))
+    return objects
+
+def pack_strokes(objects):
+    """
+    Encode objects to an ASCII string suitable for a JSON/text column.
+    """
+    return base64.b64encode(encode_strokes(objects)).decode("ascii")
+
+def unpack_strokes(data):
+    """
+    Inverse of pack_strokes. Lists are passed through for rows stored before the codec.
+    """
+    if isinstance(data, list):
+        return data
+    return decode_strokes(base64.b64decode(data))
+
+def encode_drawing(json_data):
+    """
+    Encode a whole fabric.js document (as returned by st_canvas).
+    """
+    return pack_strokes((json_data or {}).get("objects") or [])
+
+def decode_drawing(data, version="4.4.0"):
+    """
+    Decode a packed drawing back into a fabric.js document for initial_drawing.
+    """
+    return {"version": version, "objects": unpack_strokes(data)}
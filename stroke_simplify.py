@@ -0,0 +1,91 @@
+import os
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SIMPLIFY_TOLERANCE = float(os.getenv("DRAWING_GAME_SIMPLIFY_TOLERANCE", "1.0"))  # canvas pixels; 0 disables
+
+def rdp_mask(points, tolerance):
+    """
+    Ramer-Douglas-Peucker over an (n, 2) array: boolean mask of the points to keep.
+
+    Each split measures all points of a span in one NumPy pass. The points
+    with extreme x and y are always kept, so the bounding box (and with it
+    fabric.js left/top/width/height) is unchanged.
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n <= 2:
+        keep[:] = True
+        return keep
+    keep[[0, n - 1]] = True
+    keep[np.argmin(points, axis=0)] = True
+    keep[np.argmax(points, axis=0)] = True
+
+    anchors = np.flatnonzero(keep)
+    spans = list(zip(anchors[:-1], anchors[1:]))
+    while spans:
+        start, end = spans.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        inner = points[start + 1:end] - a
+        direction = b - a
+        length = np.hypot(*direction)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(direction[0] * inner[:, 1] - direction[1] * inner[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            spans.append((start, split))
+            spans.append((split, end))
+    return keep
+
+def _pencil_points(path):
+    """
+    The sampled points behind a PencilBrush path (M, Q..., L), or None for other paths.
+
+    PencilBrush emits each sample as a Q control point ending at the
+    midpoint to the next sample, so the samples are the M point, the Q
+    control points and the final L point.
+    """
+    if len(path) < 3 or path[0][0] != "M" or path[-1][0] != "L" or any(c[0] != "Q" for c in path[1:-1]):
+        return None
+    points = [(path[0][1], path[0][2])]
+    points.extend((c[1], c[2]) for c in path[1:-1])
+    points.append((path[-1][1], path[-1][2]))
+    return np.array(points, dtype=float)
+
+def _pencil_path(points):
+    path = [["M", points[0][0], points[0][1]]]
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        path.append(["Q", x1, y1, (x1 + x2) / 2, (y1 + y2) / 2])
+    path.append(["L", points[-1][0], points[-1][1]])
+    return path
+
+def simplify_stroke(obj, tolerance=None):
+    """
+    Copy of a freehand path object with redundant samples dropped; other objects are returned as is.
+    """
+    tolerance = SIMPLIFY_TOLERANCE if tolerance is None else tolerance
+    if tolerance <= 0 or obj.get("type") != "path":
+        return obj
+    points = _pencil_points(obj.get("path") or [])
+    if points is None:
+        return obj
+    # Drop repeated samples (a mouse that did not move) before splitting
+    distinct = np.ones(len(points), dtype=bool)
+    distinct[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[distinct]
+    kept = points[rdp_mask(points, tolerance)]
+    if len(kept) < 2:
+        kept = np.vstack([kept, kept])
+    return dict(obj, path=_pencil_path(kept.tolist()))
+
+def simplify_strokes(objects, tolerance=None):
+    return [simplify_stroke(obj, tolerance) for obj in objects]
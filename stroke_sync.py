@@ -0,0 +1,72 @@
+import logging
+from supabase import Client
+from stroke_codec import pack_strokes, unpack_strokes
+from stroke_simplify import simplify_strokes
+from metrics import record_payload
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FABRIC_VERSION = "4.4.0"
+
+def push_new_strokes(supabase: Client, room_id, drawing_id, json_data, acked, last_seq):
+    """
+    Append the drawer's strokes added since the last acknowledged count.
+
+    Returns the new (acked, last_seq) pair. An unchanged canvas writes nothing;
+    a shrunk canvas (undo/clear) writes an empty row with a smaller base.
+    New strokes are simplified (stroke_simplify) before they are written.
+    """
+    objects = (json_data or {}).get("objects") or []
+    if len(objects) == acked:
+        return acked, last_seq
+
+    base = min(acked, len(objects))
+    row = {
+        "room_id": room_id,
+        "drawing_id": drawing_id,
+        "seq": last_seq + 1,
+        "base": base,
+        "strokes": pack_strokes(simplify_strokes(objects[base:]))
+    }
+    record_payload("strokes", len(row["strokes"]))
+    supabase.table("drawing_strokes").insert(row).execute()
+    logger.info(f"Pushed {len(objects) - base} strokes (base {base}, seq {last_seq + 1}) for room {room_id}")
+    return len(objects), last_seq + 1
+
+def fetch_new_strokes(supabase: Client, room_id, drawing_id, after_seq):
+    """
+    Fetch stroke rows written after the given sequence number, oldest first.
+    """
+    rows = supabase.table("drawing_strokes").select("seq, base, strokes").eq("room_id", room_id).eq("drawing_id", drawing_id).gt("seq", after_seq).order("seq").execute()
+    return rows.data
+
+def apply_stroke_rows(strokes, rows):
+    """
+    Apply fetched stroke rows to a local stroke list in place.
+
+    Returns the sequence number of the last row applied, or None if rows is empty.
+    """
+    last_seq = None
+    for row in rows:
+        del strokes[row["base"]:]
+        strokes.extend(unpack_strokes(row["strokes"]))
+        last_seq = row["seq"]
+    return last_seq
+
+def build_drawing(strokes):
+    """
+    Wrap a stroke list in the fabric.js document shape st_canvas expects.
+    """
+    if not strokes:
+        return None
+    return {"version": FABRIC_VERSION, "objects": list(strokes)}
+
+def clear_strokes(supabase: Client, room_id, keep_drawing_id=None):
+    """
+    Delete a room's stroke rows, optionally keeping the rows of one drawing.
+    """
+    query = supabase.table("drawing_strokes").delete().eq("room_id", room_id)
+    if keep_drawing_id:
+        query = query.neq("drawing_id", keep_drawing_id)
+    query.execute()
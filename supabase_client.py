@@ -1,33 +1,131 @@
 import os
+import time
 import logging
+import threading
 from supabase import create_client, Client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+HEALTH_CHECK_INTERVAL = 30
+RECONNECT_MIN_DELAY = 1  # seconds before rebuilding the client again while checks fail, doubling per rebuild
+RECONNECT_MAX_DELAY = 60
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+class SharedSupabaseClient:
+    """
+    One Supabase client per process and credentials, shared by every session.
+
+    Reusing the client keeps its HTTP connection pool (and TLS sessions)
+    alive across reruns. Connectivity is checked by a background thread
+    every HEALTH_CHECK_INTERVAL seconds instead of inline, and the client
+    is rebuilt when a check fails. Rebuilds back off from RECONNECT_MIN_DELAY
+    to RECONNECT_MAX_DELAY while checks keep failing, and each one closes
+    the HTTP sessions of the client it replaces.
+    """
+    def __init__(self, url: str, anon_key: str, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.url = url
+        self.anon_key = anon_key
+        self.health_check_interval = health_check_interval
+        self.healthy = True
+        self.last_check = 0
+        self.reconnects = 0  # rebuilds since the last successful check
+        self.next_reconnect = 0
+        self.lock = threading.Lock()
+        self.client = self._create()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="supabase-health", daemon=True)
+        self._thread.start()
+
+    def _create(self) -> Client:
+        logger.info(f"Initializing Supabase client with URL: {self.url}")
+        return create_client(self.url, self.anon_key)
+
+    def check(self):
+        """
+        Run one health check, reconnecting if it fails. Returns the health state.
+        """
+        try:
+            self.client.table("rooms").select("id").limit(1).execute()
+            if not self.healthy:
+                logger.info("Supabase connection recovered")
+            self.healthy = True
+            self.reconnects = 0
+            self.next_reconnect = 0
+        except Exception as e:
+            logger.error(f"Supabase health check failed: {str(e)}")
+            self.healthy = False
+            if time.time() >= self.next_reconnect:
+                self.reconnect()
+                self.next_reconnect = time.time() + min(RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY * 2 ** self.reconnects)
+                self.reconnects += 1
+        self.last_check = time.time()
+        return self.healthy
+
+    def reconnect(self):
+        with self.lock:
+            try:
+                previous, self.client = self.client, self._create()
+            except Exception as e:
+                logger.error(f"Failed to recreate Supabase client: {str(e)}")
+                return
+        _close_client(previous)
+
+    def report_failure(self):
+        """
+        Ask for an immediate health check, e.g. after a request error.
+        """
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.health_check_interval)
+            self._wake.clear()
+            self.check()
+
+def _close_client(client: Client):
+    """
+    Close the HTTP sessions a replaced client opened. Requests still running on it fail.
+    """
+    # The sync postgrest client names its close method aclose
+    postgrest = getattr(client, "_postgrest", None)
+    auth_http = getattr(getattr(client, "auth", None), "_http_client", None)
+    for close in (getattr(postgrest, "aclose", None), getattr(auth_http, "close", None)):
+        if close is None:
+            continue
+        try:
+            close()
+        except Exception as e:
+            logger.warning(f"Failed to close replaced Supabase client session: {str(e)}")
+
+def get_shared_client(url: str, anon_key: str) -> SharedSupabaseClient:
+    """
+    Return the process-wide client holder for these credentials, creating it once.
+    """
+    logger.debug(f"SUPABASE_URL: {url}")
+    if not url:
+        logger.error("SUPABASE_URL is empty")
+        raise ValueError("SUPABASE_URL is empty")
+    if not anon_key:
+        logger.error("SUPABASE_ANON_KEY is empty")
+        raise ValueError("SUPABASE_ANON_KEY is empty")
+
+    with _shared_clients_lock:
+        shared = _shared_clients.get((url, anon_key))
+        if shared is None:
+            try:
+                shared = SharedSupabaseClient(url, anon_key)
+            except Exception as e:
+                logger.error(f"Failed to initialize Supabase client: {str(e)}")
+                raise ValueError(f"Failed to initialize Supabase client: {str(e)}")
+            _shared_clients[(url, anon_key)] = shared
+            logger.info("Supabase client initialized successfully")
+        return shared
+
 def get_supabase_client(url: str, anon_key: str) -> Client:
     """
-    Initialize and return a Supabase client with provided credentials.
-    """
-    try:
-        logger.info(f"SUPABASE_URL: {url}")
-        logger.info(f"SUPABASE_ANON_KEY: {anon_key[:10]}...")
-        
-        if not url:
-            logger.error("SUPABASE_URL is empty")
-            raise ValueError("SUPABASE_URL is empty")
-        if not anon_key:
-            logger.error("SUPABASE_ANON_KEY is empty")
-            raise ValueError("SUPABASE_ANON_KEY is empty")
-        
-        logger.info(f"Initializing Supabase client with URL: {url}")
-        client = create_client(url, anon_key)
-        
-        # Test connection
-        response = client.table("rooms").select("count").execute()
-        logger.info(f"Connection test response: {response}")
-        logger.info("Supabase client initialized successfully")
-        return client
-    except Exception as e:
-        logger.error(f"Failed to initialize Supabase client: {str(e)}")
-        raise ValueError(f"Failed to initialize Supabase client: {str(e)}")
+    Return the shared Supabase client for the provided credentials.
+    """
+    return get_shared_client(url, anon_key).client
@@ -1,56 +1,86 @@
 import streamlit as st
+import streamlit.components.v1 as components
 from streamlit_drawable_canvas import st_canvas
 from supabase import Client
-import time
-from game_logic import set_chosen_word
+import html
+import json
+from functools import lru_cache
+from game_logic import set_chosen_word, drawing_image, pull_chat
+from stroke_sync import push_new_strokes
+from fragments import fragment
+from spectators import spectator_view, SPECTATOR_REFRESH
 
-def render_game_ui(supabase: Client):
+@lru_cache(maxsize=4096)
+def chat_line_html(kind, player, content, correct):
     """
-    Render the Skribbl.io-style game UI with word selection, canvas, chat, and player list.
+    One chat line as HTML. Cached, so each message is formatted once per process, not on every rerun.
     """
-    st.markdown(f"### Room: {st.session_state.room_id} - {st.session_state.game_state.title()}")
-    
-    col1, col2, col3 = st.columns([2, 6, 2])
-    
-    with col1:
-        st.subheader("Players")
-        for player in st.session_state.players:
-            is_drawer = st.session_state.game_state == "active" and st.session_state.drawing_player_index is not None and player["id"] == st.session_state.players[st.session_state.drawing_player_index]["id"]
-            avatar = player["avatar"] if not is_drawer else "✏️ " + player["avatar"]
-            st.write(f"{avatar} {player['name']} ({player['score']} points)")
-    
-    with col2:
-        if st.session_state.game_state == "active" and st.session_state.drawing_player_index is not None:
-            if st.session_state.players[st.session_state.drawing_player_index]["id"] == st.session_state.user_id:
-                if st.session_state.word_options:
-                    st.write("**Choose a word to draw:**")
-                    cols = st.columns(3)
-                    for i, word in enumerate(st.session_state.word_options):
-                        with cols[i]:
-                            if st.button(word.upper(), key=f"word_{i}"):
-                                set_chosen_word(supabase, word)
-                elif st.session_state.current_word:
-                    st.write(f"**Draw: {st.session_state.current_word.upper()} ({len(st.session_state.current_word)} letters)**")
-                    col_color, col_brush = st.columns(2)
-                    with col_color:
-                        stroke_color = st.color_picker("Stroke color", "#000000")
-                    with col_brush:
-                        stroke_width = st.slider("Brush size", 1, 25, 2)
-                    canvas_result = st_canvas(
-                        fill_color="rgba(255, 165, 0, 0.3)",
-                        stroke_width=stroke_width,
-                        stroke_color=stroke_color,
-                        background_color="#ffffff",
-                        height=450,
-                        width=600,
-                        drawing_mode="freedraw",
-                        key=f"canvas_{st.session_state.room_id}"
+    if kind == "system":
+        return f"<span style='color: #FFD700; font-weight: bold;'>[System]: {html.escape(content)}</span>"
+    color = "#00AEEF" if correct else "#333333"
+    return f"<span style='color: {color};'>{html.escape(player)}: {html.escape(content)}</span>"
+
+def chat_html(messages):
+    return "<br>".join(
+        chat_line_html(msg["type"], msg.get("player", ""), msg["content"], msg.get("correct", False))
+        for msg in messages
+    )
+
+def render_player_list():
+    is_active = st.session_state.game_state == "active" and st.session_state.drawing_player_index is not None
+    drawer_id = st.session_state.players[st.session_state.drawing_player_index]["id"] if is_active else None
+    lines = []
+    for player in st.session_state.players:
+        avatar = "✏️ " + player["avatar"] if player["id"] == drawer_id else player["avatar"]
+        lines.append(html.escape(f"{avatar} {player['name']} ({player['score']} points)"))
+    st.markdown("<br>".join(lines), unsafe_allow_html=True)
+
+@fragment()
+def render_canvas_pane(supabase: Client):
+    """
+    Word choice and canvas. Drawing only reruns this pane; the viewer canvas
+    is only re-mounted when a new drawing starts.
+    """
+    if st.session_state.game_state == "active" and st.session_state.drawing_player_index is not None:
+        if st.session_state.players[st.session_state.drawing_player_index]["id"] == st.session_state.user_id:
+            if st.session_state.word_options:
+                st.write("**Choose a word to draw:**")
+                cols = st.columns(3)
+                for i, word in enumerate(st.session_state.word_options):
+                    with cols[i]:
+                        if st.button(word.upper(), key=f"word_{i}"):
+                            set_chosen_word(supabase, word)
+            elif st.session_state.current_word:
+                st.write(f"**Draw: {st.session_state.current_word.upper()} ({len(st.session_state.current_word)} letters)**")
+                col_color, col_brush = st.columns(2)
+                with col_color:
+                    stroke_color = st.color_picker("Stroke color", "#000000")
+                with col_brush:
+                    stroke_width = st.slider("Brush size", 1, 25, 2)
+                canvas_result = st_canvas(
+                    fill_color="rgba(255, 165, 0, 0.3)",
+                    stroke_width=stroke_width,
+                    stroke_color=stroke_color,
+                    background_color="#ffffff",
+                    height=450,
+                    width=600,
+                    drawing_mode="freedraw",
+                    key=f"canvas_{st.session_state.room_id}_{st.session_state.drawing_id}"
+                )
+                if canvas_result.json_data and st.session_state.drawing_id:
+                    st.session_state.stroke_acked, st.session_state.stroke_seq = push_new_strokes(
+                        supabase,
+                        st.session_state.room_id,
+                        st.session_state.drawing_id,
+                        canvas_result.json_data,
+                        st.session_state.stroke_acked,
+                        st.session_state.stroke_seq
                     )
-                    if canvas_result.json_data:
-                        supabase.table("rooms").update({"drawing_data": canvas_result.json_data}).eq("id", st.session_state.room_id).execute()
+        else:
+            st.write(f"**Guess the word: {st.session_state.hidden_word or 'Waiting...'} ({st.session_state.word_length} letters)**")
+            if st.checkbox("Low-bandwidth view", key="raster_view", help="Show the drawing as an image instead of a live canvas"):
+                st.image(drawing_image(supabase), width=600)
             else:
-                word_length = len(st.session_state.current_word) if st.session_state.current_word else 0
-                st.write(f"**Guess the word: {st.session_state.hidden_word or 'Waiting...'} ({word_length} letters)**")
                 canvas_kwargs = {
                     "fill_color": "rgba(255, 165, 0, 0.3)",
                     "stroke_width": 2,
@@ -59,34 +89,100 @@ def render_game_ui(supabase: Client):
                     "height": 450,
                     "width": 600,
                     "drawing_mode": "view",
-                    "key": f"canvas_{st.session_state.room_id}_view"
+                    "key": f"canvas_{st.session_state.room_id}_{st.session_state.drawing_id}_view"
                 }
                 if st.session_state.drawing_data:
                     canvas_kwargs["initial_drawing"] = st.session_state.drawing_data
                 st_canvas(**canvas_kwargs)
+    else:
+        st.write("**Waiting for the game to start...**")
+
+def render_chat_pane(supabase: Client):
+    """
+    Chat history, one element per message, plus the message box.
+
+    With realtime updates the pane is a fragment. The realtime hub reruns
+    it on its own, only when new chat arrives, and it reads the lines from
+    the room state in memory. So an idle room sends nothing, and a new chat
+    line never reruns the rest of the page. When polling, the pane is
+    rendered inline, as part of every full rerun.
+    """
+    messages = st.container()
+    chat_input = st.text_input("Send a message", key=f"chat_{st.session_state.room_id}")
+    if st.button("Send"):
+        if chat_input:
+            from game_logic import send_chat_message
+            send_chat_message(supabase, chat_input)
+    if st.session_state.get("guess_feedback"):
+        st.info(st.session_state.guess_feedback)
+
+    pull_chat(supabase)
+    with messages:
+        if st.session_state.chat_messages:
+            for msg in st.session_state.chat_messages:
+                st.markdown(chat_line_html(msg["type"], msg.get("player", ""), msg["content"], msg.get("correct", False)), unsafe_allow_html=True)
+        else:
+            st.write("No messages yet.")
+
+@fragment(run_every=SPECTATOR_REFRESH)
+def render_spectator_ui(supabase: Client):
+    """
+    Read-only view of a room, refreshed from the room state shared by all of this server's spectators.
+    """
+    view = spectator_view(supabase, st.session_state.spectate_room)
+    if view is None:
+        st.error(f"Room {st.session_state.spectate_room} does not exist!")
+        return
+
+    st.markdown(f"### Watching room {st.session_state.spectate_room} - {view['status'].title()}")
+    col1, col2, col3 = st.columns([2, 6, 2])
+    with col1:
+        st.subheader("Players")
+        st.markdown("<br>".join(
+            html.escape(f"{'✏️ ' if p['drawing'] else ''}{p['avatar']} {p['name']} ({p['score']} points)")
+            for p in view["players"]
+        ), unsafe_allow_html=True)
+    with col2:
+        if view["status"] == "active":
+            st.write(f"**Round {view['round']}: {'_ ' * view['word_length'] or 'Choosing a word...'}**")
+        if view["image"]:
+            st.image(view["image"], width=600)
         else:
-            st.write("**Waiting for the game to start...**")
-    
+            st.write("**Waiting for the drawing to start...**")
     with col3:
         st.subheader("Chat")
-        chat_container = st.container()
-        with chat_container:
-            if st.session_state.chat_messages:
-                for msg in st.session_state.chat_messages:
-                    if msg["type"] == "system":
-                        st.markdown(f"<span style='color: #FFD700; font-weight: bold;'>[System]: {msg['content']}</span>", unsafe_allow_html=True)
-                    else:
-                        color = "#00AEEF" if msg.get("correct", False) else "#333333"
-                        st.markdown(f"<span style='color: {color};'>{msg['player']}: {msg['content']}</span>", unsafe_allow_html=True)
-            else:
-                st.write("No messages yet.")
-        
-        chat_input = st.text_input("Send a message", key=f"chat_{st.session_state.room_id}")
-        if st.button("Send"):
-            if chat_input:
-                from game_logic import send_chat_message
-                is_correct = chat_input.lower() == st.session_state.current_word.lower() if st.session_state.game_state == "active" and st.session_state.current_word else False
-                send_chat_message(supabase, chat_input, is_correct)
+        st.markdown(chat_html(view["chat"]) or "No messages yet.", unsafe_allow_html=True)
+
+def render_handoff(url):
+    """
+    Send the browser to the worker serving the room; the button is the fallback if navigation is blocked.
+    """
+    st.info("This room is hosted on another server. Taking you there...")
+    components.html(f"<script>window.top.location.href = {json.dumps(url)};</script>", height=0)
+    st.link_button("Continue to the room", url)
+
+def render_game_ui(supabase: Client):
+    """
+    Render the Skribbl.io-style game UI with word selection, canvas, chat, and player list.
+    """
+    st.markdown(f"### Room: {st.session_state.room_id} - {st.session_state.game_state.title()}")
+
+    col1, col2, col3 = st.columns([2, 6, 2])
+
+    with col1:
+        st.subheader("Players")
+        render_player_list()
+
+    with col2:
+        render_canvas_pane(supabase)
+
+    with col3:
+        st.subheader("Chat")
+        if st.session_state.get("live_chat", False):
+            fragment()(render_chat_pane)(supabase)
+        else:
+            # Polling: only a full rerun syncs, so Send must rerun the whole page
+            render_chat_pane(supabase)
 
     st.markdown("---")
     st.write("🎨 Draw or guess the word! Type your guesses in the chat. Good luck!")
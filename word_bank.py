@@ -0,0 +1,160 @@
+import os
+import gzip
+import random
+import logging
+import threading
+from array import array
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORD_BANK_PATH = os.getenv("DRAWING_GAME_WORDS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "words.tsv.gz"))
+DIFFICULTIES = ("easy", "medium", "hard")
+MAX_ROOM_SAMPLERS = 1024
+
+_bank = None
+_bank_lock = threading.Lock()
+_samplers = OrderedDict()
+_samplers_lock = threading.Lock()
+
+class WordBank:
+    """
+    Immutable word list with id indexes by difficulty, category and length.
+
+    Words are stored once; indexes and pools are compact arrays of word ids,
+    so every session and room of the process shares the same memory.
+    """
+    def __init__(self, entries):
+        ids = {}
+        by_difficulty = defaultdict(lambda: array("I"))
+        by_category = defaultdict(lambda: array("I"))
+        by_length = defaultdict(lambda: array("I"))
+        words = []
+        for word, difficulty, category in entries:
+            word_id = ids.get(word)
+            if word_id is None:
+                word_id = ids[word] = len(words)
+                words.append(word)
+                by_difficulty[difficulty].append(word_id)
+                by_length[len(word.replace(" ", ""))].append(word_id)
+            if category:
+                by_category[category].append(word_id)
+        self.words = tuple(words)
+        self.all = array("I", range(len(words)))
+        self.by_difficulty = dict(by_difficulty)
+        self.by_category = dict(by_category)
+        self.by_length = dict(by_length)
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def categories(self):
+        return sorted(self.by_category)
+
+    @lru_cache(maxsize=256)
+    def pool(self, difficulty=None, category=None, length=None):
+        """
+        Ids of the words matching every given filter, computed once per combination.
+        """
+        indexes = [index for index in (
+            self.by_difficulty.get(difficulty, array("I")) if difficulty else None,
+            self.by_category.get(category, array("I")) if category else None,
+            self.by_length.get(length, array("I")) if length else None
+        ) if index is not None]
+        if not indexes:
+            return self.all
+        if len(indexes) == 1:
+            return indexes[0]
+        indexes.sort(key=len)
+        keep = set(indexes[1]).intersection(*indexes[2:])
+        return array("I", (word_id for word_id in indexes[0] if word_id in keep))
+
+def read_word_file(path):
+    """
+    Yield (word, difficulty, category) rows from a TSV file, gzip-compressed if it ends in .gz.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        header = f.readline().rstrip("\n").split("\t")
+        if header[:1] != ["word"]:
+            raise ValueError(f"{path}: expected a header row starting with 'word'")
+        for line_number, line in enumerate(f, start=2):
+            fields = line.rstrip("\n").split("\t")
+            if not fields[0]:
+                continue
+            if len(fields) < 2 or fields[1] not in DIFFICULTIES:
+                raise ValueError(f"{path}:{line_number}: expected word, difficulty ({'/'.join(DIFFICULTIES)}) and optional category")
+            yield fields[0].strip().lower(), fields[1], fields[2] if len(fields) > 2 else ""
+
+def load_word_bank(path=None):
+    path = path or WORD_BANK_PATH
+    bank = WordBank(read_word_file(path))
+    logger.info(f"Loaded {len(bank)} words from {path}")
+    return bank
+
+def get_word_bank():
+    """
+    Return the process-wide word bank, loading it on first use.
+    """
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                _bank = load_word_bank()
+    return _bank
+
+class WordSampler:
+    """
+    Draws from a pool of word ids without repeats until the pool is exhausted.
+
+    A sparse Fisher-Yates shuffle: only the swapped positions are stored,
+    so each draw is O(1) and the pool itself is never copied.
+    """
+    def __init__(self, pool, rng=None):
+        self.pool = pool
+        self.rng = rng or random.Random()
+        self.drawn = 0
+        self.swaps = {}
+
+    def draw(self):
+        size = len(self.pool)
+        if not size:
+            raise ValueError("Cannot draw from an empty word pool")
+        if self.drawn >= size:
+            self.drawn = 0
+            self.swaps.clear()
+        position = self.rng.randrange(self.drawn, size)
+        picked = self.swaps.get(position, position)
+        self.swaps[position] = self.swaps.pop(self.drawn, self.drawn)
+        self.drawn += 1
+        return self.pool[picked]
+
+    def sample(self, count):
+        """
+        Draw count distinct ids (fewer if the pool is smaller).
+        """
+        picked = []
+        while len(picked) < min(count, len(self.pool)):
+            word_id = self.draw()
+            if word_id not in picked:
+                picked.append(word_id)
+        return picked
+
+def draw_words(room_id, difficulty, count=3, category=None):
+    """
+    Draw count words for a room, not repeating any until the room has seen the whole pool.
+    """
+    bank = get_word_bank()
+    pool = bank.pool(difficulty, category) or bank.all
+    key = (room_id, difficulty, category)
+    with _samplers_lock:
+        sampler = _samplers.get(key)
+        if sampler is None or sampler.pool is not pool:
+            sampler = _samplers[key] = WordSampler(pool)
+        _samplers.move_to_end(key)
+        while len(_samplers) > MAX_ROOM_SAMPLERS:
+            _samplers.popitem(last=False)
+        return [bank.words[word_id] for word_id in sampler.sample(count)]